@@ -1,20 +1,20 @@
 #!/usr/bin/env python3
 import os
 import re
-import json
 import datetime
-import time
+import asyncio
 import arxiv
 import argparse
 from dotenv import load_dotenv, find_dotenv
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import utils.md_format as mdf
-from scrapt_arxiv import detect_github_repos, get_github_repo_stars
+from scrapt_arxiv import ARXIV_DELAY_SECONDS, create_arxiv_client, detect_github_repos, get_github_repo_stars
 import logging
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from utils.embeddings import get_embedding_service
+from utils.jsonl_store import JSONLRecordStore, write_records
+from utils.rate_limit import RateLimiter, RateLimitedSession
+from utils.title_index import build_title_index, dump_paths_from_env
+from utils.title_match import best_matches
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
@@ -69,10 +69,22 @@ def normalize_title(title):
     title = re.sub(r'\s+', ' ', title).strip()
     return title
 
-def find_paper_on_arxiv(title, client, max_results=5):
-    """Find paper on arXiv by title"""
+# Model used to match titles that the exact ti: search misses
+FALLBACK_MODEL = "dunzhang/stella_en_400M_v5"
+FALLBACK_THRESHOLD = 0.75
+
+def search_arxiv_candidates(title, client, max_results=5):
+    """
+    Searches arXiv for a title.
+
+    Returns:
+        (arxiv.Result or None, list): The first exact `ti:` match, and when there is none, the
+        results of a broader `all:` search to be matched semantically (see match_fallback_titles).
+
+    Network and API errors (timeouts, 503s) are raised rather than reported as "not found", so
+    callers can retry the title.
+    """
     # Prepare search query with the title
-    normalized_title = normalize_title(title)
     search_query = f'ti:"{title}"'
     
     # Configure search
@@ -82,62 +94,92 @@ def find_paper_on_arxiv(title, client, max_results=5):
         sort_by=arxiv.SortCriterion.Relevance
     )
     
-    try:
-        # Search for papers
-        results = list(client.results(search))
-        
-        # If direct title search fails, try with normalized titles for comparison
-        if not results:
-            # Try a more general search
-            broader_search = arxiv.Search(
-                query=f'all:{title}',
-                max_results=10,
-                sort_by=arxiv.SortCriterion.Relevance
-            )
-            broader_results = list(client.results(broader_search))
-            
-            # Match by comparing titles using semantic similarity with SentenceTransformer
-            if broader_results:
-                # Initialize sentence transformer model (only once)
-                model = SentenceTransformer("dunzhang/stella_en_400M_v5", trust_remote_code=True)
-                
-                # Encode the query title
-                title_embedding = model.encode([normalized_title])[0]
-                
-                # Encode all result titles and calculate similarities
-                result_titles = [normalize_title(result.title) for result in broader_results]
-                result_embeddings = model.encode(result_titles)
-                
-                # Calculate cosine similarity between query and each result
-                similarities = cosine_similarity([title_embedding], result_embeddings).flatten()
-                
-                # Find the result with the highest similarity score
-                best_match_idx = np.argmax(similarities)
-                best_similarity = similarities[best_match_idx]
-                logger.warning(f"Found semantic match for '{title}' with similarity {best_similarity:.2f}")
-
-                # Return the best match if the similarity exceeds threshold
-                if best_similarity > 0.75:
-                    # logger.warning(f"Found semantic match for '{title}' with similarity {best_similarity:.2f}")
-                    return broader_results[best_match_idx]
-            else:
-                logger.warning(f"No results found for broader search with '{title}'")
-        # Return the first result if any found from direct search
-        if results:
-            return results[0]
-            
-        # No matching paper found
-        return None
-    
-    except Exception as e:
-        logger.error(f"Error searching arXiv for '{title}': {e}")
-        return None
+    # Search for papers
+    results = list(client.results(search))
+    if results:
+        return results[0], []
+
+    # If direct title search fails, try a more general search
+    broader_search = arxiv.Search(
+        query=f'all:{title}',
+        max_results=10,
+        sort_by=arxiv.SortCriterion.Relevance
+    )
+    broader_results = list(client.results(broader_search))
+    if not broader_results:
+        logger.warning(f"No results found for broader search with '{title}'")
+    return None, broader_results
+
+def match_fallback_titles(fallbacks):
+    """
+    Picks the closest arXiv result for each title that had no exact match.
+
+    Candidates are first scored by title edit-distance similarity (utils.title_match, one call for
+    the whole batch); titles that match no candidate that way fall back to semantic matching, with
+    every remaining query and candidate title embedded in a single encode call of the shared
+    embedding service (the model is loaded once, on first use, and shared by every thread).
+
+    Args:
+        fallbacks (dict): {title: [arxiv.Result candidates]}.
+
+    Returns:
+        dict: {title: best arxiv.Result, or None below the similarity threshold}.
+    """
+    fallbacks = {title: candidates for title, candidates in fallbacks.items() if candidates}
+    if not fallbacks:
+        return {}
+    matches = {}
+    for title, (best, similarity) in best_matches({title: [result.title for result in candidates] for title, candidates in fallbacks.items()}).items():
+        if best is not None:
+            logger.info(f"Found title match for '{title}' with similarity {similarity:.2f}")
+            matches[title] = fallbacks[title][best]
+    fallbacks = {title: candidates for title, candidates in fallbacks.items() if title not in matches}
+    if not fallbacks:
+        return matches
+    import numpy as np
+
+    titles = list(fallbacks)
+    texts = [normalize_title(title) for title in titles]
+    for title in titles:
+        texts.extend(normalize_title(result.title) for result in fallbacks[title])
+    embeddings = get_embedding_service(FALLBACK_MODEL).encode(texts)
+
+    offset = len(titles)
+    for i, title in enumerate(titles):
+        candidates = fallbacks[title]
+        # Normalised embeddings: cosine similarity is a dot product
+        similarities = embeddings[offset:offset + len(candidates)] @ embeddings[i]
+        offset += len(candidates)
+        best_match_idx = int(np.argmax(similarities))
+        best_similarity = float(similarities[best_match_idx])
+        logger.warning(f"Found semantic match for '{title}' with similarity {best_similarity:.2f}")
+        # Return the best match if the similarity exceeds threshold
+        matches[title] = candidates[best_match_idx] if best_similarity > FALLBACK_THRESHOLD else None
+    return matches
+
+def find_paper_on_arxiv(title, client, max_results=5):
+    """Find paper on arXiv by title"""
+    result, candidates = search_arxiv_candidates(title, client, max_results)
+    if result is None and candidates:
+        result = match_fallback_titles({title: candidates}).get(title)
+    return result
 
 def process_paper(title, arxiv_client):
     """Process a single paper: find on arXiv and extract details"""
     logger.info(f"Looking up '{title}' on arXiv...")
-    arxiv_paper = find_paper_on_arxiv(title, arxiv_client)
-    
+    return build_paper_record(title, find_paper_on_arxiv(title, arxiv_client))
+
+def lookup_error_record(title, error):
+    """Record of a title whose lookup failed (network / API error): retried by a resumed run, unlike not-found titles"""
+    return {
+        "title": title,
+        "not_found": True,
+        "lookup_error": str(error),
+        "processed_at": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z")
+    }
+
+def build_paper_record(title, arxiv_paper):
+    """Builds the paper dictionary of an arXiv result (or the not-found record) and looks up its GitHub repo"""
     if not arxiv_paper:
         logger.warning(f"No arXiv match found for '{title}'")
         return {
@@ -171,7 +213,7 @@ def process_paper(title, arxiv_client):
         try:
             stars = get_github_repo_stars(repo_url, os.getenv("GITHUB_TOKEN"))
             paper['repo'] = repo_url[:-1] if repo_url[-1] == "." else repo_url
-            paper['stars'] = stars
+            paper['stars'] = stars if stars is not None else -1 # -1: stars couldn't be fetched
         except Exception as e:
             logger.error(f"Failed to get GitHub stars for {repo_url}: {e}")
             paper['repo'] = repo_url[:-1] if repo_url[-1] == "." else repo_url
@@ -182,8 +224,8 @@ def process_paper(title, arxiv_client):
     
     return paper
 
-def analyze_paper(paper):
-    """Use LLM to analyze a paper's content"""
+async def analyze_paper(paper):
+    """Use LLM to analyze a paper's content (coroutine run on the llm_engine work queue)"""
     if paper.get('not_found', True):
         return paper
     
@@ -191,10 +233,14 @@ def analyze_paper(paper):
         text_for_processing = f"Title: {paper['title']}\nAbstract: {paper['abstract']}\n"
         
         # Add LLM-based analysis
-        paper['main_task'] = mdf.get_tasks_tags(text_for_processing)
-        paper['contributions'] = mdf.get_contributions(text_for_processing)
-        paper['summary'] = mdf.get_paper_summary(text_for_processing)
+        paper.pop('analysis_error', None)
+        analysis = await mdf.aget_paper_analysis(text_for_processing)
+        paper.update(analysis)
         paper['analyzed_at'] = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z")
+        # Failed LLM calls come back as None: flag the paper so the checkpoint retries it
+        missing = [field for field in mdf.ANALYSIS_FIELDS if not analysis.get(field)]
+        if missing:
+            paper['analysis_error'] = f"No LLM answer for {', '.join(missing)}"
         
         return paper
     except Exception as e:
@@ -202,66 +248,185 @@ def analyze_paper(paper):
         paper['analysis_error'] = str(e)
         return paper
 
-def process_papers_in_batches(titles, batch_size=5):
-    """Process papers in batches to respect API rate limits"""
-    arxiv_client = arxiv.Client(page_size=batch_size)
-    processed_papers = []
-    not_found_count = 0
-    
-    logger.info(f"Processing {len(titles)} paper titles in batches of {batch_size}...")
-    
-    for i in tqdm(range(0, len(titles), batch_size), desc="Fetching papers from arXiv"):
-        batch = titles[i:i + batch_size]
-        batch_results = []
-        
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            futures = []
-            for title in batch:
-                futures.append(executor.submit(
-                    process_paper, title, arxiv_client
-                ))
-            
-            for future in futures:
-                result = future.result()
-                if result:
-                    batch_results.append(result)
-        
-        processed_papers.extend(batch_results)
-        not_found_count += sum(1 for paper in batch_results if paper.get('not_found', True))
-        
-        # Respect arXiv API rate limits
-        if i + batch_size < len(titles):
-            time.sleep(3)
-    
-    logger.info(f"Found {len(processed_papers) - not_found_count} papers out of {len(titles)}")
-    
-    # Now analyze found papers
-    analyzed_papers = []
-    
-    for i in tqdm(range(0, len(processed_papers), batch_size), desc="Analyzing papers"):
-        batch = processed_papers[i:i + batch_size]
-        
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            futures = []
-            for paper in batch:
-                futures.append(executor.submit(analyze_paper, paper))
-            
-            for future in futures:
-                result = future.result()
-                if result:
-                    analyzed_papers.append(result)
-                    
-        # Give the LLM API a short break between batches
-        if i + batch_size < len(processed_papers):
-            time.sleep(1)
-    
-    return analyzed_papers
+async def process_papers_pipeline(titles, batch_size=5, on_result=None, resolved=None, on_resolved=None, title_index=None):
+    """
+    Looks up titles on arXiv and analyses the papers found, as a streaming two-stage pipeline.
+
+    `batch_size` lookup workers resolve titles concurrently; their arXiv requests are paced by one
+    shared rate limiter (arXiv's 1 request every 3 seconds) rather than fixed sleeps. Titles
+    without an exact match are matched semantically in groups of up to `batch_size`. Each resolved
+    paper goes straight into the analysis queue, throttled by the LLM provider budget, so lookups
+    and LLM calls overlap. `on_result(title, paper)` is called as papers complete.
+
+    `resolved` maps titles to paper records already looked up (e.g. by an interrupted run): they
+    skip the arXiv stage. `on_resolved(title, paper)` is called when a lookup completes.
+    Titles found in `title_index` (a utils.title_index.TitleIndex) are resolved locally and only
+    the others are looked up on arXiv.
+
+    Returns the processed papers in title order.
+    """
+    arxiv_session = RateLimitedSession(RateLimiter(rate=1, per=ARXIV_DELAY_SECONDS), pool_maxsize=batch_size)
+    arxiv_client = create_arxiv_client(batch_size, session=arxiv_session)
+    resolved = resolved or {}
+    local = title_index.resolve([title for title in titles if title not in resolved]) if title_index is not None else {}
+    if title_index is not None:
+        logger.info(f"Resolved {len(local)} titles from the local title index")
+    title_queue = asyncio.Queue()
+    resolved_queue = asyncio.Queue()
+    for title in titles:
+        if title in resolved:
+            resolved_queue.put_nowait((title, None, resolved[title]))
+        elif title in local:
+            resolved_queue.put_nowait((title, local[title], None))
+        else:
+            title_queue.put_nowait(title)
+    fallback_queue = asyncio.Queue()
+    results = {}
+    found_count = 0
+    progress = tqdm(total=len(titles), desc="Processing papers")
+
+    async def lookup_worker():
+        while True:
+            try:
+                title = title_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result, candidates = await asyncio.to_thread(search_arxiv_candidates, title, arxiv_client)
+            except Exception as e:
+                logger.error(f"Error searching arXiv for '{title}': {e}")
+                await resolved_queue.put((title, None, lookup_error_record(title, e)))
+                continue
+            if result is None and candidates:
+                await fallback_queue.put((title, candidates))
+            else:
+                await resolved_queue.put((title, result, None))
+
+    async def fallback_matcher():
+        # Groups the titles waiting for a semantic match, so they share one embedding call
+        done = False
+        while not done:
+            pending = [await fallback_queue.get()]
+            while len(pending) < batch_size and not fallback_queue.empty():
+                pending.append(fallback_queue.get_nowait())
+            if None in pending:
+                done = True
+                pending = [item for item in pending if item is not None]
+            if pending:
+                try:
+                    matches = await asyncio.to_thread(match_fallback_titles, dict(pending))
+                except Exception as e:
+                    logger.error(f"Semantic title matching failed: {e}")
+                    for title, _ in pending:
+                        await resolved_queue.put((title, None, lookup_error_record(title, e)))
+                    continue
+                for title, _ in pending:
+                    await resolved_queue.put((title, matches.get(title), None))
+
+    async def analysis_worker():
+        nonlocal found_count
+        while True:
+            item = await resolved_queue.get()
+            if item is None:
+                return
+            title, arxiv_paper, paper = item
+            try:
+                if paper is None:
+                    paper = await asyncio.to_thread(build_paper_record, title, arxiv_paper)
+                    if on_resolved is not None:
+                        on_resolved(title, paper)
+                found_count += not paper.get('not_found', True)
+                paper = await analyze_paper(paper)
+            except Exception as e:
+                logger.error(f"Failed to process '{title}': {e}")
+                paper = None
+            if paper:
+                results[title] = paper
+                if on_result is not None:
+                    on_result(title, paper)
+            progress.update(1)
+
+    analysis_workers = int(os.getenv("LLM_WORKERS", "32"))
+    analysis_tasks = [asyncio.create_task(analysis_worker()) for _ in range(max(1, min(analysis_workers, len(titles))))]
+    matcher_task = asyncio.create_task(fallback_matcher())
+    try:
+        await asyncio.gather(*(lookup_worker() for _ in range(max(1, min(batch_size, title_queue.qsize())))))
+        await fallback_queue.put(None)
+        await matcher_task
+        for _ in analysis_tasks:
+            await resolved_queue.put(None)
+        await asyncio.gather(*analysis_tasks)
+    finally:
+        progress.close()
+
+    logger.info(f"Found {found_count} papers out of {len(titles)} ({arxiv_session.limiter.total_wait:.0f} seconds waiting on the arXiv rate limit)")
+    return [results[title] for title in titles if title in results]
+
+def process_papers_in_batches(titles, batch_size=5, on_result=None, resolved=None, on_resolved=None, title_index=None):
+    """Synchronous entry point of process_papers_pipeline"""
+    logger.info(f"Processing {len(titles)} paper titles with {batch_size} concurrent arXiv lookups...")
+    if not titles:
+        return []
+    return asyncio.run(process_papers_pipeline(titles, batch_size, on_result, resolved, on_resolved, title_index))
+
+def process_papers_with_checkpoint(titles, checkpoint_path, batch_size=5, title_index=None):
+    """
+    Processes titles through a checkpoint journal, so an interrupted run resumes where it stopped.
+
+    The journal (`checkpoint_path`, a JSON Lines store keyed by the title as listed in the
+    markdown) records every paper once its arXiv lookup completes and again once it is analysed.
+    Analysed titles are skipped; looked-up ones go straight to analysis. Papers whose analysis
+    failed are retried, and titles whose lookup failed (see lookup_error_record) are looked up
+    again. Returns the papers of every title in the journal, in title order.
+    """
+    def journal_entry(title, paper, status):
+        return {"query_title": title, "status": status, "paper": paper}
+
+    with JSONLRecordStore(checkpoint_path, key=lambda entry: entry['query_title']) as journal:
+        done, resolved = set(), {}
+        for title in titles:
+            entry = journal.get(title)
+            if entry is None:
+                continue
+            if entry['status'] == "analyzed":
+                done.add(title)
+            elif entry['status'] == "lookup_failed":
+                continue
+            else:
+                resolved[title] = entry['paper']
+        if done or resolved:
+            logger.warning(f"Resuming from {checkpoint_path}: {len(done)} titles done, {len(resolved)} awaiting analysis")
+
+        def on_result(title, paper):
+            if 'lookup_error' in paper:
+                status = "lookup_failed"
+            elif 'analysis_error' in paper:
+                status = "resolved"
+            else:
+                status = "analyzed"
+            journal.append(journal_entry(title, paper, status))
+
+        process_papers_in_batches(
+            [title for title in titles if title not in done], batch_size,
+            on_result=on_result, resolved=resolved,
+            on_resolved=lambda title, paper: journal.append(journal_entry(title, paper, "resolved")),
+            title_index=title_index,
+        )
+        papers = []
+        for title in titles:
+            entry = journal.get(title)
+            if entry is not None:
+                papers.append(entry['paper'])
+    return papers
 
 def main():
     parser = argparse.ArgumentParser(description='Process paper titles from a markdown file.')
     parser.add_argument('md_file', help='Path to the markdown file with paper titles')
-    parser.add_argument('--output', '-o', help='Output path (default: [input_filename]_analyzed.json)')
-    parser.add_argument('--batch-size', '-b', type=int, default=5, help='Batch size for processing papers')
+    parser.add_argument('--output', '-o', help='Output path (default: [input_filename]_analyzed.jsonl)')
+    parser.add_argument('--batch-size', '-b', type=int, default=5, help='Number of concurrent arXiv lookups (requests stay paced at one every 3 seconds)')
+    parser.add_argument('--paper-store', help="SQLite paper store used as a local title index (default: PAPER_STORE or the scrapt_arxiv store; 'none' disables it)")
+    parser.add_argument('--title-dump', action='append', default=None, help='arXiv metadata dump (.jsonl/.json) added to the local title index; repeatable (default: TITLE_INDEX_DUMPS)')
+    parser.add_argument('--fresh', action='store_true', help='Ignore the checkpoint journal of a previous run and start over')
     args = parser.parse_args()
     
     # Load environment variables
@@ -295,13 +460,17 @@ def main():
     
     logger.info(f"Found {len(paper_titles)} paper titles to process")
     
-    # Process papers
-    papers = process_papers_in_batches(paper_titles, args.batch_size)
+    # Process papers, journaling progress so an interrupted run can be resumed
+    checkpoint_path = f"{output_path}.checkpoint.jsonl"
+    if args.fresh:
+        for stale in (checkpoint_path, checkpoint_path + ".idx"):
+            if os.path.exists(stale):
+                os.remove(stale)
+    title_index = build_title_index(args.paper_store, args.title_dump or dump_paths_from_env())
+    papers = process_papers_with_checkpoint(paper_titles, checkpoint_path, args.batch_size, title_index if len(title_index) else None)
     
     # Save results to JSON
-    json_output = f"{output_path}.json"
-    with open(json_output, 'w', encoding='utf-8') as f:
-        json.dump(papers, f, indent=4, default=str)
+    json_output = write_records(f"{output_path}.jsonl", papers)
     logger.info(f"Saved paper data to {json_output}")
     
     # Generate markdown from processed papers
@@ -312,6 +481,9 @@ def main():
     # Print summary
     found_papers = sum(1 for paper in papers if not paper.get('not_found', True))
     logger.warning(f"Summary: Successfully processed {found_papers} out of {len(paper_titles)} papers")
+    failed_lookups = sum(1 for paper in papers if 'lookup_error' in paper)
+    if failed_lookups:
+        logger.warning(f"{failed_lookups} arXiv lookups failed; rerun the same command to retry them")
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
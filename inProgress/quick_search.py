@@ -5,7 +5,7 @@ import aisuite as ai
 from dotenv import load_dotenv
 from scripts.inProgress.prompts import *
 import wikipedia
-from sentence_transformers import SentenceTransformer
+from scripts.utils.embeddings import get_embedding_model
 from sklearn.metrics.pairwise import cosine_similarity
 from duckduckgo_search import DDGS
 import re
@@ -123,7 +123,7 @@ def scrape_wikipedia_page(titles: list[str],query) -> str:
     # Scrape the Wikipedia page using BeautifulSoup.
     pages = []
     score = []
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    model = get_embedding_model("all-MiniLM-L6-v2", trust_remote_code=False)
     query_embedding = model.encode(query)
     for t in titles:
         # print(t)
@@ -1,6 +1,5 @@
+import asyncio
 import requests
-from bs4 import BeautifulSoup
-import json
 import datetime
 import os
 import time
@@ -8,18 +7,26 @@ import arxiv
 from dotenv import load_dotenv, find_dotenv
 from scrapt_arxiv import detect_github_repos, get_github_repo_stars
 import utils.md_format as mdf
+from utils.jsonl_store import JSONLRecordStore, open_records
+from utils.conference_ingest import ListingIngester
+from utils.llm_engine import run_llm_jobs
+from utils.title_index import build_title_index, dump_paths_from_env
+from utils.title_match import best_matches
 import logging
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-import re
 
 
 
 
 not_found=0
 
+CVPR_URL = 'https://cvpr.thecvf.com/Conferences/2025/AcceptedPapers'
+# arXiv lookups of a paper without a match (one per run) before it is left alone
+MAX_ARXIV_ATTEMPTS = 14
+
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
@@ -37,68 +44,21 @@ def create_retry_session(retries=3):
     session.mount('https://', adapter)
     return session
 
-def scrape_cvpr_titles():
-    """Scrape paper titles and basic info from CVPR website"""
-    url = 'https://cvpr.thecvf.com/Conferences/2025/AcceptedPapers'
-    session = create_retry_session()
-    papers = []
-    
-    try:
-        response = session.get(url, timeout=30)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to fetch CVPR papers: {e}")
-        return papers
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    rows = soup.find_all('tr')
-    
-    if not rows:
-        logger.warning("No paper entries found. The page structure might have changed.")
-        return papers
-
-    total_papers = len([r for r in rows if r.find('strong')])
-    processed = 0
-
-    for row in rows:
-        try:
-            title_tag = row.find('strong')
-            if not title_tag:
-                continue
-            
-            processed += 1
-            logger.info(f"Processing paper title {processed}/{total_papers}")
-            
-            title = title_tag.get_text(strip=True)
-            authors_tag = row.find('div', class_='indented')
-            authors = authors_tag.get_text(" ", strip=True) if authors_tag else ""
-            
-            # Only keep title and authors from web scraping
-            # We'll get abstracts and other details from arXiv
-            paper_details = {
-                "title": title,
-                "authors": authors.split(", "),
-                "cvpr_scraped_date": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z")
-            }
-            papers.append(paper_details)
-            
-        except Exception as e:
-            logger.error(f"Failed to process paper title: {e}")
-            continue
-
-    return papers
-
-def normalize_title(title):
-    """Normalize title for better matching with arXiv"""
-    # Remove special characters, lowercase, etc.
-    title = re.sub(r'[^\w\s]', '', title.lower())
-    title = re.sub(r'\s+', ' ', title).strip()
-    return title
+def rows_to_papers(rows):
+    """Paper records of accepted-papers rows ({"title", "authors"})"""
+    # Only keep title and authors from web scraping
+    # We'll get abstracts and other details from arXiv
+    scraped_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z")
+    return [{
+        "title": row["title"],
+        "authors": row["authors"].split(", "),
+        "cvpr_scraped_date": scraped_date,
+        "arxiv_attempts": 1
+    } for row in rows]
 
 def find_paper_on_arxiv(title, client, max_results=5):
     """Find paper on arXiv by title"""
     # Prepare search query with the title
-    normalized_title = normalize_title(title)
     search_query = f'ti:"{title}"'
     
     # Configure search
@@ -122,15 +82,11 @@ def find_paper_on_arxiv(title, client, max_results=5):
             )
             broader_results = list(client.results(broader_search))
             
-            # Match by comparing normalized titles
-            for result in broader_results:
-                result_normalized = normalize_title(result.title)
-                # Check if titles are similar (80% match or more)
-                if len(result_normalized) > 0 and len(normalized_title) > 0:
-                    # Simple character-level similarity
-                    similarity = sum(c1 == c2 for c1, c2 in zip(result_normalized, normalized_title)) / max(len(result_normalized), len(normalized_title))
-                    if similarity > 0.8:
-                        return result
+            # Match by edit-distance similarity of the normalized titles, all candidates scored at once
+            best, similarity = best_matches({title: [result.title for result in broader_results]})[title]
+            if best is not None:
+                logger.info(f"Matched '{title}' to '{broader_results[best].title}' (similarity {similarity:.2f})")
+                return broader_results[best]
         
         # Return the first result if any found from direct search
         if results:
@@ -149,8 +105,11 @@ def enhance_paper_with_arxiv(paper, arxiv_client):
     logger.info(f"Looking up '{title}' on arXiv...")
     
     # Find paper on arXiv
-    arxiv_paper = find_paper_on_arxiv(title, arxiv_client)
-    
+    return apply_arxiv_result(paper, find_paper_on_arxiv(title, arxiv_client))
+
+def apply_arxiv_result(paper, arxiv_paper):
+    """Add the details of an arXiv result (arxiv.Result or title index LocalResult) to a CVPR paper"""
+    title = paper['title']
     if not arxiv_paper:
         logger.warning(f"No arXiv match found for '{title}'")
         global not_found
@@ -177,15 +136,27 @@ def enhance_paper_with_arxiv(paper, arxiv_client):
     
     return paper
 
-def enhance_papers_with_arxiv_data(papers, batch_size=5):
-    """Enhance multiple papers with arXiv data in batches"""
+def enhance_papers_with_arxiv_data(papers, batch_size=5, title_index=None):
+    """
+    Enhance multiple papers with arXiv data in batches.
+
+    Titles found in `title_index` (a utils.title_index.TitleIndex) are resolved locally; only the
+    remaining ones are looked up through the arXiv API.
+    """
     arxiv_client = arxiv.Client(page_size=batch_size)
     enhanced_papers = []
     
     logger.info(f"Enhancing {len(papers)} papers with arXiv data...")
     
-    for i in tqdm(range(0, len(papers), batch_size), desc="Fetching arXiv data"):
-        batch = papers[i:i + batch_size]
+    remaining = papers
+    if title_index is not None:
+        local = title_index.resolve(paper['title'] for paper in papers)
+        enhanced_papers.extend(apply_arxiv_result(paper, local[paper['title']]) for paper in papers if paper['title'] in local)
+        remaining = [paper for paper in papers if paper['title'] not in local]
+        logger.info(f"Resolved {len(local)} papers from the local title index, {len(remaining)} left for the arXiv API")
+    
+    for i in tqdm(range(0, len(remaining), batch_size), desc="Fetching arXiv data"):
+        batch = remaining[i:i + batch_size]
         batch_enhanced = []
         
         with ThreadPoolExecutor(max_workers=batch_size) as executor:
@@ -203,7 +174,7 @@ def enhance_papers_with_arxiv_data(papers, batch_size=5):
         enhanced_papers.extend(batch_enhanced)
         
         # Respect arXiv API rate limits
-        if i + batch_size < len(papers):
+        if i + batch_size < len(remaining):
             time.sleep(3)
     
     # Check how many papers were successfully enhanced
@@ -212,63 +183,79 @@ def enhance_papers_with_arxiv_data(papers, batch_size=5):
     
     return enhanced_papers
 
-def scrape_cvpr_papers_pipeline():
-    """Pipeline for scraping papers from CVPR and enhancing with arXiv"""
-    # First get paper titles from CVPR website
-    cvpr_papers = scrape_cvpr_titles()
-    
-    if not cvpr_papers:
-        return []
-    
-    # Then enhance with arXiv data
-    enhanced_papers = enhance_papers_with_arxiv_data(cvpr_papers)
-    
-    return enhanced_papers
+def unmatched_papers(raw_store, titles, max_attempts=MAX_ARXIV_ATTEMPTS):
+    """Stored papers of `titles` that have no arXiv match yet and fewer than `max_attempts` lookups"""
+    titles = set(titles)
+    return [paper for paper in raw_store
+            if paper['title'] in titles and not paper.get('arxiv_id') and paper.get('arxiv_attempts', 1) < max_attempts]
+
+def scrape_cvpr_updates(state_path, raw_file):
+    """
+    Incremental pipeline: fetch the CVPR listing (conditional GET), enhance the added or changed
+    papers with arXiv and append them to the raw JSONL store. Stored papers without an arXiv match
+    are looked up again on every run, up to MAX_ARXIV_ATTEMPTS times (preprints often appear later).
+
+    Returns (titles currently listed, titles whose analysis must be redone, whether anything was stored).
+    """
+    ingester = ListingIngester(CVPR_URL, state_path, session=create_retry_session())
+    try:
+        changes = ingester.check()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to fetch CVPR papers: {e}")
+        return ingester.titles, set(), False
+
+    for title in changes["removed"]:
+        logger.warning(f"No longer listed: '{title}'")
+    updated_rows = changes["added"] + changes["changed"]
+    updated_titles = {row["title"] for row in updated_rows}
+    with JSONLRecordStore(raw_file, key=lambda paper: paper['title']) as raw_store:
+        retries = [paper for paper in unmatched_papers(raw_store, ingester.titles) if paper['title'] not in updated_titles]
+        for paper in retries:
+            paper['arxiv_attempts'] = paper.get('arxiv_attempts', 1) + 1
+        if retries:
+            logger.info(f"Retrying the arXiv lookup of {len(retries)} unmatched papers")
+        papers = rows_to_papers(updated_rows) + retries
+        if papers:
+            # Titles already harvested into the local paper store (or listed in TITLE_INDEX_DUMPS) skip the arXiv API
+            title_index = build_title_index(dump_paths=dump_paths_from_env())
+            papers = enhance_papers_with_arxiv_data(papers, title_index=title_index if len(title_index) else None)
+            raw_store.extend(papers)
+            logger.info(f"Scraped and enhanced {len(papers)} new, changed or unmatched papers")
+    # The snapshot only advances once the changes are stored, so an interrupted run retries them
+    ingester.commit()
+    # Papers analysed from their title alone are analysed again once arXiv provides the abstract
+    matched = {paper['title'] for paper in retries if paper.get('arxiv_id')}
+    reanalyze = {row["title"] for row in changes["changed"]} | matched
+    return ingester.titles, reanalyze, bool(updated_rows or changes["removed"] or matched)
+
+def analysis_text(paper):
+    """Text sent to the LLM for a paper: its title and, when available, its abstract"""
+    # Check if paper has an abstract (from arXiv)
+    if not paper.get('abstract'):
+        logger.warning(f"Paper '{paper.get('title')}' has no abstract, using title only for analysis")
+        return f"Title: {paper['title']}\n"
+    return f"Title: {paper['title']}\nAbstract: {paper['abstract']}\n"
 
-def process_paper_analysis(paper):
-    """Process analysis for a single paper"""
+async def process_paper_analysis(paper, batch_analysis=None):
+    """Process analysis for a single paper (coroutine run on the llm_engine work queue)"""
     try:
-        # Check if paper has an abstract (from arXiv)
-        if not paper.get('abstract'):
-            logger.warning(f"Paper '{paper.get('title')}' has no abstract, using title only for analysis")
-            text_for_processing = f"Title: {paper['title']}\n"
-        else:
-            text_for_processing = f"Title: {paper['title']}\nAbstract: {paper['abstract']}\n"
+        text_for_processing = analysis_text(paper)
         
-        # Retry LLM calls up to 3 times with exponential backoff
-        retries = 3
-        for attempt in range(retries):
-            try:
-                main_task = mdf.get_tasks_tags(text_for_processing)
-                contributions = mdf.get_contributions(text_for_processing)
-                summary = mdf.get_paper_summary(text_for_processing)
-                break
-            except Exception as e:
-                if attempt == retries - 1:  # Last attempt
-                    logger.error(f"Failed to get LLM analysis after {retries} attempts: {e}")
-                    main_task = "Analysis failed"
-                    contributions = "Analysis failed"
-                    summary = "Analysis failed"
-                time.sleep(2 ** attempt)  # Exponential backoff
+        # LLM retries and backoff are handled by the client, within the provider budget.
+        # Fields already answered by a batch job are not asked again.
+        try:
+            analysis = await mdf.aget_paper_analysis(text_for_processing, batch_analysis)
+            main_task = analysis['main_task']
+            contributions = analysis['contributions']
+            summary = analysis['summary']
+        except Exception as e:
+            logger.error(f"Failed to get LLM analysis: {e}")
+            main_task = "Analysis failed"
+            contributions = "Analysis failed"
+            summary = "Analysis failed"
         
-        # Look for GitHub repos in the abstract if available
-        if paper.get('abstract'):
-            github_urls = detect_github_repos(paper['abstract'])
-            if github_urls:
-                repo_url = github_urls[0]
-                try:
-                    stars = get_github_repo_stars(repo_url, os.getenv("GITHUB_TOKEN"))
-                    paper['repo'] = repo_url[:-1] if repo_url[-1] == "." else repo_url
-                except Exception as e:
-                    logger.error(f"Failed to get GitHub stars for {repo_url}: {e}")
-                    stars = 0
-                    paper['repo'] = "N/A"
-            else:
-                stars = 0
-                paper['repo'] = "N/A"
-        else:
-            stars = 0
-            paper['repo'] = "N/A"
+        # The GitHub lookup is blocking: keep it off the event loop
+        stars = await asyncio.to_thread(attach_github_repo, paper)
         
         paper.update({
             "main_task": main_task,
@@ -283,82 +270,92 @@ def process_paper_analysis(paper):
         logger.error(f"Failed to analyze paper '{paper.get('title', 'Unknown')}': {e}")
         return None
 
-def load_existing_analyzed_papers(output_file):
-    """Load existing analyzed papers from JSON file if it exists"""
+def attach_github_repo(paper):
+    """Sets paper['repo'] from the first GitHub link of the abstract and returns its stars"""
+    # Look for GitHub repos in the abstract if available
+    github_urls = detect_github_repos(paper['abstract']) if paper.get('abstract') else []
+    if not github_urls:
+        paper['repo'] = "N/A"
+        return 0
+    repo_url = github_urls[0]
     try:
-        if os.path.exists(output_file):
-            with open(output_file, 'r') as f:
-                existing_papers = json.load(f)
-            logger.info(f"Loaded {len(existing_papers)} existing analyzed papers")
-            return {paper['title']: paper for paper in existing_papers}
-        return {}
+        stars = get_github_repo_stars(repo_url, os.getenv("GITHUB_TOKEN"))
+        if stars is None:
+            stars = -1 # Rate limit still exhausted: stars couldn't be fetched
+        paper['repo'] = repo_url[:-1] if repo_url[-1] == "." else repo_url
     except Exception as e:
-        logger.error(f"Error loading existing papers: {e}")
-        return {}
+        logger.error(f"Failed to get GitHub stars for {repo_url}: {e}")
+        stars = 0
+        paper['repo'] = "N/A"
+    return stars
 
-def filter_unanalyzed_papers(papers, existing_papers):
-    """Filter out papers that have already been analyzed"""
+def load_existing_analyzed_papers(output_file):
+    """Open the append-only JSONL store of analyzed papers, keyed by title"""
+    existing_papers = JSONLRecordStore(output_file, key=lambda paper: paper['title'])
+    logger.info(f"Loaded {len(existing_papers)} existing analyzed papers")
+    return existing_papers
+
+def filter_unanalyzed_papers(papers, existing_papers, reanalyze=()):
+    """Filter out papers that have already been analyzed (unless their title is in `reanalyze`)"""
     unanalyzed = []
     for paper in papers:
-        if paper['title'] not in existing_papers:
+        if paper['title'] not in existing_papers or paper['title'] in reanalyze:
             unanalyzed.append(paper)
     logger.info(f"Found {len(unanalyzed)} papers that need analysis")
     return unanalyzed
 
 def save_analyzed_batch(analyzed_batch, output_file, existing_papers):
-    """Save the current batch of analyzed papers"""
+    """Append the current batch of analyzed papers to the JSONL store (only the new lines are written)"""
     try:
-        # Update existing papers with new batch
-        for paper in analyzed_batch:
-            existing_papers[paper['title']] = paper
-        
-        # Convert to list for JSON serialization
-        papers_list = list(existing_papers.values())
-        
-        # Save atomically using temporary file
-        temp_file = output_file + '.tmp'
-        with open(temp_file, 'w') as f:
-            json.dump(papers_list, f, indent=4, default=str)
-        os.replace(temp_file, output_file)
-        
-        logger.info(f"Saved {len(analyzed_batch)} papers, total: {len(existing_papers)}")
+        existing_papers.extend(analyzed_batch)
+        logger.info(f"Saved {len(analyzed_batch)} papers to {output_file}, total: {len(existing_papers)}")
     except Exception as e:
         logger.error(f"Error saving analyzed batch: {e}")
 
-def analyze_papers_pipeline(papers, output_file, batch_size=10):
-    """Pipeline for analyzing papers with LLM and adding metadata"""
+def analyze_papers_pipeline(papers, output_file, batch_size=10, batch_dir=None, reanalyze=()):
+    """
+    Pipeline for analyzing papers with LLM and adding metadata.
+
+    With `batch_dir`, the analyses are first requested through the provider batch API
+    (mdf.batch_paper_analysis, resumable from that directory); only what it could not answer
+    goes through live calls. Titles in `reanalyze` are analysed again even if already stored.
+    """
     # Load existing analyzed papers
     existing_papers = load_existing_analyzed_papers(output_file)
     
     # Filter out already analyzed papers
-    unanalyzed_papers = filter_unanalyzed_papers(papers, existing_papers)
+    unanalyzed_papers = filter_unanalyzed_papers(papers, existing_papers, reanalyze)
     if not unanalyzed_papers:
         logger.info("No new papers to analyze")
-        return list(existing_papers.values())
-    
-    total_batches = (len(unanalyzed_papers) + batch_size - 1) // batch_size
-    analyzed_papers = []
+        return existing_papers
     
-    for i in tqdm(range(0, len(unanalyzed_papers), batch_size), total=total_batches, desc="Analyzing papers"):
-        batch = unanalyzed_papers[i:i + batch_size]
-        batch_results = []
-        
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            futures = []
-            for paper in batch:
-                futures.append(executor.submit(process_paper_analysis, paper))
-            
-            for future in futures:
-                result = future.result()
-                if result:
-                    batch_results.append(result)
-        
-        # Save batch results immediately
-        if batch_results:
-            save_analyzed_batch(batch_results, output_file, existing_papers)
-            analyzed_papers.extend(batch_results)
+    # Papers flow through a continuous LLM work queue; results are saved every `batch_size` papers
+    pending = []
+    analyzed_count = 0
+
+    def collect(paper, result):
+        nonlocal analyzed_count
+        if result:
+            pending.append(result)
+            analyzed_count += 1
+        if len(pending) >= batch_size:
+            save_analyzed_batch(pending, output_file, existing_papers)
+            pending.clear()
+
+    batched = {}
+    if batch_dir:
+        batched = mdf.batch_paper_analysis({paper['title']: analysis_text(paper) for paper in unanalyzed_papers}, batch_dir)
+
+    async def analyze(paper):
+        return await process_paper_analysis(paper, batched.get(paper['title']))
+
+    run_llm_jobs(unanalyzed_papers, analyze, on_result=collect, desc="Analyzing papers")
+    if pending:
+        save_analyzed_batch(pending, output_file, existing_papers)
+    logger.info(f"Analyzed {analyzed_count} of {len(unanalyzed_papers)} papers")
     
-    return list(existing_papers.values())
+    existing_papers.close()
+    return existing_papers
 
 if __name__ == "__main__":
     try:
@@ -376,35 +373,35 @@ if __name__ == "__main__":
         os.makedirs(raw_folder, exist_ok=True)
         
         today = datetime.datetime.now().strftime("%Y%m%d")
-        raw_file = os.path.join(raw_folder, f"cvpr_papers_{today}_raw.json")
-        output_file = os.path.join(output_folder, f"cvpr_papers_{today}.json")
+        # The raw and analyzed stores accumulate across runs; each run only adds what the listing changed
+        raw_file = os.path.join(raw_folder, "cvpr_papers_raw.jsonl")
+        listing_state = os.path.join(raw_folder, "cvpr_listing_state.json")
+        output_file = os.path.join(output_folder, "cvpr_papers.jsonl")
         md_file = os.path.join(output_folder, f"cvpr_papers_{today}.md")
+        # LLM_BATCH=1 sends the analysis through the provider batch API (cheaper, resumable, not real time)
+        batch_dir = os.path.join(output_folder, "batch", today) if os.getenv("LLM_BATCH", "0").lower() in ("1", "true") else None
         
-        # Phase 1: Scraping and Enhancing with arXiv
+        # Phase 1: Scraping the listing changes and enhancing them with arXiv
+        logger.info("Checking the CVPR accepted papers listing...")
+        listed_titles, changed_titles, updated = scrape_cvpr_updates(listing_state, raw_file)
+        listed_titles = set(listed_titles)
         if not os.path.exists(raw_file):
-            logger.info("Starting CVPR papers scraping...")
-            papers = scrape_cvpr_papers_pipeline()
-            if not papers:
-                logger.error("No papers were successfully scraped")
-                exit(1)
-            
-            with open(raw_file, 'w') as f:
-                json.dump(papers, f, indent=4, default=str)
-            logger.info(f"Scraped and enhanced {len(papers)} papers")
+            logger.error("No papers were successfully scraped")
+            exit(1)
         
-        # Phase 2: Analysis
+        # Phase 2: Analysis of the papers still listed (new and changed ones are not analyzed yet)
         logger.info("Starting papers analysis...")
-        with open(raw_file, 'r') as f:
-            papers = json.load(f)
+        papers = [paper for paper in open_records(raw_file) if paper['title'] in listed_titles]
         
-        analyzed_papers = analyze_papers_pipeline(papers, output_file)
+        analyzed_papers = analyze_papers_pipeline(papers, output_file, batch_dir=batch_dir, reanalyze=changed_titles)
+        analyzed_papers = [paper for paper in analyzed_papers if paper['title'] in listed_titles]
         if not analyzed_papers:
             logger.error("No papers were successfully analyzed")
             exit(1)
         
         # Generate markdown only if needed
-        if not os.path.exists(md_file):
-            mdf.list_to_markdown(analyzed_papers, md_file, ai_summary=True)
+        if updated or not os.path.exists(md_file):
+            mdf.list_to_markdown(analyzed_papers, md_file, ai_summary=True, batch_dir=batch_dir)
             logger.info(f"Generated markdown at {md_file}")
         
         logger.info("Not found papers: {}".format(not_found))
@@ -1,25 +1,94 @@
 import logging
 import requests
 import xml.etree.ElementTree as ET
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import time
 import re
 import arxiv
 import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 # from dotenv import load_dotenv, find_dotenv
 try:
     import utils.md_format as mdf
 except ImportError:
     import md_format as mdf # type: ignore
+try:
+    from utils.embeddings import get_model_stats
+except ImportError:
+    from embeddings import get_model_stats # type: ignore
+try:
+    from utils.embedding_cache import EmbeddingCache
+    from utils.scoring import score_papers, score_query_blocks
+    from utils.paper_store import PaperStore
+    from utils.arxiv_query import build_arxiv_query, matches_query, plan_query
+    from utils.rate_limit import RateLimiter, RateLimitedSession
+    from utils import watermark as wm
+    from utils.github_meta import GitHubMetadataService, GitHubRateLimitError, github_request, default_limiter as default_github_limiter
+    from utils.jsonl_store import find_records_file, load_records, open_records, write_records
+    from utils.digest_stats import load_columns
+except ImportError:
+    from embedding_cache import EmbeddingCache # type: ignore
+    from scoring import score_papers, score_query_blocks # type: ignore
+    from paper_store import PaperStore # type: ignore
+    from arxiv_query import build_arxiv_query, matches_query, plan_query # type: ignore
+    from rate_limit import RateLimiter, RateLimitedSession # type: ignore
+    import watermark as wm # type: ignore
+    from github_meta import GitHubMetadataService, GitHubRateLimitError, github_request, default_limiter as default_github_limiter # type: ignore
+    from jsonl_store import find_records_file, load_records, open_records, write_records # type: ignore
+    from digest_stats import load_columns # type: ignore
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
 
-def get_recent_arxiv_links_with_arxivpy(query, sort_by_choice="relevance", max_results=50):
-    """Fetches recent ArXiv links using the arxiv library."""
+# arXiv API terms of use: no more than 1 request every 3 seconds
+ARXIV_DELAY_SECONDS = 3.0
+# Papers reach the API up to a few days after their `updated` (submission) time, so the most recent
+# days of a window are never recorded as covered: every run asks for them again
+ARXIV_ANNOUNCEMENT_LAG = datetime.timedelta(days=4)
+
+# Pooled connection reused by every get_github_repo_stars call (also used from worker threads)
+github_session = requests.Session()
+
+def result_to_paper(result):
+    """Converts an arxiv.Result into the paper dict used throughout the pipeline."""
+    # Combine abstract and comments safely
+    abstract_content = result.summary.replace("\n", " ")
+    comment_content = result.comment.replace("\n", " ") if result.comment else ""
+    full_abstract = abstract_content
+    if comment_content:
+        full_abstract += "\n\n" + comment_content # Add comments with spacing
+    
+    # Use result attributes directly for clarity
+    return {
+        "title": result.title,
+        "abstract": full_abstract,
+        "acm_classifications": result.categories, # Keep as is, might not be ACM specifically
+        "authors": [str(a) for a in result.authors], # Convert Author objects to strings
+        "primary_category": result.primary_category,
+        "date": result.updated, # Keep as datetime object
+        "link": result.entry_id
+    }
+
+def create_arxiv_client(page_size, session=None):
+    """Creates an arxiv.Client, optionally sending its requests through a shared (rate-limited) session."""
+    if session is None:
+        return arxiv.Client(page_size=page_size)
+    # The shared session enforces the rate limit, so the client must not add its own delay
+    client = arxiv.Client(page_size=page_size, delay_seconds=0)
+    client._session = session
+    return client
+
+def get_recent_arxiv_links_with_arxivpy(query, sort_by_choice="relevance", max_results=50, since=None, until=None, raise_errors=False, page_size=None, session=None):
+    """Fetches recent ArXiv links using the arxiv library.
+
+    With `sort_by_choice="lastUpdatedDate"`, `since`/`until` (timezone-aware datetimes) restrict the
+    results to that update window: newer papers are skipped and paging stops at the first older one.
+    With `raise_errors`, API errors are re-raised instead of returning the partial listing.
+    `page_size` defaults to `max_results` (a single request). A `session` (see utils.rate_limit)
+    replaces the per-client 3 second delay with a shared rate limiter.
+    """
     # Map string choice to arxiv library constants
     if sort_by_choice.lower() == "relevance":
         sort_criterion = arxiv.SortCriterion.Relevance
@@ -29,8 +98,9 @@ def get_recent_arxiv_links_with_arxivpy(query, sort_by_choice="relevance", max_r
         # Default or raise error for invalid choice
         logger.warning(f"Warning: Invalid sort_by_choice '{sort_by_choice}'. Defaulting to relevance.")
         sort_criterion = arxiv.SortCriterion.Relevance
+    date_sorted = sort_criterion == arxiv.SortCriterion.LastUpdatedDate
 
-    client = arxiv.Client(page_size=max_results)
+    client = create_arxiv_client(page_size or max_results, session)
     # Consider if 'all:' prefix is always desired or should be part of the input query
     # query = f'all:{query}' 
     start_time = time.time()
@@ -46,40 +116,28 @@ def get_recent_arxiv_links_with_arxivpy(query, sort_by_choice="relevance", max_r
     try:
         results = client.results(search)
         for result in results:
-            
-            # Removed placeholder comment for AI summary generation here
-            # create a summary of the abstract in 100 words with aisuite and ollama and llama3.3
-
-            
-            # Combine abstract and comments safely
-            abstract_content = result.summary.replace("\n", " ")
-            comment_content = result.comment.replace("\n", " ") if result.comment else ""
-            full_abstract = abstract_content
-            if comment_content:
-                full_abstract += "\n\n" + comment_content # Add comments with spacing
-            
-            # Use result attributes directly for clarity
-            paper_details = {
-                "title": result.title,
-                "abstract": full_abstract,
-                "acm_classifications": result.categories, # Keep as is, might not be ACM specifically
-                "authors": [str(a) for a in result.authors], # Convert Author objects to strings
-                "primary_category": result.primary_category,
-                "date": result.updated, # Keep as datetime object
-                "link": result.entry_id
-            }
-            papers.append(paper_details)
+            if date_sorted and until is not None and result.updated > until:
+                continue # Newer than the requested window
+            if date_sorted and since is not None and result.updated < since:
+                break # Results are sorted by update date, nothing older is needed
+            papers.append(result_to_paper(result))
     except Exception as e:
         logger.error(f"Error during ArXiv search: {e}")
-        # Potentially return partial results or raise the exception
-        # return papers 
+        if raise_errors:
+            e.partial_papers = papers # Keep what was fetched before the failure
+            raise
 
     end_time = time.time()
     logger.info(f"arxiv.py request time: {end_time - start_time:.2f} seconds for {len(papers)} papers.")
     return papers
 
 def get_github_repo_stars(repo_url, token):
-    """Fetches GitHub stars for a given repository URL."""
+    """Fetches GitHub stars for a given repository URL.
+
+    Requests share the process-wide GitHub rate limiter: when the quota runs out, the call waits
+    for the reset and retries instead of returning 0. Returns None (unknown) if the quota is
+    still exhausted after every retry.
+    """
     # Improved regex to handle potential trailing slashes or .git suffixes
     match = re.search(r'github\.com/([A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+?)(?:\.git)?/?$', repo_url)
     if match:
@@ -90,21 +148,18 @@ def get_github_repo_stars(repo_url, token):
             "Accept": "application/vnd.github.v3+json" # Best practice header
         }
         try:
-            response = requests.get(api_url, headers=headers, timeout=10) # Add timeout
+            response = github_request(github_session, "GET", api_url, default_github_limiter, headers=headers, timeout=10) # Add timeout
             response.raise_for_status() # Raise HTTPError for bad responses (4XX, 5XX)
             repo_data = response.json()
             return repo_data.get('stargazers_count', 0) # Use .get for safety
+        except GitHubRateLimitError as e:
+            # Unknown, not 0: callers must not store this as the repo's star count
+            logger.error(f"Giving up on GitHub stars for {repo_url}: {e}")
+            return None
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching GitHub stars for {repo_url}: {e}")
-            # Handle specific errors like rate limiting if possible
             if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 403:
-                if e.response.headers.get("X-RateLimit-Remaining") == "0":
-                    reset_time = int(e.response.headers.get("X-RateLimit-Reset", 0))
-                    wait_time = max(0, reset_time - int(time.time()))
-                    logger.info(f"GitHub rate limit exceeded. Retry after {wait_time} seconds.")
-                    # Consider waiting or raising a specific exception
-                else:
-                    logger.error("GitHub access forbidden. Check token permissions.")
+                logger.error("GitHub access forbidden. Check token permissions.")
             return 0 # Return 0 on errors
     else:
         logger.error(f"Invalid GitHub URL format: {repo_url}")
@@ -118,53 +173,23 @@ def detect_github_repos(text): # Renamed parameter for clarity
     cleaned_urls = [url.rstrip('./') for url in github_urls]
     return list(set(cleaned_urls)) # Return unique URLs
 
-def get_relevant_papers(query, papers, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1"):
-    """Calculates relevance scores for papers based on a query using sentence transformers."""
-    try:
-        # Load the model dynamically
-        model = SentenceTransformer(embedding_model_name, trust_remote_code=True)
-    except Exception as e:
-        logger.error(f"Error loading sentence transformer model '{embedding_model_name}': {e}. Using default.")
-        # Fallback to a default model if loading fails
-        try:
-            default_model = "all-MiniLM-L6-v2"
-            model = SentenceTransformer(default_model)
-            embedding_model_name = default_model # Update name if fallback is used
-        except Exception as fallback_e:
-             logger.error(f"Error loading default sentence transformer model: {fallback_e}")
-             return [] # Return empty list if models cannot be loaded
-
-    logger.info(f"Using embedding model: {embedding_model_name}")
-    
-    # Embed the query
-    query_embedding = model.encode([query])[0]
-
-    # Embed the papers' titles and abstracts
-    paper_embeddings = []
-    texts_to_embed = []
-    for paper in papers:
-        # Ensure abstract exists and is a string
-        abstract = paper.get('abstract', '') 
-        if not isinstance(abstract, str):
-             abstract = str(abstract) # Attempt conversion if not string
-        # Combine title and abstract for embedding
-        combined_text = paper.get('title', '') + " " + abstract 
-        texts_to_embed.append(combined_text)
+def get_relevant_papers(query, papers, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1", embedding_cache=None):
+    """Calculates relevance scores for papers based on a query using sentence transformers.
 
-    if not texts_to_embed:
-        return [] # No valid text found in papers
-
-    # Encode all paper texts in a batch for efficiency
-    paper_embeddings = model.encode(texts_to_embed)
+    When `embedding_cache` is given, only paper texts missing from the cache are encoded.
+    """
+    if not papers:
+        return []
 
-    # Calculate cosine similarity
-    similarities = cosine_similarity([query_embedding], paper_embeddings).flatten()
+    similarities = score_papers(papers, [query], embedding_model_name, embedding_cache)
+    if similarities is None:
+        return [] # Return empty list if models cannot be loaded
 
     # Add the score to the paper dict and sort
     scored_papers = []
     for i, paper in enumerate(papers):
         paper_copy = paper.copy() # Avoid modifying original dicts
-        paper_copy['score'] = float(similarities[i]) # Ensure score is float
+        paper_copy['score'] = float(similarities[i, 0]) # Ensure score is float
         scored_papers.append(paper_copy)
 
     # Sort by score descending
@@ -221,20 +246,71 @@ def filter_papers_by_date_and_category(papers, category, days=8):
     logger.info(f"Found {len(filtered_papers)} papers matching date and category criteria.")
     return filtered_papers
 
-def scrape_arxiv_papers_pipeline(query, category, sort_by_choice="lastUpdatedDate", max_results=50, days=8):
-    """Pipeline for scraping and filtering papers from ArXiv."""
+def harvest_arxiv_window(plan, paper_store, session=None):
+    """
+    Returns the papers of a planned query updated within [plan['since'], plan['until']], answered from
+    the local paper store and completed from the API only for the parts of the window the store has
+    not covered yet. Coverage is only recorded up to `ARXIV_ANNOUNCEMENT_LAG` before now, so the
+    trailing days, where submitted papers may still be announced, are re-queried on every run.
+
+    Blocks with a category harvest the whole category (plan['harvest_key']) and filter the stored
+    papers with their own query, so blocks searching the same category share one harvest.
+    """
+    key = plan['harvest_key']
+    settled_until = datetime.datetime.now(datetime.timezone.utc) - ARXIV_ANNOUNCEMENT_LAG
+    with paper_store.harvest_lock(key):
+        for gap_start, gap_end in paper_store.missing_ranges(key, plan['since'], plan['until']):
+            search_query = build_arxiv_query(plan['harvest_query'], plan['category'], gap_start, gap_end)
+            logger.info(f"Harvesting from the API: {search_query}")
+            complete = True
+            try:
+                papers = get_recent_arxiv_links_with_arxivpy(search_query, plan['sort_by_choice'], max_results=plan['harvest_max_results'], since=gap_start, until=gap_end, raise_errors=True, page_size=plan['page_size'], session=session)
+            except Exception as e:
+                papers = getattr(e, "partial_papers", [])
+                complete = False
+            paper_store.add_papers(papers, query_key=key)
+            # A truncated or interrupted listing only covers the window down to its oldest paper
+            covered_start = gap_start
+            if not complete or len(papers) >= plan['harvest_max_results']:
+                if not papers:
+                    continue
+                covered_start = max(gap_start, min(paper['date'] for paper in papers))
+            paper_store.add_coverage(key, covered_start, min(gap_end, settled_until))
+    papers = paper_store.get_papers(key, plan['since'], plan['until'])
+    if plan['harvest_query'] != plan['query']:
+        papers = [paper for paper in papers if matches_query(paper, plan['query'])][:plan['max_results']]
+    return papers
+
+def scrape_arxiv_papers_pipeline(query, category, sort_by_choice="lastUpdatedDate", max_results=50, days=8, paper_store=None, session=None):
+    """Pipeline for scraping and filtering papers from ArXiv.
+
+    The category and (for date-sorted listings) the date window are pushed into the arXiv query, and
+    paging stops at the first paper older than the window. When a `paper_store` is given, the query
+    is answered from the store and only the missing part of the window is fetched from the API.
+    """
     logger.info(f"\n--- Starting Scrape Pipeline for category '{category}' ---")
     logger.info(f"Query: '{query}', Sort: '{sort_by_choice}', Max Results: {max_results}, Days: {days}")
     start_time = time.time()
-    # Use the refined function name
-    papers = get_recent_arxiv_links_with_arxivpy(query, sort_by_choice, max_results=max_results)
+    plan = plan_query({"query": query, "category": category, "sort_by_choice": sort_by_choice, "max_results": max_results}, days=days)
+    if paper_store is not None and plan['date_sorted']:
+        papers = harvest_arxiv_window(plan, paper_store, session)
+    else:
+        since = plan['since'] if plan['date_sorted'] else None
+        papers = get_recent_arxiv_links_with_arxivpy(plan['search_query'], sort_by_choice, max_results=max_results, since=since, page_size=plan['page_size'], session=session)
+        if paper_store is not None:
+            paper_store.add_papers(papers, query_key=plan['key'])
     filtered_papers = filter_papers_by_date_and_category(papers, category, days=days)
     end_time = time.time()
     logger.info(f"--- Scrape Pipeline finished in {end_time - start_time:.2f} seconds ---")
     return filtered_papers
 
-def analyze_papers_pipeline(papers, filter_query, negative_query, score_threshold=0.6, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1", github_token=None):
-    """Pipeline for analyzing, scoring, and enriching papers."""
+def analyze_papers_pipeline(papers, filter_query, negative_query, score_threshold=0.6, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1", github_token=None, embedding_cache=None, scores=None, github_service=None):
+    """Pipeline for analyzing, scoring, and enriching papers.
+
+    `scores` may hold precomputed [positive, negative] similarities aligned with `papers`
+    (see utils.scoring.score_query_blocks); otherwise both queries are scored in one pass.
+    With a `github_service` (utils.github_meta), star counts are fetched in bulk and cached.
+    """
     logger.info(f"\n--- Starting Analysis Pipeline ---")
     logger.info(f"Positive Query: '{filter_query}', Negative Query: '{negative_query}', Threshold: {score_threshold}")
     start_time = time.time()
@@ -243,24 +319,37 @@ def analyze_papers_pipeline(papers, filter_query, negative_query, score_threshol
         logger.warning("No papers provided for analysis. Skipping.")
         return []
         
-    # Get relevance scores based on the positive filter query
-    relevant_papers = get_relevant_papers(filter_query, papers, embedding_model_name)
-    logger.info(f"Calculated positive scores for {len(relevant_papers)} papers.")
+    # Score the papers against the positive and negative queries at once
+    if scores is None:
+        scores = score_papers(papers, [filter_query, negative_query], embedding_model_name, embedding_cache)
+        if scores is None:
+            return []
+    logger.info(f"Calculated positive and negative scores for {len(papers)} papers.")
     
     # Filter by positive score threshold first
-    relevant_papers = [paper for paper in relevant_papers if paper.get('score', 0) >= score_threshold]
+    relevant_papers = []
+    for paper, (positive_similarity, negative_similarity) in zip(papers, scores):
+        if positive_similarity >= score_threshold:
+            paper = paper.copy() # Avoid modifying original dicts
+            paper['positive_score'] = float(positive_similarity)
+            paper['negative_score'] = 1.0 - float(negative_similarity) # Lower similarity to negative is better
+            relevant_papers.append(paper)
     logger.info(f"{len(relevant_papers)} papers remaining after positive score threshold ({score_threshold}).")
 
     if not relevant_papers:
         logger.info("No papers met the positive score threshold. Analysis stopped.")
         return []
 
-    # Rename positive score and add GitHub info
-    processed_papers = []
+    # Add GitHub info
+    final_papers = []
     if github_token is None:
          logger.warning("Warning: GITHUB_TOKEN not provided. Cannot fetch star counts.")
+    stars_by_repo = {}
+    if github_token and github_service is not None:
+        # One deduplicated, cached and concurrent lookup for the whole block
+        repo_urls = [urls[0] for urls in (detect_github_repos(p.get('abstract', '')) for p in relevant_papers) if urls]
+        stars_by_repo = github_service.get_stars(repo_urls)
     for paper in relevant_papers:
-        paper['positive_score'] = paper.pop('score') # Rename score to positive_score
         github_urls = detect_github_repos(paper.get('abstract', ''))
         paper['repo'] = "N/A"
         paper['stars'] = 0
@@ -268,37 +357,19 @@ def analyze_papers_pipeline(papers, filter_query, negative_query, score_threshol
             # Usually, the first detected repo is the most relevant
             repo_url = github_urls[0]
             paper['repo'] = repo_url 
-            if github_token:
+            if repo_url in stars_by_repo:
+                 paper['stars'] = stars_by_repo[repo_url]
+            elif github_token:
                  stars = get_github_repo_stars(repo_url, github_token)
-                 paper['stars'] = stars
+                 paper['stars'] = stars if stars is not None else -1
             else:
                  paper['stars'] = -1 # Indicate stars couldn't be fetched
-        processed_papers.append(paper)
-        
-    logger.info(f"Added GitHub info (stars require GITHUB_TOKEN).")
-
-    # Calculate negative scores for the filtered papers
-    # We pass processed_papers which now have 'positive_score' but no 'score' key
-    # get_relevant_papers calculates 'score' based on the negative_query
-    negative_scored_papers = get_relevant_papers(negative_query, processed_papers, embedding_model_name)
-    logger.info(f"Calculated negative scores for {len(negative_scored_papers)} papers.")
 
-    # Process scores and calculate general score
-    final_papers = []
-    for paper in negative_scored_papers:
-        # The 'score' key now holds the similarity to the *negative* query
-        neg_similarity = paper.pop('score') 
-        paper['negative_score'] = 1.0 - neg_similarity # Lower similarity to negative is better
-        
-        # Ensure positive_score exists before calculation
-        positive_score = paper.get('positive_score', score_threshold) # Default to threshold if missing?
-        negative_score = paper.get('negative_score', 0) # Default to 0 if missing
-        
         # Simple average for general score (alternative normalizations commented out)
-        paper['general_score'] = (positive_score + negative_score) / 2
+        paper['general_score'] = (paper['positive_score'] + paper['negative_score']) / 2
         final_papers.append(paper)
         
-    logger.info(f"Calculated general scores.")
+    logger.info(f"Added GitHub info (stars require GITHUB_TOKEN) and calculated general scores.")
     
     # Sort by general score
     final_papers.sort(key=lambda x: x.get('general_score', 0), reverse=True)
@@ -307,6 +378,39 @@ def analyze_papers_pipeline(papers, filter_query, negative_query, score_threshol
     logger.info(f"--- Analysis Pipeline finished in {end_time - start_time:.2f} seconds ---")
     return final_papers
 
+def load_raw_papers(raw_input_file):
+    """
+    Load a raw papers file (.jsonl or legacy .json) and convert the date strings back to datetime objects.
+
+    Papers whose date cannot be parsed are dropped.
+    """
+    raw_papers = load_records(raw_input_file)
+
+    # Convert date strings back to datetime objects if needed for analysis 
+    # (filter_papers_by_date needs datetime objects)
+    # This assumes dates were saved as strings. If saved differently, adjust.
+    for paper in raw_papers:
+         if isinstance(paper.get('date'), str):
+              try:
+                   # Try parsing common formats, assuming UTC
+                   # Add the format seen in the logs: YYYY-MM-DD HH:MM:SS+TZ
+                   paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%d %H:%M:%S%z")
+              except ValueError:
+                   try:
+                        paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%dT%H:%M:%S.%f%z")
+                   except ValueError:
+                        try:
+                             paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc)
+                        except ValueError:
+                             logger.warning(f"Warning: Could not parse date string '{paper.get('date')}' back to datetime for {paper.get('title')}")
+                             paper['date'] = None # Or handle as error
+
+    # Filter out papers with invalid dates before analysis
+    papers_to_analyze = [p for p in raw_papers if isinstance(p.get('date'), datetime.datetime)]
+    if len(papers_to_analyze) < len(raw_papers):
+        logger.warning(f"Warning: Skipped {len(raw_papers) - len(papers_to_analyze)} papers due to invalid date format during analysis loading.")
+    return papers_to_analyze
+
 def parse_markdown_to_queries(markdown_file):
     """
     Parse a markdown file to extract query configurations.
@@ -374,7 +478,6 @@ if __name__ == "__main__":
         # Load .env variables first
     from dotenv import load_dotenv, find_dotenv
     import os
-    import json
     parser = argparse.ArgumentParser(description='Scrape and analyze ArXiv papers based on queries from a markdown file.')
     # Make days argument optional with a default
     parser.add_argument("--days", type=int, default=8, help='Number of past days to fetch papers from (default: 8).')
@@ -386,6 +489,12 @@ if __name__ == "__main__":
     parser.add_argument("--raw_subfolder", type=str, default="raw", help="Subdirectory within json_folder for raw scraped data.")
     parser.add_argument("--ai_summary", type=str, default="true", help="Generate AI summary for papers (true/false).")
     parser.add_argument("--embedding_model", type=str, default=None, help="Name of the sentence-transformer model for embeddings.")
+    parser.add_argument("--incremental", action="store_true", help="Only fetch and analyse papers newer than each query's watermark, merging results into its rolling analyzed JSON.")
+    parser.add_argument("--concurrent_harvest", action="store_true", help="Scrape all query blocks concurrently under the global arXiv rate limit.")
+    parser.add_argument("--harvest_workers", type=int, default=8, help="Maximum number of query blocks scraped at the same time with --concurrent_harvest.")
+    parser.add_argument("--paper_store", type=str, default=None, help="Path of the SQLite store of harvested arXiv papers ('none' disables it).")
+    parser.add_argument("--llm_batch", action="store_true", help="Generate the AI summaries through the LLM provider batch API (cheaper, resumable, not real time; see LLM_BATCH_PROVIDER).")
+    parser.add_argument("--embedding_cache_mb", type=int, default=None, help="Size limit of the on-disk embedding cache in MB (0 disables it).")
 
     args = parser.parse_args()
     
@@ -408,6 +517,11 @@ if __name__ == "__main__":
     raw_folder_path = os.path.join(json_folder_path, args.raw_subfolder or "raw")
     embedding_model = args.embedding_model or os.getenv("EMBEDDING_MODEL", "mixedbread-ai/mxbai-embed-large-v1") # Get model from env or default
     github_token = os.getenv("GITHUB_TOKEN") # Needed for star fetching
+    github_cache_path = os.path.join(json_folder_path, "github_cache.json")
+    github_cache_ttl = float(os.getenv("GITHUB_CACHE_TTL_HOURS", "24")) * 3600
+    embedding_cache_mb = args.embedding_cache_mb if args.embedding_cache_mb is not None else int(os.getenv("EMBEDDING_CACHE_MB", "2048"))
+    embedding_cache_folder = os.path.join(json_folder_path, "embedding_cache")
+    paper_store_path = args.paper_store or os.getenv("PAPER_STORE", os.path.join(json_folder_path, "arxiv_papers.sqlite"))
 
     logger.info("--- Configuration ---")
     logger.info(f"Days to fetch: {days_to_fetch}")
@@ -419,12 +533,25 @@ if __name__ == "__main__":
     logger.info(f"Raw Data Folder: {raw_folder_path}")
     logger.info(f"Embedding Model: {embedding_model}")
     logger.info(f"GitHub Token Loaded: {'Yes' if github_token else 'No'}")
+    logger.info(f"Paper Store: {paper_store_path}")
+    logger.info(f"Embedding Cache: {embedding_cache_folder if embedding_cache_mb > 0 else 'disabled'} ({embedding_cache_mb} MB)")
     logger.info("---------------------")
 
     # Create necessary directories
     os.makedirs(json_folder_path, exist_ok=True)
     os.makedirs(md_folder_path, exist_ok=True)
     os.makedirs(raw_folder_path, exist_ok=True)
+
+    # Local store of every harvested arXiv paper, shared by every query block
+    paper_store = None if paper_store_path.lower() == "none" else PaperStore(paper_store_path)
+
+    # GitHub metadata shared (and deduplicated) across every query block
+    github_service = GitHubMetadataService(github_token, cache_path=github_cache_path, ttl=github_cache_ttl) if github_token else None
+
+    # Persistent embedding cache shared by every query block
+    embedding_cache = None
+    if embedding_cache_mb > 0:
+        embedding_cache = EmbeddingCache(embedding_cache_folder, embedding_model, max_bytes=embedding_cache_mb * 1024 * 1024)
     
     # Parse queries from the specified file
     query_configs = parse_markdown_to_queries(queries_file_path)
@@ -434,9 +561,37 @@ if __name__ == "__main__":
          
     today_str = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
     date_tag = f"{today_str}-D{days_to_fetch}" # Use a more descriptive tag including days
+    if args.incremental:
+        # Incremental runs may happen several times a day, each one holding only the new papers
+        date_tag = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d-%H%M") + "-INC"
     
     # --- Phase 1: Scraping --- 
     logger.info("\n=== Starting Phase 1: Scraping ArXiv ===")
+    # Every arXiv page request goes through one pooled session and one global rate limiter
+    arxiv_session = RateLimitedSession(RateLimiter(rate=1, per=ARXIV_DELAY_SECONDS))
+
+    def scrape_query_block(query_id, config, raw_output_file, watermark=None):
+        """Scrapes one query block and saves its raw papers (only the unseen ones when given a watermark)."""
+        try:
+            # Pass parameters correctly
+            scraped_papers = scrape_arxiv_papers_pipeline(
+                query=config.get('query'),
+                category=config.get('category'),
+                sort_by_choice=config.get("sort_by_choice", "lastUpdatedDate"), # Use parsed string or default
+                max_results=config.get("max_results", 1000), # Use parsed int or default
+                days=wm.days_since_watermark(watermark, days_to_fetch) if watermark is not None else days_to_fetch,
+                paper_store=paper_store,
+                session=arxiv_session
+            )
+            if watermark is not None:
+                scraped_papers = wm.filter_new_papers(scraped_papers, watermark)
+            # Save raw data, one JSON line per paper (datetimes stored with str)
+            write_records(raw_output_file, scraped_papers)
+            logger.info(f"Scraped and saved {len(scraped_papers)} papers for '{query_id}' to {raw_output_file}")
+        except Exception as e:
+            logger.error(f"Error scraping papers for '{query_id}': {e}")
+
+    scrape_jobs = []
     for config in query_configs:
         query_id = config.get('id')
         if not query_id:
@@ -449,39 +604,75 @@ if __name__ == "__main__":
         if not query or not category:
             logger.warning(f"Warning: Query '{query_id}' is missing 'query' or 'category'. Skipping scrape.")
             continue
-            
-        max_r = config.get("max_results", 1000) # Use parsed int or default
-        sort_by = config.get("sort_by_choice", "lastUpdatedDate") # Use parsed string or default
         
         # Define paths for this query
         query_raw_folder = os.path.join(raw_folder_path, query_id)
         os.makedirs(query_raw_folder, exist_ok=True)
-        raw_output_file = os.path.join(query_raw_folder, f'{date_tag}_raw.json')
+        raw_stem = os.path.join(query_raw_folder, f'{date_tag}_raw')
+        raw_output_file = find_records_file(raw_stem) or raw_stem + '.jsonl'
         
         if not os.path.exists(raw_output_file):
             logger.info(f"Raw data file not found for {query_id} ({date_tag}). Scraping...")
-            try:
-                # Pass parameters correctly
-                scraped_papers = scrape_arxiv_papers_pipeline(
-                    query=query,
-                    category=category,
-                    sort_by_choice=sort_by,
-                    max_results=max_r,
-                    days=days_to_fetch
-                )
-                # Save raw data
-                with open(raw_output_file, 'w', encoding='utf-8') as f:
-                    # Use default=str for datetime objects
-                    json.dump(scraped_papers, f, indent=4, default=str) 
-                logger.info(f"Scraped and saved {len(scraped_papers)} papers for '{query_id}' to {raw_output_file}")
-            except Exception as e:
-                logger.error(f"Error scraping papers for '{query_id}': {e}")
-                continue # Continue to next query on error
+            watermark = None
+            if args.incremental:
+                watermark = wm.load_watermark(os.path.join(json_folder_path, query_id, wm.WATERMARK_FILE))
+            scrape_jobs.append((query_id, config, raw_output_file, watermark))
         else:
              logger.info(f"Raw data file already exists for {query_id} ({date_tag}). Skipping scrape.")
+
+    phase_start = time.time()
+    if args.concurrent_harvest and len(scrape_jobs) > 1:
+        # Wall time is bounded by the shared arXiv quota rather than the sum of per-query latencies
+        with ThreadPoolExecutor(max_workers=min(len(scrape_jobs), args.harvest_workers)) as executor:
+            list(executor.map(lambda job: scrape_query_block(*job), scrape_jobs))
+    else:
+        for job in scrape_jobs:
+            scrape_query_block(*job)
+    logger.info(f"Phase 1 scraped {len(scrape_jobs)} query blocks in {time.time() - phase_start:.2f} seconds ({arxiv_session.limiter.total_wait:.0f} seconds waiting on the arXiv rate limit).")
     
     # --- Phase 2: Analysis --- 
     logger.info("\n=== Starting Phase 2: Analyzing Papers ===")
+
+    # Load every pending query block first so that their papers are embedded once and all
+    # filter/negative queries are scored together in a single matrix product
+    papers_by_block = {}
+    query_pairs = {}
+    for config in query_configs:
+        query_id = config.get('id')
+        filter_q = config.get('filter_query')
+        negative_q = config.get('negative_query')
+        if not query_id or not filter_q or not negative_q:
+            continue
+        raw_input_file = find_records_file(os.path.join(raw_folder_path, query_id, f'{date_tag}_raw'))
+        analyzed_output_file = find_records_file(os.path.join(json_folder_path, query_id, f'{date_tag}_analyzed'))
+        if raw_input_file and not analyzed_output_file:
+            try:
+                papers_by_block[query_id] = load_raw_papers(raw_input_file)
+                query_pairs[query_id] = (filter_q, negative_q)
+            except Exception as e:
+                logger.error(f"Error loading raw papers for '{query_id}': {e}")
+
+    block_scores = {}
+    if papers_by_block:
+        try:
+            block_scores = score_query_blocks(papers_by_block, query_pairs, embedding_model, embedding_cache) or {}
+        except Exception as e:
+            logger.error(f"Error scoring query blocks: {e}. Falling back to per-block scoring.")
+
+    # Prefetch the stars of every repo that will survive a score threshold, in one bulk lookup
+    if github_service is not None and block_scores:
+        thresholds = {config.get('id'): config.get('score_th', 0.6) for config in query_configs}
+        repo_urls = set()
+        for query_id, scores in block_scores.items():
+            for paper, (positive_similarity, _) in zip(papers_by_block[query_id], scores):
+                urls = detect_github_repos(paper.get('abstract', ''))
+                if urls and positive_similarity >= thresholds.get(query_id, 0.6):
+                    repo_urls.add(urls[0])
+        try:
+            github_service.get_stars(sorted(repo_urls))
+        except Exception as e:
+            logger.error(f"Error prefetching GitHub metadata: {e}")
+
     for config in query_configs:
         query_id = config.get('id')
         if not query_id:
@@ -503,8 +694,10 @@ if __name__ == "__main__":
         os.makedirs(query_json_folder, exist_ok=True)
         os.makedirs(query_md_folder, exist_ok=True)
         
-        raw_input_file = os.path.join(query_raw_folder, f'{date_tag}_raw.json')
-        analyzed_output_file = os.path.join(query_json_folder, f'{date_tag}_analyzed.json') # Changed filename
+        raw_stem = os.path.join(query_raw_folder, f'{date_tag}_raw')
+        raw_input_file = find_records_file(raw_stem) or raw_stem + '.jsonl'
+        analyzed_stem = os.path.join(query_json_folder, f'{date_tag}_analyzed') # Changed filename
+        analyzed_output_file = find_records_file(analyzed_stem) or analyzed_stem + '.jsonl'
         config_output_file = os.path.join(query_json_folder, f'{date_tag}_config.json') # Changed filename
         md_output_file = os.path.join(query_md_folder, f'{date_tag}.md')
         
@@ -512,33 +705,9 @@ if __name__ == "__main__":
         if os.path.exists(raw_input_file) and not os.path.exists(analyzed_output_file):
             logger.info(f"Analyzed file not found for {query_id} ({date_tag}). Analyzing raw data...")
             try:
-                # Load raw papers
-                with open(raw_input_file, 'r', encoding='utf-8') as f:
-                    raw_papers = json.load(f)
-                
-                # Convert date strings back to datetime objects if needed for analysis 
-                # (filter_papers_by_date needs datetime objects)
-                # This assumes dates were saved as strings. If saved differently, adjust.
-                for paper in raw_papers:
-                     if isinstance(paper.get('date'), str):
-                          try:
-                               # Try parsing common formats, assuming UTC
-                               # Add the format seen in the logs: YYYY-MM-DD HH:MM:SS+TZ
-                               paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%d %H:%M:%S%z")
-                          except ValueError:
-                               try:
-                                    paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%dT%H:%M:%S.%f%z")
-                               except ValueError:
-                                    try:
-                                         paper['date'] = datetime.datetime.strptime(paper['date'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc)
-                                    except ValueError:
-                                         logger.warning(f"Warning: Could not parse date string '{paper.get('date')}' back to datetime for {paper.get('title')}")
-                                         paper['date'] = None # Or handle as error
-                                    
-                # Filter out papers with invalid dates before analysis
-                papers_to_analyze = [p for p in raw_papers if isinstance(p.get('date'), datetime.datetime)]
-                if len(papers_to_analyze) < len(raw_papers):
-                    logger.warning(f"Warning: Skipped {len(raw_papers) - len(papers_to_analyze)} papers due to invalid date format during analysis loading.")
+                papers_to_analyze = papers_by_block.get(query_id)
+                if papers_to_analyze is None:
+                    papers_to_analyze = load_raw_papers(raw_input_file)
 
                 if not papers_to_analyze:
                      logger.warning(f"No valid papers to analyze for {query_id} after date parsing.")
@@ -551,16 +720,25 @@ if __name__ == "__main__":
                     negative_query=negative_q,
                     score_threshold=score_t,
                     embedding_model_name=embedding_model, # Pass the model name
-                    github_token=github_token # Pass the token
+                    github_token=github_token, # Pass the token
+                    embedding_cache=embedding_cache,
+                    scores=block_scores.get(query_id), # Precomputed for all blocks at once
+                    github_service=github_service
                 )
                 
                 # Save analyzed data
-                with open(analyzed_output_file, 'w', encoding='utf-8') as f:
-                    json.dump(analyzed_papers, f, indent=4, default=str) # Save with dates as strings
+                write_records(analyzed_output_file, analyzed_papers) # Save with dates as strings
+                load_columns(analyzed_output_file, open_records(analyzed_output_file)) # Normalise the digest stats columns once, at ingest
                 # Save the config used for this analysis run
                 with open(config_output_file, 'w', encoding='utf-8') as f:
                     json.dump(config, f, indent=4, default=str)
                 logger.info(f"Analyzed {len(analyzed_papers)} papers for '{query_id}' and saved to {analyzed_output_file}")
+
+                if args.incremental:
+                    # Only a successful analysis moves the watermark forward
+                    wm.merge_rolling(os.path.join(query_json_folder, wm.ROLLING_FILE), analyzed_papers)
+                    watermark_file = os.path.join(query_json_folder, wm.WATERMARK_FILE)
+                    wm.save_watermark(watermark_file, wm.advance_watermark(wm.load_watermark(watermark_file), papers_to_analyze))
                 
             except Exception as e:
                 logger.error(f"Error analyzing papers for '{query_id}': {e}")
@@ -575,10 +753,10 @@ if __name__ == "__main__":
         if os.path.exists(analyzed_output_file) and not os.path.exists(md_output_file):
              logger.info(f"Generating Markdown report for {query_id} ({date_tag})...")
              try:
-                 with open(analyzed_output_file, 'r', encoding='utf-8') as f:
-                     papers_for_md = json.load(f)
-                 # Call markdown generation function from md_format module
-                 mdf.list_to_markdown(papers_for_md, md_output_file, ai_summary=ai_summary_enabled)
+                 # Call markdown generation function from md_format module, streaming the records
+                 papers_for_md = open_records(analyzed_output_file)
+                 batch_dir = os.path.join(json_folder_path, "llm_batch", f"{query_id}_{date_tag}") if args.llm_batch else None
+                 mdf.list_to_markdown(papers_for_md, md_output_file, ai_summary=ai_summary_enabled, batch_dir=batch_dir)
                  logger.info(f"Markdown report generated: {md_output_file}")
              except Exception as e:
                   logger.error(f"Error generating Markdown for '{query_id}': {e}")
@@ -588,5 +766,7 @@ if __name__ == "__main__":
         else:
              logger.info(f"Markdown file already exists for {query_id} ({date_tag}). Skipping generation.")
 
+    for stats in get_model_stats():
+        logger.info(f"Embedding model '{stats['model_name']}' ({stats['device']}): loaded in {stats['load_time']:.2f} seconds, {stats['memory_mb']:.0f} MB resident.")
     logger.info("\n=== Script finished ===")
 
@@ -0,0 +1,67 @@
+import types
+
+import find_and_scrap
+
+
+def test_failed_analysis_is_retried_on_resume(tmp_path, monkeypatch):
+    calls = []
+    failing = {"B"}
+
+    def search(title, client, max_results=5):
+        calls.append(("search", title))
+        return types.SimpleNamespace(title=title), []
+
+    async def paper_analysis(text):
+        title = text.split("\n")[0][len("Title: "):]
+        calls.append(("analyze", title))
+        # Failed LLM calls surface as None fields, not as exceptions
+        if title in failing:
+            return {"main_task": None, "contributions": None, "summary": None}
+        return {"main_task": "task", "contributions": ["contribution"], "summary": "summary"}
+
+    monkeypatch.setattr(find_and_scrap, "ARXIV_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(find_and_scrap, "search_arxiv_candidates", search)
+    monkeypatch.setattr(find_and_scrap, "build_paper_record", lambda title, result: {"title": title.upper(), "abstract": "abstract", "not_found": False})
+    monkeypatch.setattr(find_and_scrap.mdf, "aget_paper_analysis", paper_analysis)
+    checkpoint = str(tmp_path / "run.checkpoint.jsonl")
+
+    papers = find_and_scrap.process_papers_with_checkpoint(["a", "b"], checkpoint, batch_size=2)
+    assert [paper["title"] for paper in papers] == ["A", "B"]
+    assert "analysis_error" in papers[1]
+
+    calls.clear()
+    failing.clear()
+    papers = find_and_scrap.process_papers_with_checkpoint(["a", "b", "c"], checkpoint, batch_size=2)
+    # "a" is done, "b" is only re-analysed (no second lookup), "c" is new
+    assert sorted(calls) == [("analyze", "B"), ("analyze", "C"), ("search", "c")]
+    assert [paper["summary"] for paper in papers] == ["summary"] * 3
+    assert not any("analysis_error" in paper for paper in papers)
+
+
+def test_failed_lookup_is_retried_on_resume(tmp_path, monkeypatch):
+    searched = []
+    offline = {"b"}
+
+    def search(title, client, max_results=5):
+        searched.append(title)
+        if title in offline:
+            raise ConnectionError("503 Service Unavailable")
+        return types.SimpleNamespace(title=title), []
+
+    async def paper_analysis(text):
+        return {"main_task": "task", "contributions": ["contribution"], "summary": "summary"}
+
+    monkeypatch.setattr(find_and_scrap, "ARXIV_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(find_and_scrap, "search_arxiv_candidates", search)
+    monkeypatch.setattr(find_and_scrap, "build_paper_record", lambda title, result: {"title": title, "abstract": "abstract", "not_found": False})
+    monkeypatch.setattr(find_and_scrap.mdf, "aget_paper_analysis", paper_analysis)
+    checkpoint = str(tmp_path / "run.checkpoint.jsonl")
+
+    papers = find_and_scrap.process_papers_with_checkpoint(["a", "b"], checkpoint, batch_size=2)
+    assert papers[1]["not_found"] and "503" in papers[1]["lookup_error"]
+
+    searched.clear()
+    offline.clear()
+    papers = find_and_scrap.process_papers_with_checkpoint(["a", "b"], checkpoint, batch_size=2)
+    assert searched == ["b"]
+    assert [paper["summary"] for paper in papers] == ["summary"] * 2
@@ -0,0 +1,128 @@
+import pytest
+
+import scrap_cvpr
+from utils import conference_ingest
+from utils.conference_ingest import ListingIngester, diff_rows, row_digest, row_key
+from utils.jsonl_store import JSONLRecordStore
+
+URL = "https://example.org/AcceptedPapers"
+
+
+def row(title, authors=""):
+    return f"<tr><td><strong>{title}</strong><div class='indented'><i>{authors}</i></div></td></tr>"
+
+
+def page(*rows):
+    return ("<table><tr><th>Paper</th></tr>" + "".join(rows) + "</table>").encode()
+
+
+class Response:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("parser", ["_parse_rows_selectolax", "_parse_rows_lxml", "_parse_rows_bs4"])
+def test_parsers_normalise_text_identically(parser):
+    html = page(row("Segment <em>Anything</em>\n  in 3D", "A. Author,  B. Author"), "<tr><td>no title</td></tr>")
+    try:
+        rows = list(getattr(conference_ingest, parser)(html))
+    except ImportError:
+        pytest.skip(f"{parser} backend not installed")
+    assert rows == [("Segment Anything in 3D", "A. Author, B. Author")]
+
+
+def test_diff_rows():
+    previous_rows = [{"title": "Kept", "authors": "A"}, {"title": "Changed", "authors": "B"}, {"title": "Removed", "authors": "C"}]
+    previous = {row_key(r): {"title": r["title"], "digest": row_digest(r)} for r in previous_rows}
+    rows = [{"title": "Kept", "authors": "A"}, {"title": "Changed", "authors": "B, D"}, {"title": "Added", "authors": "E"}]
+    added, changed, removed = diff_rows(previous, rows)
+    assert added == [{"title": "Added", "authors": "E"}]
+    assert changed == [{"title": "Changed", "authors": "B, D"}]
+    assert removed == ["Removed"]
+
+
+def test_ingester_conditional_get_and_commit(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    session = Session(Response(200, page(row("P1", "A")), {"ETag": "e1"}))
+    ingester = ListingIngester(URL, state_path, session=session)
+    assert [r["title"] for r in ingester.check()["added"]] == ["P1"]
+    assert session.requests == [{}]
+
+    # Not committed: a new run sees the same changes again
+    ingester = ListingIngester(URL, state_path, session=Session(Response(200, page(row("P1", "A")), {"ETag": "e1"})))
+    assert [r["title"] for r in ingester.check()["added"]] == ["P1"]
+    ingester.commit()
+
+    session = Session(Response(304))
+    ingester = ListingIngester(URL, state_path, session=session)
+    assert ingester.check()["not_modified"]
+    assert session.requests == [{"If-None-Match": "e1"}]
+    assert ingester.titles == ["P1"]
+
+
+def test_empty_parse_keeps_snapshot(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    ingester = ListingIngester(URL, state_path, session=Session(Response(200, page(row("P1")))))
+    ingester.check()
+    ingester.commit()
+    ingester = ListingIngester(URL, state_path, session=Session(Response(200, b"<html>maintenance</html>")))
+    assert ingester.check()["removed"] == []
+    ingester.commit()
+    assert ingester.titles == ["P1"]
+
+
+def test_unmatched_papers_are_retried(tmp_path, monkeypatch):
+    state_path = str(tmp_path / "state.json")
+    raw_file = str(tmp_path / "raw.jsonl")
+    found = set()
+    lookups = []
+
+    def enhance(papers, batch_size=5, title_index=None):
+        for paper in papers:
+            lookups.append(paper['title'])
+            if paper['title'] in found:
+                paper.update({"abstract": "abstract", "arxiv_id": "2501.00001v1"})
+        return papers
+
+    sessions = [Session(Response(200, page(row("P1"), row("P2")), {"ETag": "e1"})), Session(Response(304)), Session(Response(304))]
+    monkeypatch.setattr(scrap_cvpr, "create_retry_session", lambda: sessions.pop(0))
+    monkeypatch.setattr(scrap_cvpr, "enhance_papers_with_arxiv_data", enhance)
+    monkeypatch.setattr(scrap_cvpr, "MAX_ARXIV_ATTEMPTS", 3)
+    monkeypatch.setattr(scrap_cvpr, "build_title_index", lambda **kwargs: [])
+
+    found.add("P1")
+    titles, reanalyze, updated = scrap_cvpr.scrape_cvpr_updates(state_path, raw_file)
+    assert sorted(titles) == ["P1", "P2"] and updated
+
+    # Unchanged listing: only the unmatched paper is looked up again, and re-analysed once matched
+    lookups.clear()
+    found.add("P2")
+    titles, reanalyze, updated = scrap_cvpr.scrape_cvpr_updates(state_path, raw_file)
+    assert lookups == ["P2"]
+    assert reanalyze == {"P2"} and updated
+    assert JSONLRecordStore(raw_file, key=lambda paper: paper['title']).get("P2")["arxiv_id"]
+
+    lookups.clear()
+    scrap_cvpr.scrape_cvpr_updates(state_path, raw_file)
+    assert lookups == []
+
+
+def test_retries_stop_after_max_attempts(tmp_path):
+    with JSONLRecordStore(str(tmp_path / "raw.jsonl"), key=lambda paper: paper['title']) as store:
+        store.extend([{"title": "Fresh", "arxiv_attempts": 1}, {"title": "Tired", "arxiv_attempts": 3}, {"title": "Found", "arxiv_id": "x"}, {"title": "Unlisted"}])
+        assert [p["title"] for p in scrap_cvpr.unmatched_papers(store, ["Fresh", "Tired", "Found"], max_attempts=3)] == ["Fresh"]
@@ -0,0 +1,51 @@
+import datetime
+import os
+
+import numpy as np
+
+from utils import digest_stats
+from utils.digest_stats import MISSING_DAY, load_columns, parse_paper_date, summarize
+from utils.jsonl_store import JSONLRecordStore, write_records
+
+
+def test_parse_paper_date():
+    epoch, day = parse_paper_date("2026-10-17T23:30:00+00:00")
+    assert day == (datetime.date(2026, 10, 17) - datetime.date(1970, 1, 1)).days
+    assert epoch == int(datetime.datetime(2026, 10, 17, 23, 30, tzinfo=datetime.timezone.utc).timestamp())
+    # The calendar day as written, whatever the timezone
+    assert parse_paper_date("2026-10-17T01:00:00+05:00")[1] == day
+    assert parse_paper_date("2026-10-17 garbage")[1] == day
+    assert parse_paper_date("not a date") is None
+    assert parse_paper_date(None) is None
+
+
+def test_summarize():
+    columns = digest_stats.build_columns([
+        {"general_score": 0.2, "positive_score": 0.4, "negative_score": 0.1, "stars": 3, "date": "2026-10-16"},
+        {"general_score": 0.6, "positive_score": 0.8, "negative_score": 0.3, "stars": None, "date": None},
+        {"general_score": 0.4, "positive_score": 0.6, "negative_score": 0.2, "stars": 4, "date": "2026-10-17T10:00:00"},
+    ])
+    assert columns["day"][1] == MISSING_DAY
+    stats = summarize(columns)
+    assert stats["n_papers"] == 3
+    assert np.isclose(stats["avg_score"], 0.4)
+    assert stats["total_stars"] == 7
+    assert stats["recent_dates"] == ["2026-10-17", "2026-10-16"]
+
+
+def test_column_cache_is_rebuilt_when_the_records_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "digest.jsonl")
+    write_records(path, [{"arxiv_id": "a", "general_score": 0.5}])
+    builds = []
+    build_columns = digest_stats.build_columns
+    monkeypatch.setattr(digest_stats, "build_columns", lambda papers: builds.append(1) or build_columns(papers))
+
+    assert load_columns(path, JSONLRecordStore(path))["general_score"].tolist() == [0.5]
+    assert load_columns(path, JSONLRecordStore(path))["general_score"].tolist() == [0.5]
+    assert len(builds) == 1
+
+    with JSONLRecordStore(path) as store:
+        store.append({"arxiv_id": "b", "general_score": 0.7})
+    assert load_columns(path, JSONLRecordStore(path))["general_score"].tolist() == [0.5, 0.7]
+    assert len(builds) == 2
+    assert os.path.exists(path + ".stats.npz")
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache, encode_with_cache, get_arxiv_id, text_hash
+
+
+class CountingModel:
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([[len(text), i % 3, 1.0, 0.5][:self.dim] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+def shard_files(cache):
+    return sorted(name for name in os.listdir(cache.path) if name.endswith(".npy"))
+
+
+def test_small_writes_append_to_the_open_shard(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "org/model", shard_size=3)
+    for i in range(4):
+        cache.put_many([f"h{i}"], np.full((1, 2), i, dtype=np.float32))
+    assert shard_files(cache) == ["shard_000000.npy", "shard_000001.npy"]
+
+    # Reopened: rows are found in place and the open shard keeps filling up
+    cache = EmbeddingCache(str(tmp_path), "org/model", shard_size=3)
+    hits = cache.get_many(["h0", "h2", "h3", "missing"])
+    assert sorted(hits) == [0, 1, 2]
+    assert hits[1].tolist() == [2.0, 2.0]
+    cache.put_many(["h4", "h5", "h6"], np.ones((3, 2)))
+    assert shard_files(cache) == ["shard_000000.npy", "shard_000001.npy", "shard_000002.npy"]
+    assert cache.get_many(["h3", "h6"])[1].tolist() == [1.0, 1.0]
+
+
+def test_changed_text_invalidates_previous_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put_many(["old"], np.ones((1, 2)), ids=["2501.00001v1"])
+    assert cache.get_many(["new"], ids=["2501.00001v1"]) == {}
+    assert cache.get_many(["old"]) == {}
+
+
+def test_new_version_replaces_the_previous_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put_many(["text-v1"], np.ones((1, 2)), ids=["2501.00001v1"])
+    # The revised paper has another text: the v1 row is forgotten, also after a reload
+    assert cache.get_many(["text-v2"], ids=["2501.00001v2"]) == {}
+    cache.put_many(["text-v2"], np.ones((1, 2)), ids=["2501.00001v2"])
+    cache = EmbeddingCache(str(tmp_path), "model")
+    assert cache.get_many(["text-v1"]) == {}
+    assert set(cache.get_many(["text-v2"], ids=["2501.00001v3"])) == {0}
+    assert len(cache) == 1
+
+
+def test_eviction_drops_least_recently_used_shards(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_bytes=2 * 4 * 2, shard_size=2)
+    cache.put_many(["a", "b"], np.ones((2, 4)))
+    cache.put_many(["c", "d"], np.ones((2, 4)))
+    assert set(cache.get_many(["a", "b", "c", "d"])) == {2, 3}
+    cache.put_many(["e"], np.ones((1, 4)))
+    assert set(cache.get_many(["c", "e"])) == {1}
+
+
+def test_encode_with_cache_only_encodes_missing_texts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    model = CountingModel()
+    first = encode_with_cache(model, ["alpha", "beta", "alpha"], cache=cache)
+    assert model.encoded == ["alpha", "beta", "alpha"]
+    model.encoded.clear()
+    second = encode_with_cache(model, ["beta", "gamma", "alpha"], cache=cache)
+    assert model.encoded == ["gamma"]
+    np.testing.assert_allclose(second[0], first[1], atol=1e-2)
+    np.testing.assert_allclose(second[2], first[0], atol=1e-2)
+    assert len(cache) == 3
+
+
+def test_helpers():
+    assert text_hash("x") == text_hash("x") != text_hash("y")
+    assert get_arxiv_id({"link": "http://arxiv.org/abs/2501.00001v2"}) == "2501.00001v2"
+    assert get_arxiv_id({"link": "https://example.org/paper"}) is None
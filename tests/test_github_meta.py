@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import scrapt_arxiv
+from utils.github_meta import GitHubMetadataService, GitHubRateLimiter, GitHubRateLimitError, github_request, parse_repo_path
+
+
+class Response:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code}")
+
+
+class FakeGitHub:
+    def __init__(self):
+        self.calls = []
+        self.broken = set()
+
+    def request(self, method, url, headers=None, json=None, timeout=None):
+        self.calls.append((method, url, dict(headers or {})))
+        if method == "POST":
+            return Response(200, {"data": {"r0": {"stargazerCount": 7}}})
+        if any(url.endswith(path) for path in self.broken):
+            return Response(500)
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            return Response(304)
+        return Response(200, {"stargazers_count": 42}, {"ETag": '"v1"'})
+
+
+def service(tmp_path, github):
+    metadata = GitHubMetadataService("token", cache_path=str(tmp_path / "github.json"), ttl=0, limiter=GitHubRateLimiter())
+    metadata.session.request = github.request
+    return metadata
+
+
+def test_parse_repo_path():
+    assert parse_repo_path("https://github.com/owner/repo.") == "owner/repo"
+    assert parse_repo_path("https://github.com/owner/repo.git") == "owner/repo"
+    assert parse_repo_path("https://example.org/owner/repo") is None
+
+
+def test_conditional_rest_first_then_graphql_fallback(tmp_path):
+    github = FakeGitHub()
+    url = "https://github.com/owner/repo"
+    assert service(tmp_path, github).get_stars([url, url]) == {url: 42}
+    assert [method for method, _, _ in github.calls] == ["GET"]
+
+    # Stale entry: revalidated with its ETag, the 304 keeps the cached stars
+    github.calls.clear()
+    assert service(tmp_path, github).get_stars([url]) == {url: 42}
+    assert github.calls == [("GET", "https://api.github.com/repos/owner/repo", {"If-None-Match": '"v1"'})]
+
+    # REST failure: GraphQL is only the fallback
+    github.calls.clear()
+    github.broken.add("owner/repo")
+    assert service(tmp_path, github).get_stars([url]) == {url: 7}
+    assert [method for method, _, _ in github.calls] == ["GET", "POST"]
+
+
+
+class InstantLimiter(GitHubRateLimiter):
+    """Rate limiter whose parks return at once, counting them."""
+
+    def __init__(self):
+        super().__init__()
+        self.parks = 0
+
+    def park(self, resource, response):
+        self.parks += 1
+
+
+class RateLimitedSession:
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return Response(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0"})
+
+
+def test_exhausted_parks_raise_instead_of_returning_the_limited_response():
+    limiter, session = InstantLimiter(), RateLimitedSession()
+    with pytest.raises(GitHubRateLimitError):
+        github_request(session, "GET", "https://api.github.com/repos/owner/repo", limiter, max_parks=2)
+    assert session.calls == 3 and limiter.parks == 2
+
+
+def test_rate_limited_repos_get_no_stars(tmp_path, monkeypatch):
+    limiter, session = InstantLimiter(), RateLimitedSession()
+    monkeypatch.setattr(scrapt_arxiv, "github_session", session)
+    monkeypatch.setattr(scrapt_arxiv, "default_github_limiter", limiter)
+    assert scrapt_arxiv.get_github_repo_stars("https://github.com/owner/repo", "token") is None
+
+    # The metadata service neither caches nor persists a value for the repo
+    metadata = GitHubMetadataService(None, cache_path=str(tmp_path / "github.json"), limiter=limiter)
+    metadata.session.request = session.request
+    metadata.get_stars(["https://github.com/owner/repo"])
+    with open(tmp_path / "github.json", encoding="utf-8") as f:
+        assert json.load(f) == {}
@@ -0,0 +1,43 @@
+import json
+import os
+
+from utils.jsonl_store import JSONLRecordStore, load_records, write_records
+
+
+def test_partial_last_line_is_truncated_on_reopen(tmp_path):
+    path = str(tmp_path / "papers.jsonl")
+    write_records(path, [{"arxiv_id": "a", "title": "First"}, {"arxiv_id": "b", "title": "Second"}])
+    complete_size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'{"arxiv_id": "c", "tit')  # interrupted write
+
+    store = JSONLRecordStore(path)
+    assert os.path.getsize(path) == complete_size
+    assert len(store) == 2 and "c" not in store
+    with store:
+        store.append({"arxiv_id": "c", "title": "Third"})
+    assert [record["arxiv_id"] for record in load_records(path)] == ["a", "b", "c"]
+
+
+def test_lines_after_the_saved_index_are_reindexed(tmp_path):
+    path = str(tmp_path / "papers.jsonl")
+    write_records(path, [{"arxiv_id": "a", "title": "First"}])
+    # Appended by a run that died before saving the index
+    with open(path, 'ab') as f:
+        f.write((json.dumps({"arxiv_id": "b", "title": "Second: A Study"}) + "\n").encode('utf-8'))
+
+    store = JSONLRecordStore(path)
+    assert store.get("b")["title"] == "Second: A Study"
+    assert store.get_by_title("second a study")["arxiv_id"] == "b"
+
+
+def test_superseded_records_are_hidden(tmp_path):
+    path = str(tmp_path / "papers.jsonl")
+    with JSONLRecordStore(path, index_every=1) as store:
+        store.extend([{"arxiv_id": "a", "score": 1}, {"arxiv_id": "b", "score": 2}])
+        store.append({"arxiv_id": "a", "score": 3})
+
+    store = JSONLRecordStore(path)
+    assert len(store) == 2
+    assert store.get("a")["score"] == 3
+    assert [record["score"] for record in store] == [2, 3]
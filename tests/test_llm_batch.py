@@ -0,0 +1,91 @@
+import json
+import os
+
+from utils import llm_batch
+from utils.llm_batch import LocalBatchProvider, client_responder, custom_id_for, get_batch_provider, run_batch, stub_responder
+
+
+def messages(text):
+    return [{"role": "system", "content": "Analyse the paper."}, {"role": "user", "content": text}]
+
+
+class CountingProvider(LocalBatchProvider):
+    """Stub provider counting submissions and able to report a batch as still running."""
+
+    def __init__(self, directory, running=False):
+        super().__init__(directory, responder=stub_responder)
+        self.running = running
+        self.submitted = 0
+
+    def submit(self, input_path):
+        self.submitted += 1
+        return super().submit(input_path)
+
+    def poll(self, batch_id):
+        if self.running:
+            return "in_progress", None
+        return super().poll(batch_id)
+
+
+def test_custom_id_depends_on_key_and_content():
+    assert custom_id_for("2501.00001", messages("a")) == custom_id_for("2501.00001", messages("a"))
+    assert custom_id_for("2501.00001", messages("a")) != custom_id_for("2501.00001", messages("b"))
+    assert custom_id_for("2501.00001", messages("a")) != custom_id_for("2501.00002", messages("a"))
+
+
+def test_answers_are_mapped_back_by_key(tmp_path):
+    jobs = {"paper-a": messages("Text of paper A"), "paper-b": messages("Text of paper B")}
+    provider = get_batch_provider("stub", str(tmp_path))
+    answers = run_batch(jobs, str(tmp_path), provider, "stub-model", poll_interval=0)
+    assert set(answers) == {"paper-a", "paper-b"}
+    assert json.loads(answers["paper-a"])["summary"] == "Text of paper A"
+    assert json.loads(answers["paper-b"])["summary"] == "Text of paper B"
+
+
+def test_interrupted_batch_is_resumed_not_resubmitted(tmp_path):
+    work_dir = str(tmp_path)
+    jobs = {"paper-a": messages("Text of paper A")}
+    provider = CountingProvider(os.path.join(work_dir, "local_provider"), running=True)
+    assert run_batch(jobs, work_dir, provider, "stub-model", poll_interval=0, max_wait=0) == {}
+    assert provider.submitted == 1
+
+    # Next run: the same batch is polled again and collected, nothing is paid for twice
+    provider.running = False
+    answers = run_batch(jobs, work_dir, provider, "stub-model", poll_interval=0)
+    assert provider.submitted == 1
+    assert json.loads(answers["paper-a"])["summary"] == "Text of paper A"
+
+
+def test_stale_batch_is_not_applied_to_changed_text(tmp_path):
+    work_dir = str(tmp_path)
+    provider = CountingProvider(os.path.join(work_dir, "local_provider"))
+    run_batch({"paper-a": messages("Old text")}, work_dir, provider, "stub-model", poll_interval=0)
+
+    # Same key, different text: a new request is submitted and only its answer is returned
+    answers = run_batch({"paper-a": messages("New text")}, work_dir, provider, "stub-model", poll_interval=0)
+    assert provider.submitted == 2
+    assert json.loads(answers["paper-a"])["summary"] == "New text"
+
+
+def test_providers_without_batch_api_run_locally(tmp_path):
+    assert isinstance(get_batch_provider("ollama", str(tmp_path)), LocalBatchProvider)
+    assert isinstance(get_batch_provider("openai", str(tmp_path)), llm_batch.LiteLLMBatchProvider)
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def complete(self, messages, temperature=0.7, parse=None, **kwargs):
+        self.calls.append((messages, temperature, kwargs))
+        return '{"summary": "answer"}'
+
+
+def test_local_batches_go_through_the_llm_client(tmp_path):
+    client = RecordingClient()
+    provider = get_batch_provider("ollama", str(tmp_path), responder=client_responder(lambda: client))
+    answers = run_batch({"paper-a": messages("Text of paper A")}, str(tmp_path), provider, "ollama/phi4",
+                        temperature=0.2, extra={"response_format": {"type": "json_object"}}, poll_interval=0)
+    assert answers == {"paper-a": '{"summary": "answer"}'}
+    # The client brings its own model, api_base and retries; the request keeps its other settings
+    assert client.calls == [(messages("Text of paper A"), 0.2, {"response_format": {"type": "json_object"}})]
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+from utils.llm_engine import ProviderBudget
+
+
+def test_concurrency_cap_is_shared_by_threads_and_event_loops():
+    budget = ProviderBudget("test", concurrency=2)
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def enter():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+
+    def leave():
+        with lock:
+            in_flight[0] -= 1
+
+    def sync_caller():
+        for _ in range(3):
+            with budget.slot():
+                enter()
+                time.sleep(0.01)
+                leave()
+
+    async def async_call():
+        async with budget.aslot():
+            enter()
+            await asyncio.sleep(0.01)
+            leave()
+
+    def loop_caller():
+        async def run():
+            await asyncio.gather(*(async_call() for _ in range(4)))
+        asyncio.run(run())
+
+    threads = [threading.Thread(target=target) for target in (sync_caller, sync_caller, loop_caller, loop_caller)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert in_flight[0] == 0
+
+
+def test_cancelled_waiter_releases_nothing_it_does_not_hold():
+    budget = ProviderBudget("test", concurrency=1)
+
+    async def run():
+        async with budget.aslot():
+            waiter = asyncio.create_task(budget.aslot().__aenter__())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+        # The slot is free again once its holder leaves
+        async with budget.aslot():
+            return True
+
+    assert asyncio.run(run())
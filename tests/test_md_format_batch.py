@@ -0,0 +1,27 @@
+from utils import md_format
+from utils.jsonl_store import open_records, write_records
+
+
+class NullPlotRenderer:
+    def submit(self, negatives, positives, scores, image_path):
+        pass
+
+
+def test_batch_mode_reads_a_jsonl_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_BATCH_PROVIDER", "stub")
+    monkeypatch.setenv("LLM_CACHE", "0")
+    path = str(tmp_path / "papers.jsonl")
+    write_records(path, [
+        {"arxiv_id": "2610.00001", "title": "First Paper", "abstract": "Abstract of the first paper.", "general_score": 0.8},
+        {"arxiv_id": "2610.00002", "title": "Second Paper", "abstract": "Abstract of the second paper.", "general_score": 0.4,
+         "main_task": "Stored task", "contributions": "Stored contributions", "summary": "Stored summary"},
+    ])
+
+    output = str(tmp_path / "papers.md")
+    md_format.list_to_markdown(open_records(path), output, ai_summary=True, batch_dir=str(tmp_path / "batch"), plot_renderer=NullPlotRenderer())
+
+    with open(output, encoding='utf-8') as f:
+        markdown = f.read()
+    assert "**Task:** Stub task" in markdown
+    assert "**Task:** Stored task" in markdown
+    assert "Abstract of the first paper." in markdown
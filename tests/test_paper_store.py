@@ -0,0 +1,98 @@
+import datetime
+
+import scrapt_arxiv
+from utils.arxiv_query import matches_query, plan_query
+from utils.paper_store import PaperStore, split_arxiv_id
+
+UTC = datetime.timezone.utc
+
+
+def day(n):
+    return datetime.datetime(2025, 1, n, tzinfo=UTC)
+
+
+def paper(arxiv_id, date):
+    return {"title": f"Paper {arxiv_id}", "link": f"http://arxiv.org/abs/{arxiv_id}v1", "date": date, "primary_category": "cs.CV"}
+
+
+def test_split_arxiv_id():
+    assert split_arxiv_id("http://arxiv.org/abs/2401.01234v2") == ("2401.01234", 2)
+    assert split_arxiv_id("cs/0112017v1") == ("cs/0112017", 1)
+    assert split_arxiv_id("2401.01234") == ("2401.01234", 1)
+
+
+def test_missing_ranges_merges_coverage(tmp_path):
+    store = PaperStore(str(tmp_path / "papers.sqlite"))
+    assert store.missing_ranges("q", day(1), day(10)) == [(day(1), day(10))]
+    store.add_coverage("q", day(2), day(4))
+    store.add_coverage("q", day(3), day(6))
+    store.add_coverage("q", day(8), day(9))
+    assert store.missing_ranges("q", day(1), day(10)) == [(day(1), day(2)), (day(6), day(8)), (day(9), day(10))]
+    assert store.missing_ranges("other", day(1), day(2)) == [(day(1), day(2))]
+    # Empty or inverted windows are not recorded
+    store.add_coverage("q", day(7), day(7))
+    assert store.missing_ranges("q", day(6), day(8)) == [(day(6), day(8))]
+
+
+def test_get_papers_returns_latest_version_in_window(tmp_path):
+    store = PaperStore(str(tmp_path / "papers.sqlite"))
+    store.add_papers([paper("2501.00001", day(2)), paper("2501.00002", day(5))], query_key="q")
+    store.add_papers([dict(paper("2501.00001", day(6)), link="http://arxiv.org/abs/2501.00001v2")], query_key="q")
+    papers = store.get_papers("q", day(1), day(10))
+    assert [p["link"] for p in papers] == ["http://arxiv.org/abs/2501.00001v2", "http://arxiv.org/abs/2501.00002v1"]
+    assert store.get_papers("q", day(1), day(3)) == []
+
+
+def test_harvest_keeps_recent_days_uncovered(tmp_path, monkeypatch):
+    store = PaperStore(str(tmp_path / "papers.sqlite"))
+    plan = plan_query({"query": "vision", "category": "cs.CV", "sort_by_choice": "lastUpdatedDate", "max_results": 100}, days=8)
+    calls = []
+
+    def fake_listing(search_query, sort_by_choice, max_results=50, since=None, until=None, **kwargs):
+        calls.append((since, until))
+        return [paper(f"2501.0000{len(calls)}", until - datetime.timedelta(hours=1))]
+
+    monkeypatch.setattr(scrapt_arxiv, "get_recent_arxiv_links_with_arxivpy", fake_listing)
+    scrapt_arxiv.harvest_arxiv_window(plan, store)
+    assert calls == [(plan['since'], plan['until'])]
+
+    # The announcement lag is still re-queried on the next run, the settled part of the window is not
+    calls.clear()
+    scrapt_arxiv.harvest_arxiv_window(plan, store)
+    assert len(calls) == 1
+    since, until = calls[0]
+    assert until == plan['until']
+    assert abs((until - since) - scrapt_arxiv.ARXIV_ANNOUNCEMENT_LAG) < datetime.timedelta(minutes=1)
+
+
+
+def test_matches_query():
+    record = {"title": "Real-Time Human Pose Estimating", "abstract": "Keypoint heatmaps.", "authors": ["Ada Lovelace"],
+              "acm_classifications": ["cs.CV", "cs.LG"], "primary_category": "cs.CV"}
+    assert matches_query(record, "human pose estimation")
+    assert matches_query(record, 'ti:"pose estimation" AND au:lovelace')
+    assert not matches_query(record, 'ti:"estimation pose"')
+    assert matches_query(record, "(mamba OR heatmap) ANDNOT cat:cs.RO")
+    assert not matches_query(record, "vision mamba")
+    assert matches_query(record, "")
+
+
+def test_blocks_of_a_category_share_one_harvest(tmp_path, monkeypatch):
+    store = PaperStore(str(tmp_path / "papers.sqlite"))
+    calls = []
+
+    def fake_listing(search_query, sort_by_choice, max_results=50, since=None, until=None, **kwargs):
+        calls.append(search_query)
+        return [
+            dict(paper("2501.00001", until - datetime.timedelta(hours=1)), title="Human Pose Estimation in the Wild"),
+            dict(paper("2501.00002", until - datetime.timedelta(hours=2)), title="A Survey of Vision Mamba Models"),
+        ]
+
+    monkeypatch.setattr(scrapt_arxiv, "get_recent_arxiv_links_with_arxivpy", fake_listing)
+    pose = plan_query({"query": "human pose estimation", "category": "cs.CV", "sort_by_choice": "lastUpdatedDate", "max_results": 100}, days=8)
+    mamba = plan_query({"query": "Vision mamba survey", "category": "cs.CV", "sort_by_choice": "lastUpdatedDate", "max_results": 100}, days=8)
+    assert [p["title"] for p in scrapt_arxiv.harvest_arxiv_window(pose, store)] == ["Human Pose Estimation in the Wild"]
+    assert [p["title"] for p in scrapt_arxiv.harvest_arxiv_window(mamba, store)] == ["A Survey of Vision Mamba Models"]
+    # One category listing, without the query text; the second block only re-asks for the unsettled days
+    assert calls[0].startswith("cat:cs.CV AND lastUpdatedDate:")
+    assert len(calls) == 2 and calls[1].startswith("cat:cs.CV AND")
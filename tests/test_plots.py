@@ -0,0 +1,42 @@
+import os
+
+from utils import plots
+from utils.plots import PlotDigests, render_if_changed, scores_digest
+
+
+def test_digests_live_outside_the_image_folder(tmp_path):
+    md_folder = tmp_path / "md"
+    md_folder.mkdir()
+    image = str(md_folder / "digest_stats.png")
+    digests = PlotDigests(str(tmp_path / "plot_digests.json"))
+    digest = scores_digest([0.1, 0.2], [0.3, 0.4], [0.5, 0.6])
+
+    assert not digests.is_up_to_date(image, digest)
+    (md_folder / "digest_stats.png").write_bytes(b"png")
+    digests.record(image, digest)
+    digests.save()
+    assert os.listdir(md_folder) == ["digest_stats.png"]
+
+    reopened = PlotDigests(str(tmp_path / "plot_digests.json"))
+    assert reopened.is_up_to_date(image, digest)
+    assert not reopened.is_up_to_date(image, scores_digest([0.1, 0.2], [0.3, 0.4], [0.5, 0.7]))
+    os.remove(image)
+    assert not reopened.is_up_to_date(image, digest)
+
+
+def test_unchanged_scores_are_not_redrawn(tmp_path, monkeypatch):
+    drawn = []
+
+    def fake_render(negatives, positives, scores, image_path):
+        drawn.append(image_path)
+        with open(image_path, 'wb') as f:
+            f.write(b"png")
+
+    monkeypatch.setattr(plots, "render_scatter_plot", fake_render)
+    digests = PlotDigests(str(tmp_path / "plot_digests.json"))
+    image = str(tmp_path / "digest_stats.png")
+
+    assert render_if_changed([0.1], [0.2], [0.3], image, digests)
+    assert not render_if_changed([0.1], [0.2], [0.3], image, digests)
+    assert render_if_changed([0.1], [0.2], [0.4], image, digests)
+    assert drawn == [image, image]
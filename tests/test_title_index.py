@@ -0,0 +1,64 @@
+import datetime
+import json
+
+from utils.title_index import TitleIndex, build_title_index, normalize_title, record_to_result
+
+
+def test_normalize_title():
+    assert normalize_title("  Attention Is All-You  Need!\n") == "attention is all you need"
+
+
+def test_dump_lines_become_results():
+    result = record_to_result({
+        "id": "2610.01234",
+        "title": "A  Paper\n Title",
+        "abstract": "Abstract.",
+        "categories": "cs.CV cs.LG",
+        "authors": "Ada Lovelace, Alan Turing and Grace Hopper",
+        "update_date": "2026-10-17",
+    })
+    assert result.entry_id == "http://arxiv.org/abs/2610.01234"
+    assert result.pdf_url == "http://arxiv.org/pdf/2610.01234"
+    assert result.title == "A Paper Title"
+    assert result.authors == ["Ada Lovelace", "Alan Turing", "Grace Hopper"]
+    assert result.categories == ["cs.CV", "cs.LG"] and result.primary_category == "cs.CV"
+    assert result.updated == datetime.datetime(2026, 10, 17, tzinfo=datetime.timezone.utc)
+    assert result.published == result.updated
+    assert record_to_result({"title": "No id"}) is None
+
+
+def test_records_without_a_usable_date_are_left_to_the_api():
+    record = {"id": "2610.01234", "title": "A Title", "versions": [{"version": "v1", "created": "Mon, 5 Oct 2026 17:59:59 GMT"}]}
+    assert record_to_result(record) is None
+    assert record_to_result(dict(record, update_date="not a date")) is None
+    result = record_to_result(dict(record, update_date="2026-10-07"))
+    assert result.published == datetime.datetime(2026, 10, 5, 17, 59, 59, tzinfo=datetime.timezone.utc)
+    assert result.updated.strftime("%Y-%m-%d %H:%M:%S%z") == "2026-10-07 00:00:00+0000"
+
+
+def test_exact_and_fuzzy_matches(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    dump.write_text("\n".join(json.dumps(record) for record in [
+        {"id": "2610.00001", "title": "Sparse Gaussian Splatting for Real-Time Rendering", "update_date": "2026-10-01"},
+        {"id": "2610.00002", "title": "Diffusion Models Beat GANs on Image Synthesis", "update_date": "2026-10-02"},
+    ]) + "\n", encoding="utf-8")
+    index = build_title_index("none", [str(dump)])
+    assert len(index) == 2
+
+    result, similarity = index.match("Sparse Gaussian Splatting for Real-time Rendering.")
+    assert result.entry_id.endswith("2610.00001") and similarity == 1.0
+    result, similarity = index.match("Sparse Gaussian Splatting for Realtime Rendering")
+    assert result.entry_id.endswith("2610.00001") and 0.85 <= similarity < 1.0
+    result, _ = index.match("Unrelated Title About Robots")
+    assert result is None
+    assert list(index.resolve(["Diffusion models beat GANs on image synthesis", "Unknown"])) == ["Diffusion models beat GANs on image synthesis"]
+
+
+def test_new_version_replaces_the_indexed_paper():
+    index = TitleIndex()
+    index.add_records([
+        {"link": "http://arxiv.org/abs/2610.00001v1", "title": "Old Title", "date": "2026-10-01 09:00:00+0000"},
+        {"link": "http://arxiv.org/abs/2610.00001v2", "title": "Old Title", "date": "2026-10-08 09:00:00+0000"},
+    ])
+    assert len(index) == 1
+    assert index.match("Old Title")[0].entry_id.endswith("v2")
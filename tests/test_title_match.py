@@ -0,0 +1,36 @@
+import pytest
+
+from utils import title_match
+from utils.title_match import best_matches, pair_scores, title_key
+
+
+def test_title_key():
+    assert title_key("Need You: Attention") == "attention need you"
+
+
+@pytest.fixture(params=["default", "difflib"])
+def scorer(request, monkeypatch):
+    if request.param == "difflib":
+        monkeypatch.setattr(title_match, "process", None)
+        monkeypatch.setattr(title_match, "fuzz", None)
+    return request.param
+
+
+def test_pair_scores(scorer):
+    scores = pair_scores(["Deep Residual Learning", "Deep Residual Learning"], ["Learning, Deep Residual", "Graph Neural Networks"])
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[1] < 0.6
+    assert len(pair_scores([], [])) == 0
+    with pytest.raises(ValueError):
+        pair_scores(["a"], [])
+
+
+def test_best_matches(scorer):
+    matches = best_matches({
+        "Deep Residual Learning for Image Recognition": ["Graph Neural Networks", "Deep Residual Learning for Image Recognition."],
+        "Unmatched Title": ["Something Else Entirely"],
+        "No Candidates": [],
+    })
+    assert matches["Deep Residual Learning for Image Recognition"][0] == 1
+    assert matches["Unmatched Title"][0] is None
+    assert matches["No Candidates"] == (None, 0.0)
@@ -0,0 +1,50 @@
+import datetime
+
+from utils.watermark import advance_watermark, filter_new_papers, merge_rolling, watermark_start
+
+UTC = datetime.timezone.utc
+
+
+def paper(arxiv_id, day, score=0.5):
+    return {
+        "link": f"http://arxiv.org/abs/{arxiv_id}",
+        "title": f"Paper {arxiv_id}",
+        "date": datetime.datetime(2026, 10, day, 12, tzinfo=UTC),
+        "general_score": score,
+    }
+
+
+def test_first_run_keeps_every_paper():
+    papers = [paper("2610.00001v1", 1), paper("2610.00002v1", 2)]
+    watermark = {"last_updated": None, "seen_ids": {}}
+    assert watermark_start(watermark) is None
+    assert filter_new_papers(papers, watermark) == papers
+
+
+def test_seen_and_old_papers_are_filtered_out():
+    watermark = advance_watermark({"last_updated": None, "seen_ids": {}}, [paper("2610.00001v1", 9), paper("2610.00002v1", 10)])
+    assert watermark["last_updated"] == datetime.datetime(2026, 10, 10, 12, tzinfo=UTC).isoformat()
+    # The overlap window reaches one day back from the newest paper
+    assert watermark_start(watermark) == datetime.datetime(2026, 10, 9, 12, tzinfo=UTC)
+
+    candidates = [
+        paper("2610.00001v1", 9),  # seen
+        paper("2610.00003v1", 8),  # older than the overlap
+        paper("2610.00004v1", 9),  # late-indexed, inside the overlap
+        paper("2610.00001v2", 11),  # new version of a seen paper
+    ]
+    new = filter_new_papers(candidates, watermark)
+    assert [p["link"].split("/")[-1] for p in new] == ["2610.00004v1", "2610.00001v2"]
+
+
+def test_seen_ids_outside_the_overlap_are_forgotten():
+    watermark = advance_watermark({"last_updated": None, "seen_ids": {}}, [paper("2610.00001v1", 1)])
+    watermark = advance_watermark(watermark, [paper("2610.00002v1", 5)])
+    assert list(watermark["seen_ids"]) == ["2610.00002v1"]
+
+
+def test_rolling_store_keeps_the_latest_version(tmp_path):
+    path = str(tmp_path / "rolling_analyzed.jsonl")
+    merge_rolling(path, [paper("2610.00001v1", 1, score=0.2), paper("2610.00002v1", 1, score=0.5)])
+    merged = merge_rolling(path, [paper("2610.00001v2", 2, score=0.9)])
+    assert [(p["link"].split("/")[-1], p["general_score"]) for p in merged] == [("2610.00001v2", 0.9), ("2610.00002v1", 0.5)]
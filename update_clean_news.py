@@ -3,6 +3,7 @@ import json
 import re
 from typing import List, Dict
 import utils.md_format as mdf
+from utils.jsonl_store import load_records, open_records, write_records
 
 def extract_titles_from_markdown(markdown_path: str) -> List[str]:
     """Extract all titles from markdown file."""
@@ -17,9 +18,8 @@ def extract_titles_from_markdown(markdown_path: str) -> List[str]:
 def update_json_from_markdown(json_path: str, markdown_path: str, output_json_path: str) -> Dict:
     """Update JSON file based on markdown titles."""
     try:
-        # Read existing JSON
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        # Read existing records (.jsonl or legacy .json)
+        json_data = load_records(json_path)
         
         # Get markdown titles
         markdown_titles = extract_titles_from_markdown(markdown_path)
@@ -30,9 +30,12 @@ def update_json_from_markdown(json_path: str, markdown_path: str, output_json_pa
             if paper.get('title') in markdown_titles
         ]
         
-        # Write updated JSON
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(filtered_data, f, indent=4, ensure_ascii=False)
+        # Write updated records
+        if output_json_path.endswith('.jsonl'):
+            write_records(output_json_path, filtered_data)
+        else:
+            with open(output_json_path, 'w', encoding='utf-8') as f:
+                json.dump(filtered_data, f, indent=4, ensure_ascii=False)
         
         metrics = {
             "original_papers": len(json_data),
@@ -48,6 +51,7 @@ def update_json_from_markdown(json_path: str, markdown_path: str, output_json_pa
 
 def sync_markdown_json(root_folder: str):
     """Synchronize JSON files with markdown content."""
+    from utils.watermark import STATE_FILES # Imports numpy: only needed here
     input_folder = os.path.join(root_folder, "automation/weekly_arxiv_json")
     markdown_folder = os.path.join(root_folder, "Weekly Letter")
     
@@ -57,7 +61,7 @@ def sync_markdown_json(root_folder: str):
     for folder in folders:
         #get the file that are in folder and doesn't end with config.json or clean.json
 
-        files = [f for f in os.listdir(os.path.join(input_folder, folder)) if f.endswith('.json') and not f.endswith('_config.json') and not f.endswith('_clean.json')]
+        files = [f for f in os.listdir(os.path.join(input_folder, folder)) if (f.endswith('.json') or f.endswith('.jsonl')) and not f.endswith('_config.json') and not re.search(r'_clean\.jsonl?$', f) and f not in STATE_FILES]
 
         if len(files) == 0:
             print(f"No JSON files found in {folder}")
@@ -66,8 +70,9 @@ def sync_markdown_json(root_folder: str):
         for file in files:
             json_path = os.path.join(input_folder, folder, file)
             json_archive = os.path.join(input_folder,"archive", file)
-            markdown_path = os.path.join(markdown_folder, folder, file.replace('_analyzed.json', ' clean.md'))
-            output_json_path = os.path.join(input_folder, folder, file.replace('_analyzed.json', '_clean.json'))
+            stem, extension = os.path.splitext(file)
+            markdown_path = os.path.join(markdown_folder, folder, stem.replace('_analyzed', '') + ' clean.md')
+            output_json_path = os.path.join(input_folder, folder, stem.replace('_analyzed', '') + '_clean' + extension)
         
             if os.path.exists(json_path) and os.path.exists(markdown_path):
                 metrics = update_json_from_markdown(json_path, markdown_path, output_json_path)
@@ -79,11 +84,12 @@ def sync_markdown_json(root_folder: str):
                     # Move JSON file to archive
                     try:
                         os.replace(json_path, json_archive)
+                        if os.path.exists(json_path + '.idx'):
+                            os.replace(json_path + '.idx', json_archive + '.idx')
                         print(f"Moved {file} to archive")
                     except Exception as e:
                         print(f"Error moving file to archive: {str(e)}")
-                    with open(output_json_path, 'r', encoding='utf-8') as f:
-                        papers = json.load(f)
+                    papers = open_records(output_json_path)
                     mdf.list_to_markdown(papers, markdown_path.replace(' clean.md', '_clean.md'))
             else:
                 if not os.path.exists(json_path):
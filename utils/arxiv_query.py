@@ -0,0 +1,192 @@
+import datetime
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# arXiv recommends at most 2000 results per page; smaller pages let date-sorted paging stop early
+DEFAULT_PAGE_SIZE = 500
+# Category harvests are shared by every query block of the category, so they list the whole window
+CATEGORY_HARVEST_MAX_RESULTS = 10000
+
+# Paper dict fields searched by each arXiv field prefix (result_to_paper appends comments to the abstract)
+QUERY_FIELDS = {
+    "ti": ("title",),
+    "abs": ("abstract",),
+    "co": ("abstract",),
+    "au": ("authors",),
+    "cat": ("acm_classifications", "primary_category"),
+}
+QUERY_OPERATORS = ("AND", "OR", "ANDNOT")
+# Light suffix stripping (suffix, replacement), so 'estimation' also matches 'estimating' as with
+# arXiv's stemming; the first matching suffix wins
+STEM_SUFFIXES = (
+    ("sses", "ss"), ("ss", "ss"), ("ations", ""), ("ation", ""), ("ating", ""), ("ated", ""), ("ates", ""),
+    ("ate", ""), ("ings", ""), ("ing", ""), ("ies", "y"), ("es", ""), ("s", ""), ("ed", ""), ("e", ""),
+)
+
+
+def format_arxiv_date(date):
+    """Formats a datetime as the YYYYMMDDHHMM (UTC) stamp used by arXiv date range clauses."""
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc)
+    return date.strftime("%Y%m%d%H%M")
+
+
+def build_arxiv_query(query, category=None, since=None, until=None, date_field="lastUpdatedDate"):
+    """
+    Rewrites a free query into an arXiv API query restricted to a category and a date window.
+
+    Args:
+        query (str): The user query (any arXiv query syntax).
+        category (str): Category to restrict to (e.g. 'cs.CV'), added as a `cat:` clause.
+        since (datetime): Start of the date window.
+        until (datetime): End of the date window.
+        date_field (str): 'lastUpdatedDate' or 'submittedDate'.
+
+    Returns:
+        str: e.g. '(pose estimation) AND cat:cs.CV AND lastUpdatedDate:[202501020000 TO 202501102359]'
+    """
+    clauses = []
+    if query and query.strip():
+        clauses.append(f"({query.strip()})")
+    if category and f"cat:{category}" not in (query or ""):
+        clauses.append(f"cat:{category}")
+    if since is not None or until is not None:
+        start = format_arxiv_date(since) if since is not None else "000001010000"
+        end = format_arxiv_date(until) if until is not None else format_arxiv_date(datetime.datetime.now(datetime.timezone.utc))
+        clauses.append(f"{date_field}:[{start} TO {end}]")
+    return " AND ".join(clauses)
+
+
+def query_key(query, category):
+    """Key identifying the result set of a (query, category) pair, e.g. in the paper store."""
+    return f"{query} | cat:{category}" if category else query
+
+
+def category_key(category):
+    """Key of the harvest of a whole category, shared by every query block searching it."""
+    return f"cat:{category}"
+
+
+def _stem(word):
+    for suffix, replacement in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def _words(text):
+    return [_stem(word) for word in re.findall(r"\w+", str(text).lower())]
+
+
+def _contains(words, phrase):
+    return any(words[i:i + len(phrase)] == phrase for i in range(len(words) - len(phrase) + 1))
+
+
+def matches_query(paper, query):
+    """
+    Local approximation of the arXiv search of `query` on a paper dict (as built by scrapt_arxiv).
+
+    Supports field prefixes (ti:, abs:, au:, co:, cat:, all:), quoted phrases, parentheses and
+    the AND / OR / ANDNOT operators; adjacent terms are ANDed. Words are compared
+    case-insensitively after light stemming, so the result can differ slightly from the API's.
+    """
+    tokens = re.findall(r'\(|\)|\w+:"[^"]*"|"[^"]*"|[^\s()]+', query or "")
+    if not tokens:
+        return True
+    fields = {}
+    position = 0
+
+    def field_words(field):
+        if field not in fields:
+            names = QUERY_FIELDS.get(field) or tuple(name for names in QUERY_FIELDS.values() for name in names)
+            values = []
+            for name in dict.fromkeys(names):
+                value = paper.get(name)
+                values.extend(value if isinstance(value, (list, tuple)) else [value] if value else [])
+            fields[field] = [_words(value) for value in values]
+        return fields[field]
+
+    def term(token):
+        field, separator, text = token.partition(":")
+        if not separator or field not in QUERY_FIELDS and field != "all":
+            field, text = "all", token
+        phrase = _words(text.strip('"'))
+        return not phrase or any(_contains(words, phrase) for words in field_words(field))
+
+    def atom():
+        nonlocal position
+        if position >= len(tokens):
+            return True
+        token = tokens[position]
+        position += 1
+        if token == "(":
+            value = expression()
+            if position < len(tokens) and tokens[position] == ")":
+                position += 1
+            return value
+        return term(token)
+
+    def expression():
+        nonlocal position
+        value = atom()
+        while position < len(tokens) and tokens[position] != ")":
+            operator = "AND"
+            if tokens[position] in QUERY_OPERATORS:
+                operator = tokens[position]
+                position += 1
+            right = atom()
+            if operator == "AND":
+                value = value and right
+            elif operator == "OR":
+                value = value or right
+            else:
+                value = value and not right
+        return value
+
+    return expression()
+
+
+def plan_query(config, days=8, now=None):
+    """
+    Plans the arXiv request for a query block from queries.md.
+
+    The date window matches `filter_papers_by_date_and_category`: from `days` before the end of
+    today up to now. Date and category restrictions are pushed into the API query so that only
+    the papers actually used are listed.
+
+    Date-sorted blocks with a category are harvested through the paper store per category
+    ('harvest_key', 'harvest_query'): the whole category listing of the window is fetched once,
+    shared by every block of that category, and each block's query is applied locally
+    (matches_query).
+
+    Returns:
+        dict: with 'query', 'category', 'search_query', 'key', 'harvest_key', 'harvest_query', 'harvest_max_results',
+              'since', 'until', 'date_sorted', 'sort_by_choice', 'max_results' and 'page_size'.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    since = now.replace(hour=23, minute=59, second=59, microsecond=999999) - datetime.timedelta(days=days)
+    query = config.get("query", "")
+    category = config.get("category")
+    sort_by_choice = config.get("sort_by_choice", "lastUpdatedDate")
+    max_results = config.get("max_results", 1000)
+    # The date window is only pushed into the query for date-sorted listings (as in the client-side filter)
+    date_sorted = sort_by_choice.lower() == "lastupdateddate"
+    plan = {
+        "query": query,
+        "category": category,
+        "search_query": build_arxiv_query(query, category, since if date_sorted else None, now if date_sorted else None),
+        "key": query_key(query, category),
+        "harvest_key": category_key(category) if category else query_key(query, category),
+        "harvest_query": "" if category else query,
+        "harvest_max_results": max(max_results, CATEGORY_HARVEST_MAX_RESULTS) if category else max_results,
+        "since": since,
+        "until": now,
+        "date_sorted": date_sorted,
+        "sort_by_choice": sort_by_choice,
+        "max_results": max_results,
+        "page_size": min(max_results, DEFAULT_PAGE_SIZE),
+    }
+    logger.info(f"Planned arXiv query for '{config.get('id', query)}': {plan['search_query']}")
+    return plan
@@ -0,0 +1,181 @@
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+
+try:
+    from utils.title_index import normalize_title
+except ImportError:
+    from title_index import normalize_title # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def _text(value):
+    # Every parser normalises whitespace the same way, so row digests do not depend on the parser
+    return ' '.join((value or '').split())
+
+
+def _parse_rows_selectolax(html):
+    from selectolax.parser import HTMLParser
+    for row in HTMLParser(html).css('tr'):
+        title_tag = row.css_first('strong')
+        if title_tag is None:
+            continue
+        authors_tag = row.css_first('div.indented')
+        yield _text(title_tag.text(separator=' ')), _text(authors_tag.text(separator=' ')) if authors_tag is not None else ""
+
+
+def _parse_rows_lxml(html):
+    from lxml import etree
+    # Streaming parse: each <tr> is read when it closes, then freed
+    for _, row in etree.iterparse(io.BytesIO(html), events=('end',), tag='tr', html=True, recover=True):
+        title_tag = row.find('.//strong')
+        if title_tag is not None:
+            authors_tags = [div for div in row.iter('div') if 'indented' in (div.get('class') or '').split()]
+            authors_tag = authors_tags[0] if authors_tags else None
+            yield _text(' '.join(title_tag.itertext())), _text(' '.join(authors_tag.itertext())) if authors_tag is not None else ""
+        row.clear()
+
+
+def _parse_rows_bs4(html):
+    from bs4 import BeautifulSoup
+    for row in BeautifulSoup(html, 'html.parser').find_all('tr'):
+        title_tag = row.find('strong')
+        if not title_tag:
+            continue
+        authors_tag = row.find('div', class_='indented')
+        yield _text(title_tag.get_text(" ")), _text(authors_tag.get_text(" ")) if authors_tag else ""
+
+
+def parse_listing_rows(html):
+    """
+    Returns [{"title", "authors"}] for every table row of an accepted-papers page with a <strong> title.
+
+    Uses selectolax, else lxml (streaming, in requirements.txt), else BeautifulSoup, whichever is
+    installed first.
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    for parser in (_parse_rows_selectolax, _parse_rows_lxml, _parse_rows_bs4):
+        try:
+            rows = [{"title": title, "authors": authors} for title, authors in parser(html) if title]
+        except ImportError:
+            continue
+        return rows
+    raise ImportError("Parsing conference listings needs selectolax, lxml or beautifulsoup4")
+
+
+def row_key(row):
+    return normalize_title(row["title"])
+
+
+def row_digest(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def diff_rows(previous, rows):
+    """
+    Compares the rows of a listing with the previous snapshot ({row key: {"title", "digest"}}).
+
+    Returns (added, changed, removed): new and modified rows, and the titles no longer listed.
+    """
+    added, changed = [], []
+    current = set()
+    for row in rows:
+        key = row_key(row)
+        current.add(key)
+        if key not in previous:
+            added.append(row)
+        elif previous[key]["digest"] != row_digest(row):
+            changed.append(row)
+    removed = [entry["title"] for key, entry in previous.items() if key not in current]
+    return added, changed, removed
+
+
+class ListingIngester:
+    """
+    Incremental reader of a conference accepted-papers page.
+
+    The page is fetched with a conditional GET (the ETag / Last-Modified of the previous fetch),
+    so an unchanged listing costs a 304 and no parsing. A changed page is parsed and diffed
+    row by row against the snapshot kept in `state_path`, so callers only process the papers that
+    were added or changed. The new snapshot is saved by `commit`, once the caller has stored
+    what it did with the changes; an interrupted run therefore sees the same changes again.
+    """
+
+    def __init__(self, url, state_path, session=None, timeout=30):
+        self.url = url
+        self.state_path = state_path
+        self.timeout = timeout
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+        self.state = self._load_state()
+        self._pending_state = None
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get("url") == self.url:
+                    return state
+                logger.warning(f"{self.state_path} tracks {state.get('url')}; starting a new snapshot for {self.url}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable listing state {self.state_path}: {e}")
+        return {"url": self.url, "etag": None, "last_modified": None, "rows": {}}
+
+    @property
+    def titles(self):
+        """Titles of the listing as of the last snapshot (committed or pending)."""
+        state = self._pending_state or self.state
+        return [entry["title"] for entry in state["rows"].values()]
+
+    def check(self):
+        """
+        Fetches the listing and diffs it against the snapshot.
+
+        Returns a dict with "not_modified" (True on a 304), and the "added" and "changed" rows and
+        "removed" titles. Raises requests exceptions on network / HTTP errors.
+        """
+        headers = {}
+        if self.state["rows"]:
+            if self.state.get("etag"):
+                headers["If-None-Match"] = self.state["etag"]
+            if self.state.get("last_modified"):
+                headers["If-Modified-Since"] = self.state["last_modified"]
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            logger.info(f"{self.url} not modified since the last fetch")
+            return {"not_modified": True, "added": [], "changed": [], "removed": []}
+        response.raise_for_status()
+
+        rows = parse_listing_rows(response.content)
+        if not rows:
+            # Keep the snapshot: an empty parse would otherwise mark every paper as removed
+            logger.warning("No paper entries found. The page structure might have changed.")
+            return {"not_modified": False, "added": [], "changed": [], "removed": []}
+        added, changed, removed = diff_rows(self.state["rows"], rows)
+        logger.info(f"{self.url}: {len(rows)} rows, {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+        self._pending_state = {
+            "url": self.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "rows": {row_key(row): {"title": row["title"], "digest": row_digest(row)} for row in rows},
+        }
+        return {"not_modified": False, "added": added, "changed": changed, "removed": removed}
+
+    def commit(self):
+        """Saves the snapshot of the last `check` as the baseline of the next one."""
+        if self._pending_state is None:
+            return
+        temp_file = self.state_path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._pending_state, f)
+        os.replace(temp_file, self.state_path)
+        self.state, self._pending_state = self._pending_state, None
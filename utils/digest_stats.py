@@ -0,0 +1,98 @@
+import datetime
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the columns or their parsing change, so cached .stats.npz files are rebuilt
+COLUMNS_VERSION = 1
+MISSING_DAY = -1
+EPOCH_DAY = datetime.date(1970, 1, 1).toordinal()
+
+
+def parse_paper_date(value):
+    """Returns (epoch seconds, day number since 1970-01-01) of a paper date, or None if it cannot be parsed."""
+    if isinstance(value, datetime.datetime):
+        date = value
+    elif isinstance(value, str) and value.strip():
+        text = value.strip().replace('Z', '+00:00')
+        try:
+            date = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            try:
+                date = datetime.datetime.strptime(text[:10], "%Y-%m-%d")
+            except ValueError:
+                return None
+    else:
+        return None
+    # The day is the calendar day as written in the record, like the digest always displayed it
+    day = date.date().toordinal() - EPOCH_DAY
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp()), day
+
+
+def build_columns(papers):
+    """Normalises paper records in one pass into NumPy columns: scores, stars, epoch seconds and day numbers."""
+    general, positive, negative, stars, epoch, day = [], [], [], [], [], []
+    for paper in papers:
+        general.append(float(paper.get('general_score') or 0))
+        positive.append(float(paper.get('positive_score') or 0))
+        negative.append(float(paper.get('negative_score') or 0))
+        stars.append(int(paper.get('stars') or 0))
+        parsed = parse_paper_date(paper.get('date'))
+        epoch.append(parsed[0] if parsed else 0)
+        day.append(parsed[1] if parsed else MISSING_DAY)
+    return {
+        "general_score": np.asarray(general, dtype=np.float64),
+        "positive_score": np.asarray(positive, dtype=np.float64),
+        "negative_score": np.asarray(negative, dtype=np.float64),
+        "stars": np.asarray(stars, dtype=np.int64),
+        "epoch": np.asarray(epoch, dtype=np.int64),
+        "day": np.asarray(day, dtype=np.int32),
+    }
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return np.asarray([COLUMNS_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def load_columns(records_path, papers):
+    """
+    Returns the columns of the records stored at `records_path`, cached in `<records_path>.stats.npz`.
+
+    The cache is keyed by the size and modification time of the records file: appending records
+    or rewriting the file rebuilds it from `papers` (an iterable of the same records).
+    """
+    cache_path = records_path + ".stats.npz"
+    signature = _source_signature(records_path)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached["signature"], signature):
+                    return {name: cached[name] for name in cached.files if name != "signature"}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Rebuilding stats cache {cache_path}: {e}")
+    columns = build_columns(papers)
+    temp_file = cache_path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        np.savez(f, signature=signature, **columns)
+    os.replace(temp_file, cache_path)
+    return columns
+
+
+def summarize(columns, recent=5):
+    """Digest header numbers: paper count, score averages, total stars and the most recent days."""
+    n_papers = len(columns["general_score"])
+    days = np.unique(columns["day"][columns["day"] != MISSING_DAY])[::-1][:recent]
+    return {
+        "n_papers": n_papers,
+        "avg_score": float(columns["general_score"].mean()) if n_papers else 0.0,
+        "avg_negative": float(columns["negative_score"].mean()) if n_papers else 0.0,
+        "avg_positive": float(columns["positive_score"].mean()) if n_papers else 0.0,
+        "total_stars": int(columns["stars"][columns["stars"] > 0].sum()),  # -1 marks stars that couldn't be fetched
+        "recent_dates": [datetime.date.fromordinal(int(d) + EPOCH_DAY).isoformat() for d in days],
+    }
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    from utils.paper_store import split_arxiv_id
+except ImportError:
+    from paper_store import split_arxiv_id # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text):
+    """Returns the sha1 hex digest used to content-address an embedded text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def get_arxiv_id(paper):
+    """Extracts the versioned arXiv ID (e.g. '2401.01234v2') from a paper dict, or None."""
+    if paper.get("arxiv_id"):
+        return paper["arxiv_id"]
+    link = paper.get("link") or paper.get("arxiv_link")
+    if link and "arxiv.org" in link:
+        return link.rstrip("/").split("/")[-1]
+    return None
+
+
+def _paper_key(paper_id):
+    # Versions of a paper share one slot, so a revision replaces the row of the previous version
+    return split_arxiv_id(paper_id)[0] if paper_id else None
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of text embeddings for one embedding model.
+
+    Embeddings are kept as float16 NumPy shards that are memory-mapped on read, with a JSON
+    index mapping each text hash to its (shard, row). New rows are appended to the last shard
+    until it holds `shard_size` rows, so small incremental runs do not pile up tiny shards. An arXiv ID -> text hash map lets a
+    paper whose title or abstract changed be re-embedded and its stale row forgotten; it is keyed
+    by the unversioned ID, so a new version of a paper also replaces the entry of the previous one.
+    Least recently used shards are evicted once the namespace grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir, model_name, max_bytes=2 * 1024**3, shard_size=4096):
+        # One namespace per model so vectors from different models never mix
+        namespace = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, namespace)
+        self.max_bytes = max_bytes
+        self.shard_size = shard_size
+        self._lock = threading.Lock()
+        self._shards = {}  # shard name -> memory-mapped array
+        os.makedirs(self.path, exist_ok=True)
+        self._index_file = os.path.join(self.path, "index.json")
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self._index_file):
+            try:
+                with open(self._index_file, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                # Indexes written before IDs were unversioned
+                index["ids"] = {_paper_key(paper_id): h for paper_id, h in index["ids"].items()}
+                return index
+            except (OSError, ValueError) as e:
+                logger.error(f"Corrupted embedding cache index {self._index_file}: {e}. Starting empty.")
+        return {"model": self.model_name, "dim": None, "next_shard": 0, "open_shard": None, "entries": {}, "ids": {}, "shards": {}}
+
+    def _save_index(self):
+        # Save atomically using temporary file
+        temp_file = self._index_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(temp_file, self._index_file)
+
+    def _get_shard(self, shard):
+        if shard not in self._shards:
+            self._shards[shard] = np.load(os.path.join(self.path, f"{shard}.npy"), mmap_mode="r")
+        return self._shards[shard]
+
+    def __len__(self):
+        return len(self._index["entries"])
+
+    def get_many(self, hashes, ids=None):
+        """
+        Looks up embeddings by text hash.
+
+        Args:
+            hashes (list): Text hashes to look up.
+            ids (list): Optional arXiv IDs aligned with `hashes`; a changed text for a known ID
+                        (of any version) invalidates the previous entry.
+
+        Returns:
+            dict: Maps position in `hashes` to a float32 embedding for every cache hit.
+        """
+        hits = {}
+        now = time.time()
+        with self._lock:
+            entries = self._index["entries"]
+            for i, h in enumerate(hashes):
+                paper_id = _paper_key(ids[i]) if ids else None
+                if paper_id:
+                    previous = self._index["ids"].get(paper_id)
+                    if previous is not None and previous != h:
+                        # The paper text changed: forget the stale vector
+                        entries.pop(previous, None)
+                        self._index["ids"].pop(paper_id)
+                entry = entries.get(h)
+                if entry is None:
+                    continue
+                shard, row = entry
+                try:
+                    hits[i] = np.asarray(self._get_shard(shard)[row], dtype=np.float32)
+                except (OSError, ValueError, IndexError) as e:
+                    logger.warning(f"Embedding cache shard {shard} unreadable ({e}). Dropping entry.")
+                    entries.pop(h, None)
+                    continue
+                self._index["shards"][shard]["last_used"] = now
+        return hits
+
+    def _append_to_shard(self, block, now):
+        """Writes rows to the open shard (or a new one once it is full); returns (shard, first row, rows written)."""
+        shards = self._index["shards"]
+        shard = self._index.get("open_shard")
+        if shard not in shards or shards[shard]["rows"] >= self.shard_size:
+            shard = f"shard_{self._index['next_shard']:06d}"
+            self._index["next_shard"] += 1
+            existing = None
+        else:
+            existing = np.load(os.path.join(self.path, f"{shard}.npy"))
+        offset = 0 if existing is None else existing.shape[0]
+        block = block[:self.shard_size - offset]
+        data = block if existing is None else np.concatenate([existing, block])
+        # Rewrite atomically: readers holding the old memory map keep a consistent file
+        shard_file = os.path.join(self.path, f"{shard}.npy")
+        with open(shard_file + ".tmp", "wb") as f:
+            np.save(f, data)
+        os.replace(shard_file + ".tmp", shard_file)
+        self._shards.pop(shard, None)
+        shards[shard] = {"rows": int(data.shape[0]), "bytes": int(data.nbytes), "last_used": now}
+        self._index["open_shard"] = shard
+        return shard, offset, int(block.shape[0])
+
+    def put_many(self, hashes, embeddings, ids=None):
+        """Stores new embeddings (aligned with `hashes`) as float16 shard rows and updates the index."""
+        if len(hashes) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float16)
+        with self._lock:
+            if self._index["dim"] is None:
+                self._index["dim"] = int(embeddings.shape[1])
+            elif self._index["dim"] != embeddings.shape[1]:
+                logger.error(f"Embedding dimension {embeddings.shape[1]} does not match cache dimension {self._index['dim']}. Not caching.")
+                return
+            now = time.time()
+            start = 0
+            while start < len(hashes):
+                shard, offset, written = self._append_to_shard(embeddings[start:], now)
+                for row, h in enumerate(hashes[start:start + written]):
+                    self._index["entries"][h] = [shard, offset + row]
+                start += written
+            if ids:
+                for paper_id, h in zip(ids, hashes):
+                    if paper_id:
+                        self._index["ids"][_paper_key(paper_id)] = h
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """Deletes least recently used shards until the namespace fits in `max_bytes`."""
+        shards = self._index["shards"]
+        total = sum(info["bytes"] for info in shards.values())
+        if total <= self.max_bytes:
+            return
+        evicted = set()
+        for shard, info in sorted(shards.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= info["bytes"]
+            evicted.add(shard)
+            self._shards.pop(shard, None)
+            try:
+                os.remove(os.path.join(self.path, f"{shard}.npy"))
+            except OSError:
+                pass
+        for shard in evicted:
+            shards.pop(shard)
+        if self._index.get("open_shard") in evicted:
+            self._index["open_shard"] = None
+        entries = self._index["entries"]
+        for h in [h for h, (shard, _) in entries.items() if shard in evicted]:
+            entries.pop(h)
+        live_hashes = set(entries)
+        self._index["ids"] = {paper_id: h for paper_id, h in self._index["ids"].items() if h in live_hashes}
+        logger.info(f"Evicted {len(evicted)} embedding shards from {self.path}.")
+
+
+def encode_with_cache(model, texts, ids=None, cache=None, batch_size=32):
+    """
+    Encodes `texts` with `model`, only sending texts missing from `cache` to the model.
+
+    Args:
+        model: A SentenceTransformer (or anything with an `encode` method).
+        texts (list): Texts to embed.
+        ids (list): Optional arXiv IDs aligned with `texts`.
+        cache (EmbeddingCache): Optional cache; when None every text is encoded.
+        batch_size (int): Batch size passed to `model.encode`.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), dim).
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    if cache is None:
+        return np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+    hashes = [text_hash(text) for text in texts]
+    hits = cache.get_many(hashes, ids)
+    missing = [i for i in range(len(texts)) if i not in hits]
+    logger.info(f"Embedding cache: {len(hits)} hits, {len(missing)} texts to encode.")
+
+    new_embeddings = None
+    if missing:
+        new_embeddings = np.asarray(model.encode([texts[i] for i in missing], batch_size=batch_size), dtype=np.float32)
+        # Duplicated texts within the batch only need to be stored once
+        unique = {}
+        for j, i in enumerate(missing):
+            unique.setdefault(hashes[i], j)
+        rows = list(unique.values())
+        cache.put_many(
+            [hashes[missing[j]] for j in rows],
+            new_embeddings[rows],
+            [ids[missing[j]] for j in rows] if ids else None,
+        )
+
+    dim = new_embeddings.shape[1] if new_embeddings is not None else next(iter(hits.values())).shape[0]
+    result = np.empty((len(texts), dim), dtype=np.float32)
+    for i, embedding in hits.items():
+        result[i] = embedding
+    for j, i in enumerate(missing):
+        result[i] = new_embeddings[j]
+    return result
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of loaded SentenceTransformer models, keyed by (model_name, device)
+_models = {}
+# Load statistics for each registry key (load time in seconds, resident memory delta in MB)
+_model_stats = {}
+_registry_lock = threading.Lock()
+
+
+def get_resident_memory_mb():
+    """Returns the current resident set size of the process in MB."""
+    try:
+        # /proc gives the current RSS on Linux
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Fallback to the peak RSS (KB on Linux, bytes on macOS)
+        try:
+            import resource
+            import sys
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        except Exception:
+            return 0.0
+
+
+def get_embedding_model(model_name, device=None, trust_remote_code=True):
+    """
+    Returns a shared SentenceTransformer for `model_name` on `device`, loading it once per process.
+
+    Args:
+        model_name (str): Name of the sentence-transformer model.
+        device (str): Torch device (e.g. 'cpu', 'cuda'). None lets sentence-transformers choose.
+        trust_remote_code (bool): Passed to SentenceTransformer on first load.
+
+    Returns:
+        SentenceTransformer: The cached model instance.
+    """
+    key = (model_name, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        # Another thread may have loaded it while we were waiting
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        from sentence_transformers import SentenceTransformer
+
+        memory_before = get_resident_memory_mb()
+        start_time = time.time()
+        model = SentenceTransformer(model_name, device=device, trust_remote_code=trust_remote_code)
+        load_time = time.time() - start_time
+        memory_delta = get_resident_memory_mb() - memory_before
+
+        _models[key] = model
+        _model_stats[key] = {
+            "model_name": model_name,
+            "device": device or str(getattr(model, "device", "auto")),
+            "load_time": load_time,
+            "memory_mb": memory_delta,
+        }
+        logger.info(f"Loaded embedding model '{model_name}' on {device or 'auto'} in {load_time:.2f} seconds (+{memory_delta:.0f} MB resident).")
+        return model
+
+
+def get_model_stats():
+    """Returns a list with the load time and resident memory recorded for each loaded model."""
+    return [dict(stats) for stats in _model_stats.values()]
+
+
+def release_embedding_model(model_name, device=None):
+    """Drops a model from the registry so it can be garbage collected."""
+    with _registry_lock:
+        _models.pop((model_name, device), None)
+        _model_stats.pop((model_name, device), None)
+
+
+class EmbeddingService:
+    """
+    Thread-safe front of a shared SentenceTransformer, loaded on the first encode call.
+
+    Calls are serialised on a lock (one forward pass at a time, whichever thread asks), so callers
+    should hand over all their texts in one `encode` call rather than one text at a time.
+    """
+
+    def __init__(self, model_name, device=None, trust_remote_code=True, batch_size=32):
+        self.model_name = model_name
+        self.device = device
+        self.trust_remote_code = trust_remote_code
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def encode(self, texts, normalize=True):
+        """Returns a (len(texts), dim) float32 array, L2-normalised by default (cosine = dot product)."""
+        model = get_embedding_model(self.model_name, self.device, self.trust_remote_code)
+        with self._lock:
+            embeddings = model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=normalize, show_progress_bar=False)
+            self.calls += 1
+            self.texts += len(texts)
+        return embeddings
+
+
+_services = {}
+
+
+def get_embedding_service(model_name, device=None, trust_remote_code=True):
+    """Returns the process-wide EmbeddingService of `model_name` on `device`."""
+    key = (model_name, device)
+    with _registry_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = EmbeddingService(model_name, device, trust_remote_code)
+        return service
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API = "https://api.github.com"
+GRAPHQL_BATCH_SIZE = 100  # Maximum number of repositories fetched per GraphQL request
+# Below this many remaining calls, requests are spread evenly until the rate-limit reset
+PACING_RESERVE = 50
+
+
+class GitHubRateLimiter:
+    """
+    Tracks GitHub's X-RateLimit-* headers per resource ('core', 'graphql', ...) on every response.
+
+    Requests are paced once the remaining budget runs low, so the quota lasts until the reset.
+    When it is exhausted (or a secondary limit asks to back off), callers are parked until the
+    reset time and then retried, instead of being answered with degraded data.
+    """
+
+    def __init__(self, reserve=PACING_RESERVE):
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._state = {}  # resource -> {"remaining", "reset", "next_slot"}
+        self.total_wait = 0.0
+
+    def update(self, resource, response):
+        """Records the rate-limit headers of `response`."""
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        resource = headers.get("X-RateLimit-Resource", resource)
+        with self._lock:
+            state = self._state.setdefault(resource, {"next_slot": 0.0})
+            state["remaining"] = int(headers.get("X-RateLimit-Remaining", 1))
+            state["reset"] = int(headers.get("X-RateLimit-Reset", 0))
+
+    def wait(self, resource):
+        """Blocks until a request on `resource` may be sent."""
+        with self._lock:
+            state = self._state.get(resource)
+            if not state or "remaining" not in state:
+                return
+            now = time.time()
+            until_reset = max(0.0, state["reset"] - now)
+            if state["remaining"] <= 0 and until_reset > 0:
+                delay = until_reset + 1
+                # Everyone parks until the reset; the first response afterwards refreshes the budget
+                state["next_slot"] = max(state["next_slot"], now + delay)
+            elif state["remaining"] < self.reserve and until_reset > 0:
+                # Spread the remaining budget evenly over the time left
+                interval = until_reset / max(state["remaining"], 1)
+                slot = max(now, state["next_slot"])
+                state["next_slot"] = slot + interval
+                state["remaining"] -= 1
+                delay = slot - now
+            else:
+                state["remaining"] -= 1
+                delay = max(0.0, state["next_slot"] - now)
+            self.total_wait += delay
+        if delay > 0:
+            logger.warning(f"GitHub {resource} rate limit: waiting {delay:.0f} seconds.")
+            time.sleep(delay)
+
+    def park(self, resource, response):
+        """Parks the caller after a rate-limited response until GitHub allows requests again."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            delay = float(retry_after)
+        else:
+            delay = max(0.0, int(response.headers.get("X-RateLimit-Reset", time.time())) - time.time()) + 1
+        with self._lock:
+            state = self._state.setdefault(resource, {"next_slot": 0.0})
+            state["next_slot"] = max(state["next_slot"], time.time() + delay)
+            self.total_wait += delay
+        logger.warning(f"GitHub {resource} rate limit exhausted: parking for {delay:.0f} seconds before resuming.")
+        time.sleep(delay)
+
+
+class GitHubRateLimitError(requests.exceptions.RequestException):
+    """Raised when a request is still rate-limited after every allowed park: no data, not zero stars."""
+
+
+def is_rate_limited(response):
+    """True for primary (remaining == 0) and secondary (Retry-After) GitHub rate-limit responses."""
+    if response.status_code not in (403, 429):
+        return False
+    return response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+
+
+def github_request(session, method, url, limiter, resource="core", max_parks=5, **kwargs):
+    """
+    Sends a GitHub API request through `limiter`, parking and retrying on rate-limit responses.
+
+    Returns:
+        requests.Response: The first response that is not rate-limited.
+
+    Raises:
+        GitHubRateLimitError: If the response is still rate-limited after `max_parks` parks.
+    """
+    for attempt in range(max_parks + 1):
+        limiter.wait(resource)
+        response = session.request(method, url, **kwargs)
+        limiter.update(resource, response)
+        if not is_rate_limited(response):
+            return response
+        if attempt < max_parks:
+            limiter.park(resource, response)
+    raise GitHubRateLimitError(f"GitHub {resource} rate limit still exhausted after {max_parks} parks: {url}", response=response)
+
+
+# Shared by every GitHub call of the process so that all of them see the same budget
+default_limiter = GitHubRateLimiter()
+
+
+def parse_repo_path(repo_url):
+    """Returns 'owner/name' for a GitHub repository URL, or None."""
+    match = re.search(r'github\.com/([A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+?)(?:\.git)?/?$', repo_url.rstrip('.'))
+    return match.group(1) if match else None
+
+
+class GitHubMetadataService:
+    """
+    Fetches repository metadata (stars) for many GitHub repos at once.
+
+    Repositories are deduplicated, looked up in a persistent JSON cache first (entries younger than
+    `ttl` seconds are reused as is), then refreshed with concurrent conditional REST calls over a
+    pooled session: the cached ETag is sent as If-None-Match, and a 304 for an unchanged repo does
+    not consume rate-limit quota. Repos the REST calls could not fetch (errors, exhausted quota)
+    fall back to GraphQL in batches of up to 100 repos when a token is set. Every request goes
+    through a GitHubRateLimiter, so an exhausted quota delays lookups instead of zeroing them.
+    """
+
+    def __init__(self, token=None, cache_path=None, ttl=24 * 3600, max_workers=8, limiter=None):
+        self.token = token
+        self.limiter = limiter or default_limiter
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if token:
+            self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    def _load_cache(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading GitHub cache {self.cache_path}: {e}. Starting empty.")
+        return {}
+
+    def save(self):
+        """Persists the metadata cache."""
+        if not self.cache_path:
+            return
+        with self._lock:
+            temp_file = self.cache_path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f, indent=4)
+            os.replace(temp_file, self.cache_path)
+
+    def _store(self, repo_path, stars, etag=None):
+        with self._lock:
+            entry = self._cache.setdefault(repo_path.lower(), {})
+            entry.update({"stars": stars, "fetched_at": time.time()})
+            if etag:
+                entry["etag"] = etag
+
+    def _fresh(self, repo_path):
+        entry = self._cache.get(repo_path.lower())
+        return entry is not None and time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def get_stars(self, repo_urls):
+        """
+        Returns {repo_url: stars} for every URL in `repo_urls` (duplicates are fetched once).
+
+        Repositories that cannot be resolved get 0 stars, as with get_github_repo_stars.
+        """
+        paths = {}
+        for url in repo_urls:
+            path = parse_repo_path(url)
+            if path is None:
+                logger.error(f"Invalid GitHub URL format: {url}")
+            paths[url] = path
+        unique = {path.lower(): path for path in paths.values() if path}
+        stale = [path for key, path in unique.items() if not self._fresh(path)]
+        logger.info(f"GitHub metadata: {len(unique)} unique repos, {len(unique) - len(stale)} served from cache.")
+
+        # Conditional REST first: after the first run most repos answer 304, which is free
+        unresolved = self._fetch_rest(stale)
+        if unresolved and self.token:
+            # GraphQL (token only) spends points even for unchanged repos: fallback only
+            logger.info(f"GitHub metadata: {len(unresolved)} repos left to GraphQL.")
+            self._fetch_graphql(unresolved)
+        self.save()
+
+        return {url: self._cache.get(path.lower(), {}).get("stars", 0) if path else 0 for url, path in paths.items()}
+
+    def _fetch_graphql(self, repo_paths):
+        """Fetches stars with GraphQL, 100 repositories per request. Returns the paths it could not resolve."""
+        unresolved = []
+        for start in range(0, len(repo_paths), GRAPHQL_BATCH_SIZE):
+            batch = repo_paths[start:start + GRAPHQL_BATCH_SIZE]
+            fields = []
+            for i, path in enumerate(batch):
+                owner, name = path.split('/', 1)
+                fields.append(f'r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{ stargazerCount }}')
+            query = "query { " + " ".join(fields) + " }"
+            try:
+                response = github_request(self.session, "POST", f"{GITHUB_API}/graphql", self.limiter, resource="graphql", json={"query": query}, timeout=30)
+                response.raise_for_status()
+                data = response.json().get("data") or {}
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"GitHub GraphQL batch failed for {len(batch)} repos: {e}")
+                unresolved.extend(batch)
+                continue
+            for i, path in enumerate(batch):
+                repo = data.get(f"r{i}")
+                if repo is None:
+                    unresolved.append(path)
+                else:
+                    self._store(path, repo.get("stargazerCount", 0))
+        return unresolved
+
+    def _fetch_rest(self, repo_paths):
+        """Fetches stars with concurrent conditional REST requests. Returns the paths it could not fetch."""
+        if not repo_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            fetched = list(executor.map(self._fetch_one, repo_paths))
+        return [path for path, ok in zip(repo_paths, fetched) if not ok]
+
+    def _fetch_one(self, repo_path):
+        """Conditional REST request for one repo; returns True if its stars are now up to date."""
+        headers = {}
+        etag = self._cache.get(repo_path.lower(), {}).get("etag")
+        if etag:
+            headers["If-None-Match"] = etag
+        try:
+            response = github_request(self.session, "GET", f"{GITHUB_API}/repos/{repo_path}", self.limiter, headers=headers, timeout=10)
+            if response.status_code == 304:
+                # Unchanged since the cached copy: free in terms of rate limit
+                self._store(repo_path, self._cache[repo_path.lower()]["stars"])
+                return True
+            response.raise_for_status()
+            self._store(repo_path, response.json().get('stargazers_count', 0), response.headers.get("ETag"))
+            return True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Error fetching GitHub stars for {repo_path}: {e}")
+            return False
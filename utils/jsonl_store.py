@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title_key(title):
+    """Lowercases a title and strips punctuation/extra spaces for lookups."""
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', (title or '').lower())).strip()
+
+
+def default_record_key(record):
+    """Identifies a paper record by arXiv ID, then link, then normalised title."""
+    return record.get('arxiv_id') or record.get('link') or normalize_title_key(record.get('title'))
+
+
+class JSONLRecordStore:
+    """
+    Append-only JSON Lines file of paper records with a small side index.
+
+    Each record is written once as one line; the index (`<path>.idx`) maps record keys and
+    normalised titles to byte offsets so membership tests and lookups never parse the whole file.
+    Appending a record whose key already exists supersedes the older line: lookups and iteration
+    only return the latest one. The index is rewritten every `index_every` appends and on close;
+    lines written after the last index save are re-indexed when the store is reopened.
+    """
+
+    def __init__(self, path, key=default_record_key, index_every=100):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.key = key
+        self.index_every = index_every
+        self._lock = threading.Lock()
+        self._offsets = {}  # key -> byte offset of the latest line
+        self._titles = {}  # normalised title -> key
+        self._indexed_size = 0
+        self._pending = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        self._file = None  # Opened on the first write, so read-only stores need no closing
+
+    # -- index -----------------------------------------------------------------------------------
+    def _load_index(self):
+        if os.path.exists(self.index_path) and os.path.exists(self.path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get("size", 0) <= os.path.getsize(self.path):
+                    self._offsets = index["offsets"]
+                    self._titles = index["titles"]
+                    self._indexed_size = index["size"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Rebuilding index of {self.path}: {e}")
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self._indexed_size:
+            self._scan(self._indexed_size)
+
+    def _scan(self, start):
+        """Indexes every line from byte `start` to the end of the file."""
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if line.endswith(b"\n"):
+                    try:
+                        self._index_record(json.loads(line), offset)
+                    except ValueError:
+                        logger.warning(f"Skipping corrupted line at byte {offset} of {self.path}")
+                else:
+                    # A partially written last line (interrupted run) is dropped
+                    logger.warning(f"Truncating partial line at byte {offset} of {self.path}")
+                    with open(self.path, 'r+b') as truncate:
+                        truncate.truncate(offset)
+                    break
+                offset += len(line)
+        self._indexed_size = offset
+
+    def _index_record(self, record, offset):
+        key = self.key(record)
+        self._offsets[key] = offset
+        title = normalize_title_key(record.get('title'))
+        if title:
+            self._titles[title] = key
+
+    def save_index(self):
+        """Writes the side index atomically."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            temp_file = self.index_path + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"size": self._indexed_size, "offsets": self._offsets, "titles": self._titles}, f)
+            os.replace(temp_file, self.index_path)
+            self._pending = 0
+
+    # -- writing ---------------------------------------------------------------------------------
+    def append(self, record):
+        """Appends one record (datetimes and other objects are stored with str())."""
+        self.extend([record])
+
+    def extend(self, records):
+        """Appends several records in one write."""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            offset = self._file.tell()
+            chunks = []
+            for record in records:
+                line = (json.dumps(record, default=str, ensure_ascii=False) + "\n").encode('utf-8')
+                # Index the record as it will be read back (e.g. datetimes become strings)
+                self._index_record(json.loads(line), offset)
+                chunks.append(line)
+                offset += len(line)
+            self._file.write(b"".join(chunks))
+            self._file.flush()
+            self._indexed_size = offset
+            self._pending += len(chunks)
+            save = self._pending >= self.index_every
+        if save:
+            self.save_index()
+
+    def close(self):
+        if self._file is not None:
+            self.save_index()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- reading ---------------------------------------------------------------------------------
+    def _read_at(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def get(self, key, default=None):
+        offset = self._offsets.get(key)
+        return default if offset is None else self._read_at(offset)
+
+    def get_by_title(self, title, default=None):
+        key = self._titles.get(normalize_title_key(title))
+        return default if key is None else self.get(key, default)
+
+    def __contains__(self, key_or_title):
+        return key_or_title in self._offsets or normalize_title_key(key_or_title) in self._titles
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        """Lazily yields the latest version of every record, in file order."""
+        if self._file is not None:
+            self._file.flush()
+        if not os.path.exists(self.path):
+            return
+        latest = set(self._offsets.values())
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if offset in latest:
+                    yield json.loads(line)
+                offset += len(line)
+
+
+def write_records(path, records):
+    """Writes `records` to a fresh JSON Lines store at `path`, one line per record."""
+    for stale in (path, path + ".idx"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    with JSONLRecordStore(path) as store:
+        store.extend(records)
+    return path
+
+
+def open_records(path):
+    """Returns a lazily iterable JSONLRecordStore for a .jsonl file, or the list of a legacy .json file."""
+    if path.endswith('.jsonl'):
+        return JSONLRecordStore(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_records(path):
+    """Lazily yields the records of a .jsonl store, or of a legacy .json list."""
+    yield from open_records(path)
+
+
+def load_records(path):
+    """Returns the records of a .jsonl store or of a legacy .json list."""
+    return list(iter_records(path))
+
+
+def find_records_file(stem):
+    """Returns `stem`.jsonl or the legacy `stem`.json, whichever exists, else None."""
+    for extension in ('.jsonl', '.json'):
+        if os.path.exists(stem + extension):
+            return stem + extension
+    return None
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+STATE_FILE = "batch_state.json"
+# Batch statuses after which polling stops
+FAILED_STATUSES = {"failed", "expired", "cancelled", "cancelling"}
+# litellm providers with a files + batches API; the others (e.g. ollama) run batches locally
+BATCH_API_PROVIDERS = {"openai", "azure", "vertex_ai", "bedrock"}
+
+
+def custom_id_for(key, messages=None):
+    """
+    Short stable request ID for a record key and its request content (titles are too long and
+    arbitrary for custom_id). The content is part of the ID, so the answer of a batch submitted
+    for another text is never applied to the record.
+    """
+    digest = hashlib.sha1(str(key).encode('utf-8'))
+    if messages is not None:
+        digest.update(json.dumps(messages, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def batch_request(custom_id, model, messages, temperature, extra=None):
+    """One line of an OpenAI-format batch input file."""
+    body = {"model": model, "messages": messages, "temperature": temperature}
+    body.update(extra or {})
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_batch_output(path):
+    """Yields (custom_id, answer text or None) for every line of a batch output file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                response = record.get("response") or {}
+                if response.get("status_code", 200) != 200 or record.get("error"):
+                    raise KeyError("error")
+                answer = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                logger.warning(f"Batch request {record.get('custom_id')} failed: {record.get('error') or record.get('response')}")
+                answer = None
+            yield record.get("custom_id"), answer
+
+
+class LiteLLMBatchProvider:
+    """Provider batch API (OpenAI-compatible: openai, azure, vertex_ai, ...) through litellm's files/batches helpers."""
+
+    name = "litellm"
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def submit(self, input_path):
+        import litellm
+        with open(input_path, 'rb') as f:
+            input_file = litellm.create_file(file=f, purpose="batch", custom_llm_provider=self.provider)
+        batch = litellm.create_batch(
+            completion_window="24h",
+            endpoint=BATCH_ENDPOINT,
+            input_file_id=input_file.id,
+            custom_llm_provider=self.provider,
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        """Returns (status, output reference or None)."""
+        import litellm
+        batch = litellm.retrieve_batch(batch_id=batch_id, custom_llm_provider=self.provider)
+        return batch.status, batch.output_file_id
+
+    def download(self, output_ref, path):
+        import litellm
+        content = litellm.file_content(file_id=output_ref, custom_llm_provider=self.provider)
+        temp_file = path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(content.content)
+        os.replace(temp_file, path)
+
+
+def completion_responder(body):
+    """Answers a batch request with a plain litellm.completion call (no retries, default api_base)."""
+    import litellm
+    response = litellm.completion(**body)
+    return response.choices[0].message.content
+
+
+def client_responder(client):
+    """
+    Responder answering batch requests through an llm_client.LLMClient, so local batches use the
+    client's api_base (e.g. OLLAMA_BASE_URL), retry budget and provider budget like live calls.
+    `client` may also be a function returning the client, to create it on the first request.
+    """
+    def respond(body):
+        llm_client = client() if callable(client) else client
+        body = dict(body)
+        body.pop("model", None)  # The client calls its own model
+        messages = body.pop("messages")
+        return llm_client.complete(messages, body.pop("temperature", 0.7), **body)
+    return respond
+
+
+def stub_responder(body):
+    """Offline responder returning a well-formed canned paper analysis, for testing the batch flow."""
+    user_content = next((m["content"] for m in body["messages"] if m["role"] == "user"), "")
+    return json.dumps({
+        "main_task": "Stub task",
+        "contributions": ["Stub contribution"],
+        "summary": " ".join(user_content.split())[:200],
+    })
+
+
+class LocalBatchProvider:
+    """
+    File-based stand-in for a provider batch API, with the same submit / poll / download protocol.
+
+    Submitted input files are copied into `directory`; polling answers the requests with
+    `responder(body)` and writes an OpenAI-format output file. Answered lines are kept, so a poll
+    interrupted half-way resumes where it stopped.
+    """
+
+    name = "local"
+
+    def __init__(self, directory, responder=completion_responder):
+        self.directory = directory
+        self.responder = responder
+        os.makedirs(directory, exist_ok=True)
+
+    def _batch_dir(self, batch_id):
+        return os.path.join(self.directory, batch_id)
+
+    def submit(self, input_path):
+        batch_id = f"local-{uuid.uuid4().hex[:12]}"
+        os.makedirs(self._batch_dir(batch_id))
+        shutil.copy(input_path, os.path.join(self._batch_dir(batch_id), "input.jsonl"))
+        return batch_id
+
+    def poll(self, batch_id):
+        batch_dir = self._batch_dir(batch_id)
+        output_path = os.path.join(batch_dir, "output.jsonl")
+        done = {custom_id for custom_id, _ in parse_batch_output(output_path)} if os.path.exists(output_path) else set()
+        with open(os.path.join(batch_dir, "input.jsonl"), 'r', encoding='utf-8') as f, open(output_path, 'a', encoding='utf-8') as out:
+            for line in f:
+                request = json.loads(line)
+                if request["custom_id"] in done:
+                    continue
+                try:
+                    result = {"response": {"status_code": 200, "body": {"choices": [{"message": {"role": "assistant", "content": self.responder(request["body"])}}]}}}
+                except Exception as e:
+                    result = {"response": None, "error": {"message": str(e)}}
+                result["custom_id"] = request["custom_id"]
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+        return "completed", output_path
+
+    def download(self, output_ref, path):
+        shutil.copy(output_ref, path)
+
+
+def get_batch_provider(name, work_dir, responder=completion_responder):
+    """
+    'local' (answers each request with `responder`), 'stub' (offline canned answers) or a litellm
+    provider name. Providers without a batch API (see BATCH_API_PROVIDERS) get the local provider.
+    """
+    if name == "stub":
+        return LocalBatchProvider(os.path.join(work_dir, "local_provider"), responder=stub_responder)
+    if name != "local" and name not in BATCH_API_PROVIDERS:
+        logger.warning(f"Provider '{name}' has no batch API; running the batch locally")
+        name = "local"
+    if name == "local":
+        return LocalBatchProvider(os.path.join(work_dir, "local_provider"), responder=responder)
+    return LiteLLMBatchProvider(name)
+
+
+def _load_state(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"batches": []}
+
+
+def _save_state(path, state):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=4)
+    os.replace(temp_file, path)
+
+
+def run_batch(jobs, work_dir, provider, model, temperature=0.2, extra=None, poll_interval=60, max_wait=None):
+    """
+    Sends chat requests through a batch API and returns {key: answer text} for the ones that succeeded.
+
+    `jobs` maps stable record keys (IDs, not list positions) to chat messages; answers are mapped
+    back by a custom_id derived from both the key and the messages. Every submitted batch is recorded in
+    `work_dir/batch_state.json` before polling, so an interrupted run resumes polling the same
+    batches instead of paying for them twice; only keys not covered by a live batch are submitted.
+    Failed or expired batches are dropped from the state and resubmitted on the next run.
+    Returns the answers collected so far if `max_wait` seconds pass before every batch is done.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    state_path = os.path.join(work_dir, STATE_FILE)
+    state = _load_state(state_path)
+    ids = {custom_id_for(key, messages): key for key, messages in jobs.items()}
+
+    covered = {custom_id for batch in state["batches"] for custom_id in batch["custom_ids"]}
+    remaining = [custom_id for custom_id in ids if custom_id not in covered]
+    if remaining:
+        input_path = os.path.join(work_dir, f"input_{len(state['batches'])}.jsonl")
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for custom_id in remaining:
+                f.write(json.dumps(batch_request(custom_id, model, jobs[ids[custom_id]], temperature, extra)) + "\n")
+        batch_id = provider.submit(input_path)
+        state["batches"].append({"batch_id": batch_id, "provider": provider.name, "custom_ids": remaining, "status": "submitted", "submitted_at": time.time()})
+        _save_state(state_path, state)
+        logger.info(f"Submitted batch {batch_id} with {len(remaining)} requests.")
+
+    started = time.time()
+    while True:
+        pending = [batch for batch in state["batches"] if batch["status"] != "collected"]
+        for batch in pending:
+            status, output_ref = provider.poll(batch["batch_id"])
+            if status == "completed" and output_ref:
+                provider.download(output_ref, os.path.join(work_dir, f"{batch['batch_id']}_output.jsonl"))
+                batch["status"] = "collected"
+                logger.info(f"Batch {batch['batch_id']} completed.")
+            elif status in FAILED_STATUSES:
+                logger.error(f"Batch {batch['batch_id']} ended with status '{status}'; its requests will be resubmitted next run.")
+                state["batches"].remove(batch)
+            else:
+                batch["status"] = status
+            _save_state(state_path, state)
+        if all(batch["status"] == "collected" for batch in state["batches"]):
+            break
+        if max_wait is not None and time.time() - started > max_wait:
+            logger.warning(f"Batches still running after {max_wait}s; rerun to resume polling them.")
+            break
+        time.sleep(poll_interval)
+
+    answers = {}
+    for batch in state["batches"]:
+        output_path = os.path.join(work_dir, f"{batch['batch_id']}_output.jsonl")
+        if batch["status"] != "collected" or not os.path.exists(output_path):
+            continue
+        for custom_id, answer in parse_batch_output(output_path):
+            if custom_id in ids and answer:
+                answers[ids[custom_id]] = answer
+    logger.info(f"Batch answers collected for {len(answers)} of {len(jobs)} requests.")
+    return answers
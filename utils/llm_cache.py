@@ -0,0 +1,77 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def default_cache_path():
+    """LLM_CACHE_PATH, else llm_cache.sqlite next to the weekly JSON files, else in the working directory."""
+    if os.getenv("LLM_CACHE_PATH"):
+        return os.getenv("LLM_CACHE_PATH")
+    root_folder = os.getenv("ROOT_FOLDER")
+    if root_folder:
+        return os.path.join(root_folder, os.getenv("JSON_FOLDER", "automation/weekly_arxiv_json"), "llm_cache.sqlite")
+    return "llm_cache.sqlite"
+
+
+def response_key(model, system_prompt, content, temperature):
+    """Content address of an LLM call: SHA-256 of (model, system prompt, user content, temperature)."""
+    payload = json.dumps([model, system_prompt, content, float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent SQLite cache of LLM answers, addressed by the hash of everything that determines them.
+
+    Only successful answers are stored, so a failed call is retried on the next run. `hits` and
+    `misses` count lookups for reporting.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model, system_prompt, content, temperature):
+        """Returns the cached answer, or None."""
+        key = response_key(model, system_prompt, content, temperature)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, system_prompt, content, temperature, response):
+        key = response_key(model, system_prompt, content, temperature)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
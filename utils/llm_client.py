@@ -0,0 +1,188 @@
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+try:
+    from utils.llm_engine import estimate_tokens
+except ImportError:
+    from llm_engine import estimate_tokens # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """An LLM call that failed for good (fatal error or retry budget exhausted)."""
+
+
+class MalformedOutputError(Exception):
+    """Raised by a response parser when the model answer does not have the expected format (retryable)."""
+
+
+# litellm exception names, checked by name so that older litellm versions missing some of them still work
+RETRYABLE_ERRORS = {
+    "RateLimitError", "Timeout", "APIConnectionError", "ServiceUnavailableError",
+    "InternalServerError", "BadGatewayError",
+}
+FATAL_ERRORS = {
+    "AuthenticationError", "PermissionDeniedError", "NotFoundError", "BadRequestError",
+    "ContextWindowExceededError", "ContentPolicyViolationError", "UnsupportedParamsError",
+}
+
+
+def is_retryable(error):
+    """True for transient failures (rate limit, timeout, connection, 5xx, malformed output), False for fatal ones."""
+    if isinstance(error, MalformedOutputError):
+        return True
+    for cls in type(error).__mro__:
+        if cls.__name__ in FATAL_ERRORS:
+            return False
+        if cls.__name__ in RETRYABLE_ERRORS:
+            return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    message = str(error).lower()
+    return any(hint in message for hint in ("rate limit", "timed out", "timeout", "connection", "overloaded"))
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class LLMMetrics:
+    """Thread-safe counters of LLM calls: outcomes, retries per call and error types."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.retries_per_call = Counter()  # number of retries -> number of calls
+        self.errors = Counter()  # exception class name -> occurrences
+        self.backoff_seconds = 0.0
+
+    def record_error(self, error, delay=0.0):
+        with self._lock:
+            self.errors[type(error).__name__] += 1
+            self.backoff_seconds += delay
+
+    def record_call(self, retries, success):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.retries_per_call[retries] += 1
+            if success:
+                self.successes += 1
+            else:
+                self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "retries_per_call": dict(self.retries_per_call),
+                "errors": dict(self.errors),
+                "backoff_seconds": round(self.backoff_seconds, 1),
+            }
+
+    def log_summary(self):
+        stats = self.snapshot()
+        if stats["calls"]:
+            logger.info(
+                f"LLM calls: {stats['calls']} ({stats['failures']} failed), {stats['retries']} retries, "
+                f"retries per call {stats['retries_per_call']}, errors {stats['errors']}, "
+                f"{stats['backoff_seconds']}s in backoff"
+            )
+
+
+class LLMClient:
+    """
+    litellm.completion with a bounded retry budget.
+
+    Transient errors and answers rejected by the `parse` callback (MalformedOutputError) are retried
+    up to `max_retries` times with jittered exponential backoff; fatal errors (authentication, bad
+    request, context too long, ...) fail immediately. A call that does not succeed raises LLMError.
+    When a `budget` (llm_engine.ProviderBudget) is given, every attempt waits for a slot of the
+    provider's concurrency and requests/tokens-per-minute budget.
+    """
+
+    def __init__(self, model, api_base=None, max_retries=3, base_delay=1.0, max_delay=30.0, timeout=120, metrics=None, budget=None):
+        self.model = model
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.metrics = metrics or LLMMetrics()
+        self.budget = budget
+
+    def _request(self, messages, temperature, kwargs):
+        return dict(model=self.model, messages=messages, temperature=temperature, timeout=self.timeout, api_base=self.api_base, **kwargs)
+
+    def _retry_delay(self, error, attempt):
+        """Returns the backoff before the next attempt, or raises LLMError if `error` ends the call."""
+        retryable = is_retryable(error)
+        if not retryable or attempt == self.max_retries:
+            self.metrics.record_error(error)
+            self.metrics.record_call(attempt, success=False)
+            reason = "retry budget exhausted" if retryable else "fatal error"
+            raise LLMError(f"LLM call failed after {attempt + 1} attempt(s), {reason}: {error}") from error
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        self.metrics.record_error(error, delay)
+        logger.warning(f"Retryable LLM error ({type(error).__name__}: {error}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def complete(self, messages, temperature=0.7, parse=None, **kwargs):
+        """
+        Sends `messages` and returns the stripped answer text, or `parse(text)` when a parser is given.
+
+        Raises:
+            LLMError: On a fatal error or once the retry budget is exhausted (the cause is chained).
+        """
+        import litellm # Imported on first call: it takes seconds to load
+        slot = self.budget.slot if self.budget is not None else contextlib.nullcontext
+        tokens = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with slot(tokens):
+                    response = litellm.completion(**self._request(messages, temperature, kwargs))
+                text = (response.choices[0].message.content or "").strip()
+                result = parse(text) if parse else text
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+            self.metrics.record_call(attempt, success=True)
+            return result
+
+    async def acomplete(self, messages, temperature=0.7, parse=None, **kwargs):
+        """Async counterpart of `complete`, built on litellm.acompletion."""
+        import litellm
+        slot = self.budget.aslot if self.budget is not None else _null_aslot
+        tokens = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with slot(tokens):
+                    response = await litellm.acompletion(**self._request(messages, temperature, kwargs))
+                text = (response.choices[0].message.content or "").strip()
+                result = parse(text) if parse else text
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            self.metrics.record_call(attempt, success=True)
+            return result
+
+
+@contextlib.asynccontextmanager
+async def _null_aslot(tokens=0):
+    yield
@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import logging
+import os
+import threading
+import time
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Conservative defaults per provider; override with LLM_CONCURRENCY_<PROVIDER>, LLM_RPM_<PROVIDER>, LLM_TPM_<PROVIDER>
+DEFAULT_LIMITS = {
+    "ollama": {"concurrency": 2, "rpm": None, "tpm": None},  # Local GPU: parallel requests mostly queue up
+    "gemini": {"concurrency": 8, "rpm": 60, "tpm": 1000000},
+    "openai": {"concurrency": 16, "rpm": 500, "tpm": 200000},
+    "anthropic": {"concurrency": 8, "rpm": 50, "tpm": 40000},
+}
+FALLBACK_LIMITS = {"concurrency": 4, "rpm": 60, "tpm": None}
+# How often an asyncio task waiting for a provider slot checks again (seconds)
+SLOT_POLL_INTERVAL = 0.02
+# Completion tokens assumed per request when charging the tokens-per-minute budget
+EXPECTED_OUTPUT_TOKENS = 300
+
+
+def provider_of(model):
+    """Provider name of a litellm model string, e.g. 'ollama/phi4' -> 'ollama', 'gpt-4o' -> 'openai'."""
+    try:
+        import litellm
+        return litellm.get_llm_provider(model)[1]
+    except Exception:
+        return model.split('/', 1)[0] if '/' in model else "openai"
+
+
+def estimate_tokens(messages):
+    """Rough token count of a request (about 4 characters per token), plus the expected completion."""
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + EXPECTED_OUTPUT_TOKENS
+
+
+def _env_limit(name, provider, default):
+    value = os.getenv(f"LLM_{name}_{provider.upper()}")
+    if value is None:
+        return default
+    return int(value) if value.strip() not in ("", "0", "none") else None
+
+
+class ProviderBudget:
+    """
+    Concurrency and quota budget of one LLM provider, shared by every caller of the process.
+
+    At most `concurrency` requests are in flight, and requests / tokens per minute are metered
+    with token buckets. Works from threads (`slot`) and from asyncio tasks (`aslot`): both draw
+    on the same slots and buckets, so the caps hold across threads and event loops.
+    """
+
+    def __init__(self, name, concurrency, rpm=None, tpm=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        # utils.rate_limit pulls in requests: imported here rather than at module import
+        try:
+            from utils.rate_limit import RateLimiter
+        except ImportError:
+            from rate_limit import RateLimiter # type: ignore
+        # Buckets hold ~10 seconds of quota so a full minute is never fired at once
+        self._requests = RateLimiter(rpm, 60.0, burst=max(1, rpm // 6)) if rpm else None
+        self._tokens = RateLimiter(tpm, 60.0, burst=max(1, tpm // 6)) if tpm else None
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+
+    def _reserve(self, tokens):
+        """Charges one request and `tokens` tokens; returns how long to wait before sending."""
+        wait = 0.0
+        if self._requests is not None:
+            wait = self._requests.reserve(1)
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        return wait
+
+    @contextlib.contextmanager
+    def slot(self, tokens=0):
+        """Blocking: holds one of the provider's concurrent slots once the quota allows the request."""
+        with self._semaphore:
+            wait = self._reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens=0):
+        """
+        Async counterpart of `slot`, on the same thread semaphore.
+
+        The semaphore is polled rather than acquired in an executor: a waiting task then holds no
+        thread (the default executor also runs asyncio.to_thread work) and a cancelled one leaves
+        no acquisition behind.
+        """
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+        try:
+            wait = self._reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield
+        finally:
+            self._semaphore.release()
+
+    @property
+    def total_wait(self):
+        """Seconds spent waiting for quota."""
+        return sum(bucket.total_wait for bucket in (self._requests, self._tokens) if bucket is not None)
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_provider_budget(model):
+    """Returns the process-wide ProviderBudget of the provider serving `model`."""
+    provider = provider_of(model)
+    with _budgets_lock:
+        budget = _budgets.get(provider)
+        if budget is None:
+            limits = DEFAULT_LIMITS.get(provider, FALLBACK_LIMITS)
+            budget = ProviderBudget(
+                provider,
+                concurrency=_env_limit("CONCURRENCY", provider, limits["concurrency"]) or 1,
+                rpm=_env_limit("RPM", provider, limits["rpm"]),
+                tpm=_env_limit("TPM", provider, limits["tpm"]),
+            )
+            logger.info(f"LLM budget for {provider}: {budget.concurrency} concurrent, {budget.rpm} RPM, {budget.tpm} TPM")
+            _budgets[provider] = budget
+        return budget
+
+
+async def run_queue(items, handler, workers, on_result=None):
+    """
+    Runs the coroutine `handler(item)` for every item on a continuous work queue.
+
+    `workers` tasks each pull the next item as soon as their previous one is done, so a slow call
+    never holds back the others; the provider budgets decide how many calls actually run at once.
+    `on_result(item, result)` is called as results arrive. Returns the results in input order
+    (None for items whose handler raised).
+    """
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+    results = [None] * len(items)
+
+    async def worker():
+        while True:
+            try:
+                index, item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                results[index] = await handler(item)
+            except Exception as e:
+                logger.error(f"LLM job failed: {e}")
+            if on_result is not None:
+                on_result(item, results[index])
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(items))))))
+    return results
+
+
+def run_llm_jobs(items, handler, workers=None, on_result=None, desc=None):
+    """Synchronous entry point of run_queue, with a tqdm progress bar when `desc` is given."""
+    items = list(items)
+    if not items:
+        return []
+    workers = workers or int(os.getenv("LLM_WORKERS", "32"))
+    progress = tqdm(total=len(items), desc=desc) if desc else None
+
+    def record(item, result):
+        if progress is not None:
+            progress.update(1)
+        if on_result is not None:
+            on_result(item, result)
+
+    try:
+        return asyncio.run(run_queue(items, handler, workers, record))
+    finally:
+        if progress is not None:
+            progress.close()
@@ -1,35 +1,95 @@
+import asyncio
+import io
 import json
 import logging
+import time
 import traceback
 from typing import List, Dict
 from datetime import datetime
 import os
-import matplotlib.pyplot as plt
-import numpy as np
 
-import litellm
+# matplotlib, numpy and litellm are heavy: they are imported on first use, so that importing this
+# module (e.g. from update_clean_news) stays cheap
 from dotenv import load_dotenv, find_dotenv
 from tqdm import tqdm
 
+try:
+    from utils.jsonl_store import default_record_key, open_records
+    from utils.llm_cache import LLMResponseCache, default_cache_path
+    from utils.llm_client import LLMClient, MalformedOutputError
+    from utils.llm_engine import get_provider_budget, provider_of, run_llm_jobs
+    from utils.llm_batch import LocalBatchProvider, client_responder, get_batch_provider, run_batch
+except ImportError:
+    from jsonl_store import default_record_key, open_records # type: ignore
+    from llm_cache import LLMResponseCache, default_cache_path # type: ignore
+    from llm_client import LLMClient, MalformedOutputError # type: ignore
+    from llm_engine import get_provider_budget, provider_of, run_llm_jobs # type: ignore
+    from llm_batch import LocalBatchProvider, client_responder, get_batch_provider, run_batch # type: ignore
 
 
 
-# model = "ollama:qwq:latest"
-load_dotenv(find_dotenv())
-# Adjust model variable loading
-# model = os.getenv("SMALL_SUMMARY_MODEL",'ollama:phi4:latest')
-# Determine model based on env vars. litellm handles various providers.
-# We'll get the specific model string from the .env or .ai.env later.
-llm_model = os.getenv("LITELLM_MODEL", 'ollama/phi4') # Default to ollama/phi4 if not set
 
 # add a logger
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
-def get_llm_response(content, system_prompt, temperature=0.7):
-    """Generic LLM response function using litellm"""
+_llm_model = None
 
-    messages = [
+def get_llm_model():
+    """The litellm model string (LITELLM_MODEL, from the environment or .env), resolved on first use"""
+    global _llm_model
+    if _llm_model is None:
+        # model = "ollama:qwq:latest"
+        load_dotenv(find_dotenv())
+        # Determine model based on env vars. litellm handles various providers.
+        _llm_model = os.getenv("LITELLM_MODEL", 'ollama/phi4') # Default to ollama/phi4 if not set
+    return _llm_model
+
+_llm_client = None
+
+def get_llm_client():
+    """
+    Returns the process-wide LLMClient, created on first use.
+
+    Every LLM call goes through a bounded retry budget and the provider's concurrency / quota
+    budget; get_llm_client().metrics counts retries per call.
+    """
+    global _llm_client
+    if _llm_client is None:
+        llm_model = get_llm_model()
+        _llm_client = LLMClient(
+            llm_model,
+            # Add api_base if needed for local models like Ollama
+            api_base=os.getenv("OLLAMA_BASE_URL") if llm_model.startswith("ollama/") else None,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            budget=get_provider_budget(llm_model),
+        )
+    return _llm_client
+
+# Answers already generated for the same (model, prompts, temperature) are reused across runs.
+# Set LLM_CACHE=0 to always query the model.
+_llm_cache = None
+
+def get_llm_cache():
+    """Returns the process-wide LLM response cache (opened on first use), or None if disabled"""
+    global _llm_cache
+    if _llm_cache is None and os.getenv("LLM_CACHE", "1") != "0":
+        _llm_cache = LLMResponseCache(default_cache_path())
+    return _llm_cache
+
+def cached_response(content, system_prompt, temperature):
+    """Returns the cached answer of a prompt, or None"""
+    cache = get_llm_cache()
+    return cache.get(get_llm_model(), system_prompt, content, temperature) if cache is not None else None
+
+def cache_response(content, system_prompt, temperature, answer):
+    cache = get_llm_cache()
+    if cache is not None:
+        cache.put(get_llm_model(), system_prompt, content, temperature, answer)
+
+def reasoning_messages(content, system_prompt):
+    """Chat messages asking the model to reason briefly before answering after the ####---#### delimiter"""
+    return [
         {"role": "system", "content": system_prompt + 
          """ You always reason before outputting the answer whatever the user asks. 
          You reason step by step with a maximum of 6 words per thought and you give your answer after this delimiter ####---####. 
@@ -37,51 +97,128 @@ def get_llm_response(content, system_prompt, temperature=0.7):
          All outputs must follow the format [reasoning]####---####[answer]"""},
         {"role": "user", "content": content}
     ]
+
+def get_llm_response(content, system_prompt, temperature=0.7):
+    """Generic LLM response function using litellm, served from the response cache when possible"""
+    cached = cached_response(content, system_prompt, temperature)
+    if cached is not None:
+        return cached
     try:
-        # Use litellm.completion instead of client.chat.completions.create
-        response = litellm.completion(
-            model=llm_model, # Use the model defined above
-            messages=messages,
-            temperature=temperature,
-            timeout=120,
-            # Add api_base if needed for local models like Ollama
-            api_base=os.getenv("OLLAMA_BASE_URL") if llm_model.startswith("ollama/") else None 
-        )
-        # Access response content correctly for litellm
-        res = response.choices[0].message.content.strip() 
-        logger.info(f"LLM response: {res}")
-        res_parts = res.split("####---####") # Renamed variable to avoid conflict
-        if len(res_parts) > 1 and res_parts[1].strip() != "":
-            return res_parts[1].strip()
-        else:
-            # Retry logic might need adjustment depending on litellm's error handling
-            # For simplicity, let's just return the raw response if splitting fails
-            logger.warning("LLM response did not contain the expected delimiter. Retrying...")
-            return get_llm_response(content, system_prompt, temperature)
-
-            # return res # Return the full response if delimiter not found after reasoning.
-            # Original retry logic: get_llm_response(content, system_prompt, temperature) 
-        # Return the part after the delimiter
-        # return res # This line seems incorrect, should return res_parts[1]
-    
+        # A missing delimiter counts as a retryable malformed answer, within the client's retry budget
+        answer = get_llm_client().complete(reasoning_messages(content, system_prompt), temperature, parse=split_reasoning_answer)
     except Exception as e:
-        #print the traceback
-        print(f"Error in LLM call with litellm: {e}")
-        print(traceback.format_exc())
-        # Consider more robust error handling if needed
-        # Check if it's an API key error specifically
-        if "API key" in str(e):
-             logger.error("API key error. Please check your environment variables (e.g., OPENAI_API_KEY, ANTHROPIC_API_KEY, etc.)")
-        elif "Connection refused" in str(e) and llm_model.startswith("ollama/"):
-             logger.error(f"Connection error. Is Ollama running and accessible at {os.getenv('OLLAMA_BASE_URL')}?")
-        #add the api error like rate limit error
-        elif "Rate limit" in str(e):
-             logger.error("Rate limit error. Please wait a few seconds and try again.")
+        log_llm_error(e)
         # Reraise or return None based on desired behavior
         return None 
-
-def get_tasks_tags(paper):
-    """Extract the main task from the paper"""
+    cache_response(content, system_prompt, temperature, answer)
+    return answer
+
+async def aget_llm_response(content, system_prompt, temperature=0.7):
+    """Async get_llm_response (litellm.acompletion), for the llm_engine work queue"""
+    cached = cached_response(content, system_prompt, temperature)
+    if cached is not None:
+        return cached
+    try:
+        answer = await get_llm_client().acomplete(reasoning_messages(content, system_prompt), temperature, parse=split_reasoning_answer)
+    except Exception as e:
+        log_llm_error(e)
+        return None
+    cache_response(content, system_prompt, temperature, answer)
+    return answer
+
+def split_reasoning_answer(res):
+    """Returns the part of a [reasoning]####---####[answer] response after the delimiter"""
+    logger.info(f"LLM response: {res}")
+    res_parts = res.split("####---####")
+    if len(res_parts) > 1 and res_parts[1].strip() != "":
+        return res_parts[1].strip()
+    raise MalformedOutputError("LLM response did not contain the expected delimiter")
+
+def log_llm_error(e):
+    """Reports a failed litellm call with a hint for the usual causes"""
+    logger.error(f"Error in LLM call with litellm: {e}")
+    logger.debug(traceback.format_exc())
+    # Check if it's an API key error specifically
+    if "API key" in str(e):
+         logger.error("API key error. Please check your environment variables (e.g., OPENAI_API_KEY, ANTHROPIC_API_KEY, etc.)")
+    elif "Connection refused" in str(e) and get_llm_model().startswith("ollama/"):
+         logger.error(f"Connection error. Is Ollama running and accessible at {os.getenv('OLLAMA_BASE_URL')}?")
+    #add the api error like rate limit error
+    elif "Rate limit" in str(e):
+         logger.error("Rate limit error. Please wait a few seconds and try again.")
+
+def json_response_format(schema, name):
+    """litellm response_format: a strict JSON schema when the model supports it, plain JSON mode otherwise"""
+    try:
+        import litellm
+        if litellm.supports_response_schema(model=get_llm_model()):
+            return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+    except Exception:
+        pass # Unknown models are not in litellm's capability map
+    return {"type": "json_object"}
+
+def parse_json_object(text):
+    """Extracts the JSON object of an LLM answer (tolerating code fences or text around it), or None"""
+    if not text:
+        return None
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def json_request(schema, name):
+    """Extra completion arguments asking for a JSON answer"""
+    # drop_params: providers without structured output still get the request, minus response_format
+    return {"response_format": json_response_format(schema, name), "drop_params": True}
+
+def get_llm_json(content, system_prompt, schema, name, temperature=0.2):
+    """Single LLM call answering with a JSON object following `schema`. Returns the raw answer text, or None"""
+    cached = cached_response(content, system_prompt, temperature)
+    if cached is not None:
+        return cached
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content}
+    ]
+    try:
+        res = get_llm_client().complete(messages, temperature, parse=require_json_object, **json_request(schema, name))
+    except Exception as e:
+        log_llm_error(e)
+        return None
+    # Only well-formed answers reach this point, so a malformed one is asked again next time
+    cache_response(content, system_prompt, temperature, res)
+    return res
+
+async def aget_llm_json(content, system_prompt, schema, name, temperature=0.2):
+    """Async get_llm_json"""
+    cached = cached_response(content, system_prompt, temperature)
+    if cached is not None:
+        return cached
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content}
+    ]
+    try:
+        res = await get_llm_client().acomplete(messages, temperature, parse=require_json_object, **json_request(schema, name))
+    except Exception as e:
+        log_llm_error(e)
+        return None
+    cache_response(content, system_prompt, temperature, res)
+    return res
+
+def require_json_object(res):
+    """Returns `res` if it contains a JSON object, else raises MalformedOutputError so the call is retried"""
+    logger.info(f"LLM JSON response: {res}")
+    if parse_json_object(res) is None:
+        raise MalformedOutputError("LLM response is not a JSON object")
+    return res
+
+def tasks_prompt(paper):
+    """(content, system prompt) extracting the main task from the paper"""
     system_prompt = "You are a helpful assistant that extracts the task from academic papers in computer vision. You will answer only the task in a short sentence or word without anything else."
     content = f"""
         Analyze the research paper and identify the primary task type or research category.
@@ -90,10 +227,10 @@ def get_tasks_tags(paper):
         Format your answer as a single sentence.
         \n\n{paper}
     """
-    return get_llm_response(content, system_prompt)
+    return content, system_prompt
 
-def get_contributions(paper):
-    """Extract the top 3 main contributions from the paper"""
+def contributions_prompt(paper):
+    """(content, system prompt) extracting the top 3 main contributions from the paper"""
     system_prompt = "You are a helpful assistant that extracts key technical contributions from academic papers. List exactly 3 main technical contributions, each starting with a bullet point."
     content = f"""
         Analyze this research paper and identify the 3 most important technical contributions.
@@ -102,10 +239,10 @@ def get_contributions(paper):
         Your answer will contains only the bullet points.
         \n\n{paper}
     """
-    return get_llm_response(content, system_prompt)
+    return content, system_prompt
 
-def get_paper_summary(paper):
-    """Generate a concise summary of the paper"""
+def summary_prompt(paper):
+    """(content, system prompt) generating a concise summary of the paper"""
     system_prompt = "You are a helpful assistant that creates concise summaries of academic papers. Focus only on key innovations and technical aspects."
     content = f"""
         Summarize this research paper in 2-3 short sentences, focusing on:
@@ -114,9 +251,188 @@ def get_paper_summary(paper):
         - The primary results
         \n\n{paper}
     """
-    return get_llm_response(content, system_prompt)
+    return content, system_prompt
+
+def get_tasks_tags(paper):
+    """Extract the main task from the paper"""
+    return get_llm_response(*tasks_prompt(paper))
+
+def get_contributions(paper):
+    """Extract the top 3 main contributions from the paper"""
+    return get_llm_response(*contributions_prompt(paper))
+
+def get_paper_summary(paper):
+    """Generate a concise summary of the paper"""
+    return get_llm_response(*summary_prompt(paper))
+
+ANALYSIS_FIELDS = ("main_task", "contributions", "summary")
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "main_task": {"type": "string"},
+        "contributions": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+    },
+    "required": list(ANALYSIS_FIELDS),
+    "additionalProperties": False,
+}
+
+FIELD_PROMPTS = {"main_task": tasks_prompt, "contributions": contributions_prompt, "summary": summary_prompt}
+
+def analysis_prompt(paper):
+    """(content, system prompt) asking for main task, contributions and summary as one JSON object"""
+    system_prompt = "You are a helpful assistant that analyzes academic papers in computer vision and machine learning. You answer only with a JSON object."
+    content = f"""
+        Analyze this research paper and answer with a JSON object with exactly these keys:
+        - "main_task": the primary task type or research category in a few words (e.g. "Image Classification", "3D Monocular Human pose estimation", "Reinforcement Learning").
+        - "contributions": a list of the 3 most important technical contributions, each a short, specific sentence.
+        - "summary": a summary in 2-3 short sentences covering the main technical innovation, the key methodology and the primary results.
+        \n\n{paper}
+    """
+    return content, system_prompt
+
+def validate_analysis(data):
+    """Keeps the well-formed fields of a combined analysis answer, normalised to the strings the separate prompts return"""
+    analysis = {}
+    if not isinstance(data, dict):
+        return analysis
+    for field in ("main_task", "summary"):
+        value = data.get(field)
+        if isinstance(value, str) and value.strip():
+            analysis[field] = value.strip()
+    contributions = data.get("contributions")
+    if isinstance(contributions, str) and contributions.strip():
+        analysis["contributions"] = contributions.strip()
+    elif isinstance(contributions, list):
+        items = [str(item).strip().lstrip('-*• ').strip() for item in contributions if str(item).strip()]
+        if items:
+            analysis["contributions"] = "\n".join(f"- {item}" for item in items)
+    return analysis
+
+def combined_analysis_enabled():
+    return os.getenv("LLM_ANALYSIS_MODE", "combined") == "combined"
+
+def missing_analysis_fields(analysis):
+    missing = [field for field in ANALYSIS_FIELDS if field not in analysis]
+    if missing:
+        logger.warning(f"Combined analysis is missing {missing}, falling back to separate prompts.")
+    return missing
+
+def get_paper_analysis(paper):
+    """
+    Extracts the main task, the key contributions and a summary of a paper.
+
+    In the default combined mode (LLM_ANALYSIS_MODE=combined) the three fields come from a single
+    JSON answer; any field missing from it or malformed falls back to its dedicated prompt
+    (get_tasks_tags, get_contributions, get_paper_summary). LLM_ANALYSIS_MODE=separate always uses
+    the three prompts.
+
+    Returns:
+        dict: {'main_task', 'contributions', 'summary'}, None for fields that could not be generated.
+    """
+    analysis = {}
+    if combined_analysis_enabled():
+        analysis = validate_analysis(parse_json_object(get_llm_json(*analysis_prompt(paper), ANALYSIS_SCHEMA, "paper_analysis")))
+    for field in missing_analysis_fields(analysis):
+        analysis[field] = get_llm_response(*FIELD_PROMPTS[field](paper))
+    return analysis
+
+async def aget_paper_analysis(paper, analysis=None):
+    """
+    Async get_paper_analysis; the fallback prompts of missing fields run concurrently.
+
+    `analysis` is a (possibly partial) result already obtained for this paper, e.g. from
+    batch_paper_analysis: only its missing fields are generated.
+    """
+    if analysis is not None:
+        analysis = dict(analysis)
+    elif combined_analysis_enabled():
+        analysis = validate_analysis(parse_json_object(await aget_llm_json(*analysis_prompt(paper), ANALYSIS_SCHEMA, "paper_analysis")))
+    else:
+        analysis = {}
+    missing = missing_analysis_fields(analysis)
+    answers = await asyncio.gather(*(aget_llm_response(*FIELD_PROMPTS[field](paper)) for field in missing))
+    analysis.update(zip(missing, answers))
+    return analysis
+
+def batch_paper_analysis(texts, work_dir, provider_name=None, poll_interval=60, max_wait=None):
+    """
+    Runs the combined analysis prompt of many papers through a provider batch API (llm_batch.run_batch).
+
+    Batch jobs are cheaper and not rate limited like live calls, which suits bulk runs where the
+    latency per paper does not matter. The provider is LLM_BATCH_PROVIDER ('local' runs the batch
+    through get_llm_client(), 'stub' answers offline), by default the provider of LITELLM_MODEL;
+    providers without a batch API (e.g. ollama) run the batch locally.
+    Valid answers are also stored in the LLM response cache.
+
+    Args:
+        texts (dict): {paper key: paper text}.
+        work_dir (str): Directory holding the batch input/output files and the resume state.
+
+    Returns:
+        dict: {paper key: validated (possibly partial) analysis} for the papers that got an answer.
+    """
+    llm_model = get_llm_model()
+    provider = get_batch_provider(provider_name or os.getenv("LLM_BATCH_PROVIDER") or provider_of(llm_model), work_dir,
+                                  responder=client_responder(get_llm_client))
+    # Remote batch APIs take the provider's own model name; local batches call litellm with the full one
+    model = llm_model if isinstance(provider, LocalBatchProvider) else llm_model.split('/', 1)[-1]
+    prompts = {key: analysis_prompt(text) for key, text in texts.items()}
+    jobs = {key: [{"role": "system", "content": system_prompt}, {"role": "user", "content": content}] for key, (content, system_prompt) in prompts.items()}
+    answers = run_batch(jobs, work_dir, provider, model, temperature=0.2, extra={"response_format": {"type": "json_object"}}, poll_interval=poll_interval, max_wait=max_wait)
+    analyses = {}
+    for key, answer in answers.items():
+        analyses[key] = validate_analysis(parse_json_object(answer))
+        if len(analyses[key]) == len(ANALYSIS_FIELDS):
+            # Same key as get_llm_json, so live calls for this paper are served from the cache
+            cache_response(*prompts[key], 0.2, answer)
+    return analyses
+
+def stored_analysis(paper, field):
+    """Returns an LLM field already stored in the paper record, or None if absent or failed"""
+    value = paper.get(field)
+    if not value or value == "Analysis failed":
+        return None
+    return value
+
+def has_abstract(abstract):
+    return bool(abstract) and abstract != "No Abstract" and abstract.strip() != ""
+
+def enrich_papers(papers, batch_dir=None):
+    """
+    Returns {paper index: analysis} for every paper with an abstract.
+
+    Fields already stored in the records are reused; the others are generated on the llm_engine
+    work queue, so the number of calls in flight is bounded by the provider budget, not by batches.
+    With `batch_dir`, they first go through the provider batch API (see batch_paper_analysis),
+    keyed by record ID rather than list position, since the batch state outlives the run.
+    """
+    analyses = {}
+    pending = []
+    for index, paper in enumerate(papers):
+        abstract = paper.get('abstract', 'No Abstract')
+        if not has_abstract(abstract):
+            continue
+        # Reuse the analysis stored by find_and_scrap / scrap_cvpr, only ask the LLM when some is missing
+        analyses[index] = {field: stored_analysis(paper, field) for field in ANALYSIS_FIELDS}
+        if not all(analyses[index].values()):
+            # The record key is taken here: record stores are iterable but not indexable
+            pending.append((index, default_record_key(paper), abstract))
+
+    batched = {}
+    if batch_dir and pending:
+        batched = batch_paper_analysis({key: abstract for _, key, abstract in pending}, batch_dir)
+
+    async def generate(job):
+        index, key, abstract = job
+        generated = await aget_paper_analysis(abstract, batched.get(key))
+        analyses[index] = {field: analyses[index][field] or generated[field] for field in ANALYSIS_FIELDS}
+
+    run_llm_jobs(pending, generate, desc="Generating AI summaries")
+    return analyses
 
 def add_ascii_histogram(scores, md_file):
+    import numpy as np
     bins = np.arange(0, 1.1, 0.1)
     hist, _ = np.histogram(scores, bins=bins)
     max_height = 20  # Maximum height
@@ -141,179 +457,251 @@ def add_ascii_histogram(scores, md_file):
     md_file.write(bin_markers + "\n")
     md_file.write("```\n")
 
-def add_scatter_plot(papers, md_file, output_file):
-    positives = [float(p.get('positive_score', 0)) for p in papers]
-    negatives = [float(p.get('negative_score', 0)) for p in papers]
-    scores = [float(p.get('general_score', 0)) for p in papers]
-    
-    plt.figure(figsize=(10, 6))
-    scatter = plt.scatter(negatives, positives, c=scores, cmap='viridis', alpha=0.7)
-    plt.colorbar(scatter, label='General Score')
-    plt.xlabel('Negative Score')
-    plt.ylabel('Positive Score')
-    plt.title('Paper Scores Distribution')
-    
+def add_scatter_plot(md_file, output_file, columns, plot_renderer=None):
+    """
+    Links the score scatter plot (<output>_stats.png) in the markdown.
+
+    The image itself is rendered by utils.plots: handed to `plot_renderer` (a PlotRenderer process
+    pool) when given, rendered in-process otherwise; either way it is skipped if the scores did
+    not change since it was last drawn. `columns` are the digest_columns of the papers.
+    """
+    positives = columns['positive_score']
+    negatives = columns['negative_score']
+    scores = columns['general_score']
+
     # Save the image in the same folder as output_file with similar name + _stats.png
     output_dir = os.path.dirname(output_file)
     output_filename = os.path.splitext(os.path.basename(output_file))[0] + '_stats.png'
     output_image_path = os.path.join(output_dir, output_filename)
-    
-    plt.savefig(output_image_path, format='png', dpi=200, bbox_inches='tight')
-    plt.close()
 
-    
+    if plot_renderer is not None:
+        plot_renderer.submit(negatives, positives, scores, output_image_path)
+    else:
+        try:
+            from utils.plots import render_if_changed
+        except ImportError:
+            from plots import render_if_changed # type: ignore
+        render_if_changed(negatives, positives, scores, output_image_path)
+
     md_file.write(f"\n## Score Scatter Plot\n")
     md_file.write(f"![[{output_filename}]]\n\n")
 
-def list_to_markdown(papers: List[Dict], output_file: str, ai_summary=True):
+def render_paper(paper, analysis=None, date=None):
+    """
+    Formats one paper as a Markdown section. Pure: no I/O and no LLM calls.
+
+    Args:
+        paper (Dict): Paper record.
+        analysis (Dict): Its 'main_task' / 'contributions' / 'summary' from enrich_papers, or None.
+        date (str): Its date as YYYY-MM-DD when already parsed (digest columns); parsed from the record otherwise.
+    """
+    out = []
+    title = paper.get('title', 'No Title')
+    # Handle potential list of authors objects or strings
+    authors_data = paper.get('authors', ['No Authors']) 
+    if authors_data and isinstance(authors_data[0], str):
+         authors = authors_data # Assume list of strings
+    elif authors_data and hasattr(authors_data[0], 'name'): # Check for arxiv.Result.Author objects
+         authors = [str(a) for a in authors_data]
+    else:
+         authors = ['No Authors'] # Default case
+
+    abstract = paper.get('abstract', 'No Abstract')
+    arxiv_link = paper.get('link', '#')
+    repo_link = paper.get('repo', None)
+    # print(abstract)
+    # Format scores consistently
+    negative_score = paper.get('negative_score') 
+    positive_score = paper.get('positive_score')
+    general_score = paper.get('general_score')
+    stars = paper.get('stars', 0)
+    date_str = paper.get('date', '')
+
+    if analysis is not None:
+        task = analysis['main_task']
+        summary = analysis['summary']
+        contributions = analysis['contributions']
+    else:
+        task = None
+        summary = None
+        contributions = None
+
+    # Extract only the date part robustly (already parsed when it comes from the digest columns)
+    if date is None:
+        try:
+             # Handle both datetime objects and string formats
+             if isinstance(date_str, datetime):
+                  date = date_str.strftime("%Y-%m-%d")
+             elif isinstance(date_str, str):
+                  # Attempt parsing common formats
+                  parsed_date = None
+                  for fmt in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d"):
+                       try:
+                            parsed_date = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0]) # Try parsing only date part
+                            break
+                       except ValueError:
+                            continue
+                  date = parsed_date.strftime("%Y-%m-%d") if parsed_date else "Invalid Date Format"
+             else:
+                  date = "Invalid Date Type"
+        except Exception: # Catch broader errors during date processing
+            date = "Invalid Date"
+
+
+
+    #out.append(f"Average stars: {avg_stars:.2f}")
+
+    repo_str=  f"[Repo]({repo_link})\n" if (repo_link and repo_link != "N/A") else "No Repo\n" # Simplified check
+    # Format authors correctly
+    try:
+        authors_abv = [author.split(" ")[-1] + ", " + author.split(" ")[0][0] + "." for author in authors if " " in author]
+        authors_str = ", ".join(authors_abv) if authors_abv else ", ".join(authors) # Fallback if no space
+    except:
+        authors_str = ", ".join(map(str, authors)) # Handle unexpected author format
+
+    out.append(f"# {title}\n")
+    if task is not None:
+        out.append(f"**Task:** {task}\n")
+    if contributions is not None:
+        out.append(f"**Key Contributions:**\n{contributions}\n")
+    out.append(f"**Authors:** {authors_str}\n")
+    out.append(f"**Links:** [arXiv]({arxiv_link}) | " + repo_str)
+    # Format scores or show N/A
+    score_line = "**Score:** N/A"
+    if general_score is not None:
+         score_line = f"**Score:** {float(general_score):.3f} | ⭐ : {stars}" # Using 3 decimal places
+    out.append(f"{score_line}\n")
+
+    score_details = []
+    if positive_score is not None:
+         score_details.append(f"**Score positive:** {float(positive_score):.3f}")
+    if negative_score is not None:
+         score_details.append(f"**Score negative:** {float(negative_score):.3f}")
+    if score_details:
+         out.append(" | ".join(score_details) + "\n")
+
+    out.append(f"**Date:** {date}\n")
+    if summary:
+        out.append(f"**Summary:** {summary}\n")
+    # Use markdown blockquote for abstract
+    out.append(f"**Abstract:** \n> {abstract}\n\n")
+    return "".join(out)
+
+def digest_columns(papers):
+    """
+    Columnar view (NumPy arrays) of the scores, stars and dates of `papers`, built in one pass.
+
+    For a JSONLRecordStore the columns are cached next to the records file (utils.digest_stats),
+    so re-rendering an unchanged digest does not touch the records at all.
+    """
+    try:
+        from utils.digest_stats import build_columns, load_columns
+    except ImportError:
+        from digest_stats import build_columns, load_columns # type: ignore
+    path = getattr(papers, 'path', None)
+    if path and os.path.exists(path):
+        return load_columns(path, papers)
+    return build_columns(papers)
+
+def format_days(days):
+    """YYYY-MM-DD strings of digest day numbers (None where the record had no parsable date)"""
+    try:
+        from utils.digest_stats import MISSING_DAY
+    except ImportError:
+        from digest_stats import MISSING_DAY # type: ignore
+    import numpy as np
+    formatted = np.datetime_as_string(days.astype('datetime64[D]'), unit='D')
+    return [None if day == MISSING_DAY else text for day, text in zip(days.tolist(), formatted.tolist())]
+
+def render_stats(papers, output_file, plot_renderer=None, columns=None):
+    """Formats the header of the digest: counts, recent dates, score averages, histogram and scatter plot"""
+    try:
+        from utils.digest_stats import summarize
+    except ImportError:
+        from digest_stats import summarize # type: ignore
+    if columns is None:
+        columns = digest_columns(papers)
+    stats = summarize(columns)
+    md = io.StringIO()
+    
+    md.write(f"# Stats\n")
+    md.write(f"Number of papers: {stats['n_papers']}\n")
+    str_dates='\n - '.join(stats['recent_dates'])
+    md.write(f"Recent Dates:\n - {str_dates}\n") # Clarified heading
+
+    md.write(f"Average score: {stats['avg_score']:.2f}\n")
+
+    md.write(f"Average negative score: {stats['avg_negative']:.2f}\n")
+    md.write(f"Average positive score: {stats['avg_positive']:.2f}\n")
+
+    add_ascii_histogram(columns['general_score'], md) 
+    add_scatter_plot(md, output_file, columns, plot_renderer)
+
+    md.write(f"Total stars: {stats['total_stars']}\n\n")
+    return md.getvalue()
+
+def list_to_markdown(papers: List[Dict], output_file: str, ai_summary=True, batch_dir=None, plot_renderer=None):
     """
     Converts a list of paper dictionaries to a Markdown file with detailed information.
 
     Each paper includes its title, abstract, links to arXiv and GitHub repository,
     score, date, and the number of GitHub stars.
 
+    Runs in two stages: a concurrent enrichment stage (enrich_papers) that fills task, summary and
+    contributions for every paper, then a pure formatting stage that renders the whole document in
+    memory and writes it in one pass. The time spent in each stage is logged.
+
     Args:
         papers (List[Dict]): List of papers with keys like 'title', 'abstract', 'link', 
-                             'repo', 'score', 'stars', and 'date'.
+                             'repo', 'score', 'stars', and 'date'. A JSONLRecordStore is also
+                             accepted and streamed from disk.
         output_file (str): Path to the output Markdown file.
         ai_summary (bool): Whether to generate AI summaries for papers. Defaults to True.
+        batch_dir (str): When set, missing AI summaries are generated through the provider batch
+                         API, with its files and resume state kept in this directory.
+        plot_renderer (PlotRenderer): Stage rendering the stats plot in the background; by default
+                         the plot is rendered in-process before returning.
     """
-    with open(output_file, 'w', encoding='utf-8') as md:
-        n_papers = len(papers)
-        if n_papers == 0:
-             md.write("# No papers found for this query.\n")
-             return
-
-        dates = [paper.get('date', '').split()[0] for paper in papers if paper.get('date')] # Extract only the day part
-        unique_dates = sorted(list(set(dates)), reverse=True) # Sort dates reverse chronologically
-        subset_dates = unique_dates[:min(5,len(unique_dates))]  # Example: limit to the first 5 unique dates
-        
-        # Ensure scores are floats before calculation
-        general_scores = [float(p.get('general_score', 0)) for p in papers]
-        negative_scores = [float(p.get('negative_score', 0)) for p in papers]
-        positive_scores = [float(p.get('positive_score', 0)) for p in papers]
-        
-        avg_score = sum(general_scores) / n_papers
-        avg_negative = sum(negative_scores) / n_papers
-        avg_positive = sum(positive_scores) / n_papers
-        
-        total_stars = sum(int(paper.get('stars', 0)) for paper in papers)
-        # Avoid division by zero if no papers have stars info
-        papers_with_stars = [p for p in papers if 'stars' in p] 
-        
-        md.write(f"# Stats\n")
-        md.write(f"Number of papers: {n_papers}\n")
-        str_dates='\n - '.join(subset_dates)
-        md.write(f"Recent Dates:\n - {str_dates}\n") # Clarified heading
-
-        md.write(f"Average score: {avg_score:.2f}\n")
-
-        md.write(f"Average negative score: {avg_negative:.2f}\n")
-        md.write(f"Average positive score: {avg_positive:.2f}\n")
-
-        # Use general_scores directly
-        add_ascii_histogram(general_scores, md) 
-        add_scatter_plot(papers, md,output_file)
-        # Removed redundant client instantiation
-        # client_llm = ai.Client()
-
-        md.write(f"Total stars: {total_stars}\n\n")
-
-        for paper in tqdm(papers, desc="Processing papers"):
-            title = paper.get('title', 'No Title')
-            # Handle potential list of authors objects or strings
-            authors_data = paper.get('authors', ['No Authors']) 
-            if authors_data and isinstance(authors_data[0], str):
-                 authors = authors_data # Assume list of strings
-            elif authors_data and hasattr(authors_data[0], 'name'): # Check for arxiv.Result.Author objects
-                 authors = [str(a) for a in authors_data]
-            else:
-                 authors = ['No Authors'] # Default case
-
-            abstract = paper.get('abstract', 'No Abstract')
-            arxiv_link = paper.get('link', '#')
-            repo_link = paper.get('repo', None)
-            # print(abstract)
-            # Format scores consistently
-            negative_score = paper.get('negative_score') 
-            positive_score = paper.get('positive_score')
-            general_score = paper.get('general_score')
-            stars = paper.get('stars', 0)
-            date_str = paper.get('date', '')
-
-            if ai_summary and abstract and abstract != "No Abstract" and abstract.strip() != "": # Check if abstract is not empty
-                try: # Add error handling for LLM calls
-                    task = get_tasks_tags(abstract)
-                    summary = get_paper_summary(abstract)
-                    contributions = get_contributions(abstract)
-                except Exception as e:
-                     logger.error(f"Failed to generate AI summary for '{title}': {e}")
-                     task = "Error generating task"
-                     summary = "Error generating summary"
-                     contributions = "Error generating contributions"
-            else:
-                task = None
-                summary = None
-                contributions = None
-
-            # Extract only the date part robustly
-            try:
-                 # Handle both datetime objects and string formats
-                 if isinstance(date_str, datetime):
-                      date = date_str.strftime("%Y-%m-%d")
-                 elif isinstance(date_str, str):
-                      # Attempt parsing common formats
-                      parsed_date = None
-                      for fmt in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d"):
-                           try:
-                                parsed_date = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0]) # Try parsing only date part
-                                break
-                           except ValueError:
-                                continue
-                      date = parsed_date.strftime("%Y-%m-%d") if parsed_date else "Invalid Date Format"
-                 else:
-                      date = "Invalid Date Type"
-            except Exception: # Catch broader errors during date processing
-                date = "Invalid Date"
-            
-
-            
-            #md.write(f"Average stars: {avg_stars:.2f}")
-
-            repo_str=  f"[Repo]({repo_link})\n" if (repo_link and repo_link != "N/A") else "No Repo\n" # Simplified check
-            # Format authors correctly
-            try:
-                authors_abv = [author.split(" ")[-1] + ", " + author.split(" ")[0][0] + "." for author in authors if " " in author]
-                authors_str = ", ".join(authors_abv) if authors_abv else ", ".join(authors) # Fallback if no space
-            except:
-                authors_str = ", ".join(map(str, authors)) # Handle unexpected author format
-
-            md.write(f"# {title}\n")
-            if task is not None:
-                md.write(f"**Task:** {task}\n")
-            if contributions is not None:
-                md.write(f"**Key Contributions:**\n{contributions}\n")
-            md.write(f"**Authors:** {authors_str}\n")
-            md.write(f"**Links:** [arXiv]({arxiv_link}) | " + repo_str)
-            # Format scores or show N/A
-            score_line = "**Score:** N/A"
-            if general_score is not None:
-                 score_line = f"**Score:** {float(general_score):.3f} | ⭐ : {stars}" # Using 3 decimal places
-            md.write(f"{score_line}\n")
-            
-            score_details = []
-            if positive_score is not None:
-                 score_details.append(f"**Score positive:** {float(positive_score):.3f}")
-            if negative_score is not None:
-                 score_details.append(f"**Score negative:** {float(negative_score):.3f}")
-            if score_details:
-                 md.write(" | ".join(score_details) + "\n")
-
-            md.write(f"**Date:** {date}\n")
-            if summary:
-                md.write(f"**Summary:** {summary}\n")
-            # Use markdown blockquote for abstract
-            md.write(f"**Abstract:** \n> {abstract}\n\n") 
+    if not hasattr(papers, '__len__'):
+        papers = list(papers) # Single-pass iterables are read several times below
+    if len(papers) == 0:
+        with open(output_file, 'w', encoding='utf-8') as md:
+            md.write("# No papers found for this query.\n")
+        return
+
+    timings = {}
+    start = time.perf_counter()
+    # Stage 1: LLM enrichment, concurrent and independent of the output file
+    analyses = enrich_papers(papers, batch_dir) if ai_summary else {}
+    timings["enrich"] = time.perf_counter() - start
+
+    # Stage 2: pure formatting into memory
+    start = time.perf_counter()
+    columns = digest_columns(papers) # Scores, stars and dates normalised once, read by header and papers
+    parts = [render_stats(papers, output_file, plot_renderer, columns)]
+    timings["stats"] = time.perf_counter() - start
+    start = time.perf_counter()
+    dates = format_days(columns['day'])
+    for index, paper in enumerate(tqdm(papers, desc="Rendering papers")):
+        parts.append(render_paper(paper, analyses.get(index), dates[index]))
+    timings["render"] = time.perf_counter() - start
+
+    # Stage 3: one buffered write, atomically replacing any previous version
+    start = time.perf_counter()
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as md:
+        md.write("".join(parts))
+    os.replace(temp_file, output_file)
+    timings["write"] = time.perf_counter() - start
+
+    logger.info("list_to_markdown timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()) + f" ({len(papers)} papers)")
+    if ai_summary:
+        cache = get_llm_cache()
+        if cache is not None:
+            logger.info(f"LLM cache: {cache.hits} hits, {cache.misses} misses")
+    # Only report on a client that made calls: creating one here would import litellm for nothing
+    if _llm_client is not None:
+        _llm_client.metrics.log_summary()
 
 if __name__ == "__main__":
     load_dotenv(find_dotenv())
@@ -328,6 +716,15 @@ if __name__ == "__main__":
     # get the folders only inside input_folder
     folders = [f for f in os.listdir(input_folder) if os.path.isdir(os.path.join(input_folder, f))]
 
+    # Stats plots of every regenerated file are drawn by a process pool while the markdown is written
+    try:
+        from utils.plots import PlotRenderer
+        from utils.watermark import STATE_FILES
+    except ImportError:
+        from plots import PlotRenderer # type: ignore
+        from watermark import STATE_FILES # type: ignore
+    plot_renderer = PlotRenderer()
+
     for folder in folders:
         input_folder_path = os.path.join(input_folder, folder)
         output_folder_path = os.path.join(output_folder, folder)
@@ -336,24 +733,25 @@ if __name__ == "__main__":
             os.makedirs(output_folder_path)
 
         input_files = os.listdir(input_folder_path)
-        ##remove the one finishing by _config.json
-        input_files = [f for f in input_files if not f.endswith('_config.json')]
+        ##remove the one finishing by _config.json and the incremental-run state (watermark, rolling store)
+        input_files = [f for f in input_files if not f.endswith('_config.json') and f not in STATE_FILES]
 
         output_files = os.listdir(output_folder_path)
         print(output_files)
 
         for input_file in input_files:
-            if input_file.endswith('.json'):
+            if input_file.endswith('.json') or input_file.endswith('.jsonl'):
                 json_file_path = os.path.join(input_folder_path, input_file)
-                output_file_name = f"{input_file.replace('.json', '.md')}"
+                output_file_name = f"{os.path.splitext(input_file)[0]}.md"
                 output_file_path = os.path.join(output_folder_path, output_file_name)
 
                 if output_file_name not in output_files:
-                    with open(json_file_path, 'r', encoding='utf-8') as f:
-                        papers = json.load(f)
-                    list_to_markdown(papers, output_file_path)
+                    papers = open_records(json_file_path) # Streams .jsonl records lazily
+                    list_to_markdown(papers, output_file_path, plot_renderer=plot_renderer)
                     print(f"Processed {input_file} into {output_file_name}")
                 else:
                     print(f"Skipping {input_file} as {output_file_name} already exists")
             else:
                 print(f"Skipping {input_file} as it's not a JSON file")
+
+    plot_renderer.close()
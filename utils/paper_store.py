@@ -0,0 +1,176 @@
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    arxiv_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated TEXT NOT NULL,
+    primary_category TEXT,
+    title TEXT,
+    data TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (arxiv_id, version)
+);
+CREATE INDEX IF NOT EXISTS papers_updated ON papers (updated);
+CREATE TABLE IF NOT EXISTS query_papers (
+    query_key TEXT NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    PRIMARY KEY (query_key, arxiv_id)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    query_key TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+"""
+
+
+def split_arxiv_id(entry_id):
+    """Splits an arXiv entry id or URL into (id, version), e.g. '.../abs/2401.01234v2' -> ('2401.01234', 2)."""
+    # Old-style ids keep their archive prefix (e.g. 'cs/0112017v1' -> 'cs/0112017')
+    arxiv_id = entry_id.rstrip('/').split('abs/')[-1]
+    match = re.match(r'^(.*?)v(\d+)$', arxiv_id)
+    if match:
+        return match.group(1), int(match.group(2))
+    return arxiv_id, 1
+
+
+def to_utc_iso(date):
+    """Formats a datetime as a sortable UTC ISO string (naive datetimes are assumed to be UTC)."""
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.astimezone(datetime.timezone.utc).isoformat()
+
+
+class PaperStore:
+    """
+    Local SQLite store of every arXiv paper ever fetched, keyed by arXiv ID and version.
+
+    Besides the papers themselves, the store remembers which papers each harvest key returned
+    and which date windows of that key were already harvested, so a later run only needs to
+    ask the API for the part of its window that is not covered yet. Date-sorted query blocks
+    are harvested per category (arxiv_query.category_key), so blocks searching the same category
+    share its papers and coverage.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._harvest_locks = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_papers(self, papers, query_key=None):
+        """
+        Inserts or refreshes papers (dicts as built by scrapt_arxiv) and links them to `query_key`.
+
+        Each paper needs a 'link' (arXiv entry id) and a datetime 'date' (last update).
+        """
+        now = to_utc_iso(datetime.datetime.now(datetime.timezone.utc))
+        rows = []
+        links = []
+        for paper in papers:
+            arxiv_id, version = split_arxiv_id(paper['link'])
+            data = dict(paper)
+            data['date'] = to_utc_iso(paper['date'])
+            rows.append((arxiv_id, version, data['date'], paper.get('primary_category'), paper.get('title'), json.dumps(data, default=str), now))
+            if query_key is not None:
+                links.append((query_key, arxiv_id))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR IGNORE INTO query_papers VALUES (?, ?)", links)
+            self._conn.commit()
+
+    def get_papers(self, query_key, start, end):
+        """Returns the latest version of each paper linked to `query_key` updated within [start, end]."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT p.data FROM papers p
+                JOIN query_papers q ON q.arxiv_id = p.arxiv_id
+                WHERE q.query_key = ?
+                  AND p.version = (SELECT MAX(version) FROM papers WHERE arxiv_id = p.arxiv_id)
+                  AND p.updated >= ? AND p.updated <= ?
+                ORDER BY p.updated DESC
+                """,
+                (query_key, to_utc_iso(start), to_utc_iso(end)),
+            ).fetchall()
+        papers = []
+        for (data,) in rows:
+            paper = json.loads(data)
+            paper['date'] = datetime.datetime.fromisoformat(paper['date'])
+            papers.append(paper)
+        return papers
+
+    def iter_papers(self, category=None):
+        """Yields the latest version of every stored paper, optionally restricted to a primary category."""
+        query = "SELECT data FROM papers p WHERE p.version = (SELECT MAX(version) FROM papers WHERE arxiv_id = p.arxiv_id)"
+        params = ()
+        if category:
+            query += " AND p.primary_category = ?"
+            params = (category,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for (data,) in rows:
+            paper = json.loads(data)
+            paper['date'] = datetime.datetime.fromisoformat(paper['date'])
+            yield paper
+
+    def harvest_lock(self, query_key):
+        """Lock serialising the harvests of `query_key`, so concurrent query blocks fetch each gap once."""
+        with self._lock:
+            return self._harvest_locks.setdefault(query_key, threading.Lock())
+
+    def add_coverage(self, query_key, start, end):
+        """Records that every paper of `query_key` updated within [start, end] has been fetched."""
+        if start >= end:
+            return
+        with self._lock:
+            intervals = self._load_coverage(query_key)
+            intervals.append((to_utc_iso(start), to_utc_iso(end)))
+            merged = []
+            for interval_start, interval_end in sorted(intervals):
+                if merged and interval_start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], interval_end))
+                else:
+                    merged.append((interval_start, interval_end))
+            self._conn.execute("DELETE FROM coverage WHERE query_key = ?", (query_key,))
+            self._conn.executemany("INSERT INTO coverage VALUES (?, ?, ?)", [(query_key, s, e) for s, e in merged])
+            self._conn.commit()
+
+    def _load_coverage(self, query_key):
+        return [tuple(row) for row in self._conn.execute("SELECT start, end FROM coverage WHERE query_key = ?", (query_key,))]
+
+    def missing_ranges(self, query_key, start, end):
+        """Returns the sub-windows of [start, end] that have not been harvested yet for `query_key`."""
+        with self._lock:
+            intervals = sorted(self._load_coverage(query_key))
+        gaps = []
+        cursor = start
+        for interval_start, interval_end in intervals:
+            interval_start = datetime.datetime.fromisoformat(interval_start)
+            interval_end = datetime.datetime.fromisoformat(interval_end)
+            if interval_end <= cursor:
+                continue
+            if interval_start >= end:
+                break
+            if interval_start > cursor:
+                gaps.append((cursor, interval_start))
+            cursor = max(cursor, interval_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
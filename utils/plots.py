@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import threading
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the look of the plot changes, so existing images are re-rendered
+SCATTER_STYLE_VERSION = "1"
+
+# One figure per process, cleared and reused for every plot it renders
+_figure = None
+
+
+def scores_digest(negatives, positives, scores):
+    """Fingerprint of the data behind a scatter plot."""
+    digest = hashlib.sha256(SCATTER_STYLE_VERSION.encode())
+    for values in (negatives, positives, scores):
+        digest.update(np.asarray(values, dtype=np.float64).tobytes())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+def default_digest_path():
+    """PLOT_CACHE_PATH, else plot_digests.json next to the weekly JSON files, else in the working directory."""
+    if os.getenv("PLOT_CACHE_PATH"):
+        return os.getenv("PLOT_CACHE_PATH")
+    root_folder = os.getenv("ROOT_FOLDER")
+    if root_folder:
+        return os.path.join(root_folder, os.getenv("JSON_FOLDER", "automation/weekly_arxiv_json"), "plot_digests.json")
+    return "plot_digests.json"
+
+
+class PlotDigests:
+    """
+    Digests of the data each rendered plot was drawn from ({absolute image path: digest}).
+
+    Kept in one JSON file outside the markdown folder, so the folder only holds the images.
+    Only the parent process reads and writes it; worker processes just draw.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._digests = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable plot digests {path}: {e}")
+
+    def is_up_to_date(self, image_path, digest):
+        """True if `image_path` exists and was rendered from data with this digest."""
+        with self._lock:
+            recorded = self._digests.get(os.path.abspath(image_path))
+        return recorded == digest and os.path.exists(image_path)
+
+    def record(self, image_path, digest):
+        with self._lock:
+            self._digests[os.path.abspath(image_path)] = digest
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._digests, f)
+            os.replace(temp_file, self.path)
+            self._dirty = False
+
+
+_plot_digests = None
+
+
+def get_plot_digests():
+    """Returns the process-wide plot digests (loaded on first use)."""
+    global _plot_digests
+    if _plot_digests is None:
+        _plot_digests = PlotDigests(default_digest_path())
+    return _plot_digests
+
+
+def _get_figure():
+    global _figure
+    if _figure is None:
+        # Agg canvas on a bare Figure: no pyplot state and no GUI backend lookup
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        _figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(_figure)
+    _figure.clf()
+    return _figure
+
+
+def render_scatter_plot(negatives, positives, scores, image_path):
+    """Renders the positive/negative score scatter plot of a digest to a PNG."""
+    figure = _get_figure()
+    ax = figure.add_subplot()
+    scatter = ax.scatter(negatives, positives, c=scores, cmap='viridis', alpha=0.7)
+    figure.colorbar(scatter, ax=ax, label='General Score')
+    ax.set_xlabel('Negative Score')
+    ax.set_ylabel('Positive Score')
+    ax.set_title('Paper Scores Distribution')
+    temp_file = image_path + ".tmp"
+    figure.savefig(temp_file, format='png', dpi=200, bbox_inches='tight')
+    os.replace(temp_file, image_path)
+
+
+def render_if_changed(negatives, positives, scores, image_path, digests=None):
+    """
+    Renders the scatter plot in-process, unless the image on disk was already rendered from the
+    same scores. Returns True if the image was (re)rendered.
+    """
+    digests = digests or get_plot_digests()
+    digest = scores_digest(negatives, positives, scores)
+    if digests.is_up_to_date(image_path, digest):
+        return False
+    render_scatter_plot(negatives, positives, scores, image_path)
+    digests.record(image_path, digest)
+    digests.save()
+    return True
+
+
+class PlotRenderer:
+    """
+    Stage rendering the stats plots of many markdown files in a pool of worker processes.
+
+    `submit` returns immediately, so markdown generation does not wait for matplotlib; plots
+    whose scores did not change since the last rendering are skipped before reaching the pool.
+    Call `close` (or use as a context manager) to wait for the pending plots.
+    """
+
+    def __init__(self, max_workers=None, digests=None):
+        self.max_workers = max_workers
+        self.digests = digests or get_plot_digests()
+        self._executor = None
+        self._futures = []
+        self.skipped = 0
+
+    def submit(self, negatives, positives, scores, image_path):
+        digest = scores_digest(negatives, positives, scores)
+        if self.digests.is_up_to_date(image_path, digest):
+            self.skipped += 1
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._futures.append((image_path, digest, self._executor.submit(render_scatter_plot, list(negatives), list(positives), list(scores), image_path)))
+
+    def close(self):
+        rendered = 0
+        for image_path, digest, future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to render {image_path}: {e}")
+                continue
+            self.digests.record(image_path, digest)
+            rendered += 1
+        self._futures = []
+        self.digests.save()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        logger.info(f"Plots: {rendered} rendered, {self.skipped} unchanged.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: at most `rate` acquisitions every `per` seconds, with bursts of up
+    to `burst` tokens. `RateLimiter(1, 3)` gives arXiv's 1 request per 3 seconds.
+    """
+
+    def __init__(self, rate=1, per=3.0, burst=1):
+        self.rate = rate
+        self.per = per
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0  # Seconds spent waiting, for reporting
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate / self.per)
+        self._last = now
+
+    def reserve(self, tokens=1):
+        """Takes `tokens` from the bucket and returns how long the caller must wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            # Tokens go negative: later callers queue up behind this one
+            wait = -self._tokens * self.per / self.rate
+            self.total_wait += wait
+            return wait
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session (pooled keep-alive connections) whose requests all go through a shared RateLimiter."""
+
+    def __init__(self, limiter, pool_maxsize=10):
+        super().__init__()
+        self.limiter = limiter
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.acquire()
+        return super().request(method, url, *args, **kwargs)
@@ -0,0 +1,139 @@
+import logging
+
+import numpy as np
+
+try:
+    from utils.embeddings import get_embedding_model
+    from utils.embedding_cache import encode_with_cache, get_arxiv_id
+except ImportError:
+    from embeddings import get_embedding_model # type: ignore
+    from embedding_cache import encode_with_cache, get_arxiv_id # type: ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALLBACK_MODEL = "all-MiniLM-L6-v2"
+
+
+def load_embedding_model(embedding_model_name):
+    """
+    Loads the embedding model from the shared registry, falling back to a small default model.
+
+    Returns:
+        tuple: (model, name of the model actually loaded), or (None, None) if nothing could be loaded.
+    """
+    try:
+        return get_embedding_model(embedding_model_name, trust_remote_code=True), embedding_model_name
+    except Exception as e:
+        logger.error(f"Error loading sentence transformer model '{embedding_model_name}': {e}. Using default.")
+    try:
+        return get_embedding_model(DEFAULT_FALLBACK_MODEL, trust_remote_code=False), DEFAULT_FALLBACK_MODEL
+    except Exception as fallback_e:
+        logger.error(f"Error loading default sentence transformer model: {fallback_e}")
+        return None, None
+
+
+def paper_text(paper):
+    """Returns the title + abstract text embedded for a paper."""
+    abstract = paper.get('abstract', '')
+    if not isinstance(abstract, str):
+        abstract = str(abstract)
+    return paper.get('title', '') + " " + abstract
+
+
+def normalize_rows(matrix):
+    """L2-normalises each row so that a dot product gives the cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def score_papers(papers, queries, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1", embedding_cache=None):
+    """
+    Scores every paper against every query with a single matrix product.
+
+    Each distinct paper text is embedded once (through `embedding_cache` when given) and all the
+    queries are stacked into one matrix, so scoring N papers against Q queries is one (N, d) x (d, Q)
+    product instead of Q separate similarity passes.
+
+    Args:
+        papers (list): Paper dicts with 'title' and 'abstract'. May contain duplicates, e.g. the
+                       concatenation of several query blocks sharing papers.
+        queries (list): Query strings (filter and negative queries alike).
+        embedding_model_name (str): Name of the sentence-transformer model.
+        embedding_cache (EmbeddingCache): Optional persistent embedding cache.
+
+    Returns:
+        np.ndarray: Cosine similarities of shape (len(papers), len(queries)), or None if no model
+                    could be loaded.
+    """
+    if not papers or not queries:
+        return np.zeros((len(papers), len(queries)), dtype=np.float32)
+
+    model, model_name = load_embedding_model(embedding_model_name)
+    if model is None:
+        return None
+    logger.info(f"Using embedding model: {model_name}")
+    # The cache namespace must match the model actually used (the fallback may have kicked in)
+    if embedding_cache is not None and embedding_cache.model_name != model_name:
+        embedding_cache = None
+
+    # Embed each distinct text once
+    row_of_text = {}
+    unique_texts = []
+    unique_ids = []
+    paper_rows = np.empty(len(papers), dtype=np.int64)
+    for i, paper in enumerate(papers):
+        text = paper_text(paper)
+        if text not in row_of_text:
+            row_of_text[text] = len(unique_texts)
+            unique_texts.append(text)
+            unique_ids.append(get_arxiv_id(paper))
+        paper_rows[i] = row_of_text[text]
+    logger.info(f"Scoring {len(papers)} papers ({len(unique_texts)} distinct) against {len(queries)} queries.")
+
+    paper_embeddings = normalize_rows(encode_with_cache(model, unique_texts, ids=unique_ids, cache=embedding_cache))
+    query_embeddings = normalize_rows(np.asarray(model.encode(list(queries)), dtype=np.float32))
+
+    similarities = paper_embeddings @ query_embeddings.T
+    return similarities[paper_rows]
+
+
+def score_query_blocks(papers_by_block, query_pairs, embedding_model_name="mixedbread-ai/mxbai-embed-large-v1", embedding_cache=None):
+    """
+    Scores several query blocks at once: the union of their papers is embedded once and every
+    (filter_query, negative_query) pair is stacked into one query matrix.
+
+    Args:
+        papers_by_block (dict): Maps block ID to its list of papers.
+        query_pairs (dict): Maps block ID to a (filter_query, negative_query) tuple.
+
+    Returns:
+        dict: Maps block ID to a (len(papers), 2) array of [positive, negative] similarities,
+              or None if no model could be loaded.
+    """
+    block_ids = [block_id for block_id in papers_by_block if block_id in query_pairs]
+    all_papers = []
+    offsets = {}
+    for block_id in block_ids:
+        offsets[block_id] = (len(all_papers), len(all_papers) + len(papers_by_block[block_id]))
+        all_papers.extend(papers_by_block[block_id])
+
+    # Stack filter and negative queries, deduplicated across blocks
+    column_of_query = {}
+    queries = []
+    for block_id in block_ids:
+        for query in query_pairs[block_id]:
+            if query not in column_of_query:
+                column_of_query[query] = len(queries)
+                queries.append(query)
+
+    similarities = score_papers(all_papers, queries, embedding_model_name, embedding_cache)
+    if similarities is None:
+        return None
+
+    scores = {}
+    for block_id in block_ids:
+        start, end = offsets[block_id]
+        columns = [column_of_query[query] for query in query_pairs[block_id]]
+        scores[block_id] = similarities[start:end][:, columns]
+    return scores
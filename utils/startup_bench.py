@@ -0,0 +1,108 @@
+"""
+Cold-start benchmark of the command-line entry points, based on `python -X importtime`.
+
+Each entry point is imported in a fresh interpreter (its `__main__` block does not run) and the
+import tree reported by -X importtime is summarised: total import time, wall time and the
+slowest direct dependencies. Results can be appended to a JSONL history to track regressions.
+
+    python -m utils.startup_bench --runs 3 --history startup_history.jsonl
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ["scrapt_arxiv", "find_and_scrap", "scrap_cvpr", "update_clean_news", "utils.md_format"]
+
+
+def parse_importtime(stderr):
+    """Returns [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure(module):
+    """Imports `module` in a fresh interpreter; returns wall seconds and the parsed import tree."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        raise RuntimeError(f"import {module} failed: {error}")
+    return wall, parse_importtime(result.stderr)
+
+
+def direct_imports(entries, module):
+    """Cumulative import time of `module` and the entries of its direct dependencies."""
+    # -X importtime lists children before their parent: the module's subtree precedes its own line
+    index = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[3] == 0)
+    children = []
+    for entry in reversed(entries[:index]):
+        if entry[3] == 0:
+            break
+        if entry[3] == 1:
+            children.append(entry)
+    return entries[index][2], children
+
+
+def benchmark(module, runs=3, top=5):
+    """Best of `runs` cold starts of `module`, with its slowest direct imports."""
+    best = None
+    for _ in range(runs):
+        wall, entries = measure(module)
+        if best is None or wall < best[0]:
+            best = (wall, entries)
+    wall, entries = best
+    cumulative, children = direct_imports(entries, module)
+    slowest = sorted(children, key=lambda entry: entry[2], reverse=True)[:top]
+    return {
+        "module": module,
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(cumulative / 1000, 1),
+        "slowest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)} for name, _, cumulative, _ in slowest],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import (cold-start) time of the CLI entry points.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Modules to import (default: every entry point).")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per module; the fastest one is kept.")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest direct imports to report.")
+    parser.add_argument("--history", type=str, default=None, help="JSONL file the results are appended to.")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        try:
+            result = benchmark(module, args.runs, args.top)
+        except RuntimeError as e:
+            print(f"{module}: {e}")
+            continue
+        results.append(result)
+        slowest = ", ".join(f"{entry['module']} {entry['cumulative_ms']:.0f}ms" for entry in result["slowest"])
+        print(f"{module:<20} wall {result['wall_ms']:>8.1f}ms  imports {result['import_ms']:>8.1f}ms  | {slowest}")
+
+    if args.history and results:
+        record = {"date": datetime.datetime.now(datetime.timezone.utc).isoformat(), "revision": git_revision(), "results": results}
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,222 @@
+import collections
+import datetime
+import email.utils
+import logging
+import os
+import re
+
+try:
+    from utils.paper_store import PaperStore, split_arxiv_id
+    from utils.jsonl_store import iter_records
+except ImportError:
+    from paper_store import PaperStore, split_arxiv_id # type: ignore
+    from jsonl_store import iter_records # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Trigram Jaccard similarity above which an indexed title is taken as the same paper
+DEFAULT_THRESHOLD = 0.85
+# Query tokens whose postings are unioned to find fuzzy candidates (the rarest ones)
+CANDIDATE_TOKENS = 3
+
+# Stand-in for arxiv.Result with the attributes the scrapers read
+LocalResult = collections.namedtuple(
+    "LocalResult",
+    ["entry_id", "title", "summary", "comment", "authors", "categories", "primary_category", "updated", "published", "pdf_url"],
+)
+
+
+def normalize_title(title):
+    """Lowercases a title and strips punctuation/extra spaces."""
+    title = re.sub(r'[^\w\s]', ' ', (title or '').lower())
+    return re.sub(r'\s+', ' ', title).strip()
+
+
+def trigrams(normalized_title):
+    """Character trigrams of a normalised title (padded so short words still count)."""
+    padded = f"  {normalized_title} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _parse_date(value):
+    """Timezone-aware datetime of an ISO or RFC 2822 date (naive ones are taken as UTC), or None."""
+    if isinstance(value, datetime.datetime):
+        date = value
+    elif not value:
+        return None
+    else:
+        text = str(value).strip()
+        try:
+            date = datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(text)
+            except (TypeError, ValueError):
+                return None
+    return date if date.tzinfo is not None else date.replace(tzinfo=datetime.timezone.utc)
+
+
+def record_to_result(record):
+    """
+    LocalResult of a paper record: a PaperStore / scrapt_arxiv paper dict, or a line of an arXiv
+    metadata dump (Kaggle-style 'id', 'title', 'abstract', 'categories', 'authors', 'update_date').
+
+    Returns None when the record has no arXiv ID or no parsable date, so its title is left to the
+    live API lookup rather than resolved to a result without `updated`.
+    """
+    link = record.get('link') or record.get('entry_id')
+    if not link:
+        arxiv_id = record.get('arxiv_id') or record.get('id')
+        if not arxiv_id:
+            return None
+        link = f"http://arxiv.org/abs/{arxiv_id}"
+    categories = record.get('acm_classifications') or record.get('arxiv_categories') or record.get('categories') or []
+    if isinstance(categories, str):
+        categories = categories.split()
+    updated = _parse_date(record.get('date') or record.get('updated') or record.get('update_date'))
+    if updated is None:
+        return None
+    versions = record.get('versions') or []
+    created = versions[0].get('created') if versions and isinstance(versions[0], dict) else None
+    published = _parse_date(record.get('published') or created) or updated
+    authors = record.get('authors') or []
+    if isinstance(authors, str):
+        authors = [author.strip() for author in re.split(r',| and ', authors) if author.strip()]
+    return LocalResult(
+        entry_id=link,
+        title=' '.join((record.get('title') or '').split()),
+        summary=record.get('abstract') or record.get('summary') or '',
+        comment=record.get('comment') or record.get('comments'),
+        authors=authors,
+        categories=list(categories),
+        primary_category=record.get('primary_category') or (categories[0] if categories else None),
+        updated=updated,
+        published=published,
+        pdf_url=record.get('pdf_url') or link.replace('/abs/', '/pdf/'),
+    )
+
+
+class TitleIndex:
+    """
+    In-memory title -> arXiv paper index for resolving paper titles without the live API.
+
+    Titles are looked up by their normalised form first (a dict hit); otherwise candidates sharing
+    the query's rarest words are taken from a word inverted index and scored by the Jaccard
+    similarity of their character-trigram sets. Only titles that resolve neither way need an
+    arXiv query.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._results = []  # doc id -> LocalResult
+        self._trigrams = []  # doc id -> trigram set
+        self._exact = {}  # normalised title -> doc id
+        self._postings = collections.defaultdict(list)  # word -> doc ids
+        self._ids = {}  # arXiv id -> doc id (later versions replace earlier ones)
+
+    def add(self, result):
+        normalized = normalize_title(result.title)
+        if not normalized:
+            return
+        arxiv_id, _ = split_arxiv_id(result.entry_id)
+        doc = self._ids.get(arxiv_id)
+        if doc is None:
+            doc = len(self._results)
+            self._results.append(result)
+            self._trigrams.append(trigrams(normalized))
+            self._ids[arxiv_id] = doc
+        else:
+            # Refreshed record of a known paper: only a changed title needs indexing
+            self._results[doc] = result
+            if normalized in self._exact:
+                return
+            self._trigrams[doc] = trigrams(normalized)
+        self._exact[normalized] = doc
+        for word in set(normalized.split()):
+            self._postings[word].append(doc)
+
+    def add_records(self, records):
+        """Indexes paper records (see record_to_result); returns how many were indexed."""
+        count = 0
+        for record in records:
+            result = record_to_result(record)
+            if result is not None:
+                self.add(result)
+                count += 1
+        return count
+
+    def __len__(self):
+        return len(self._results)
+
+    def match(self, title):
+        """Returns (LocalResult, similarity) of the closest indexed title, or (None, best similarity)."""
+        normalized = normalize_title(title)
+        doc = self._exact.get(normalized)
+        if doc is not None:
+            return self._results[doc], 1.0
+        words = [word for word in set(normalized.split()) if word in self._postings]
+        if not words:
+            return None, 0.0
+        words.sort(key=lambda word: len(self._postings[word]))
+        candidates = set()
+        for word in words[:CANDIDATE_TOKENS]:
+            candidates.update(self._postings[word])
+        query = trigrams(normalized)
+        best_doc, best_similarity = None, 0.0
+        for doc in candidates:
+            other = self._trigrams[doc]
+            similarity = len(query & other) / len(query | other)
+            if similarity > best_similarity:
+                best_doc, best_similarity = doc, similarity
+        if best_similarity >= self.threshold:
+            return self._results[best_doc], best_similarity
+        return None, best_similarity
+
+    def resolve(self, titles):
+        """Returns {title: LocalResult} for the titles found in the index."""
+        resolved = {}
+        for title in titles:
+            result, _ = self.match(title)
+            if result is not None:
+                resolved[title] = result
+        return resolved
+
+
+def default_paper_store_path():
+    """PAPER_STORE, else the store scrapt_arxiv harvests into (ROOT_FOLDER/JSON_FOLDER/arxiv_papers.sqlite)."""
+    if os.getenv("PAPER_STORE"):
+        return os.getenv("PAPER_STORE")
+    root_folder = os.getenv("ROOT_FOLDER")
+    if not root_folder:
+        return None
+    return os.path.join(root_folder, os.getenv("JSON_FOLDER", "automation/weekly_arxiv_json"), "arxiv_papers.sqlite")
+
+
+def build_title_index(paper_store_path=None, dump_paths=(), threshold=DEFAULT_THRESHOLD):
+    """
+    Builds a TitleIndex from the local PaperStore and from arXiv metadata dumps (.jsonl / .json).
+
+    `paper_store_path` defaults to default_paper_store_path(); pass 'none' to skip the store.
+    Sources that do not exist are skipped, so the index may be empty.
+    """
+    index = TitleIndex(threshold)
+    paper_store_path = paper_store_path or default_paper_store_path()
+    if paper_store_path and paper_store_path.lower() != "none" and os.path.exists(paper_store_path):
+        store = PaperStore(paper_store_path)
+        try:
+            count = index.add_records(store.iter_papers())
+        finally:
+            store.close()
+        logger.info(f"Title index: {count} papers from {paper_store_path}")
+    for path in dump_paths:
+        if not os.path.exists(path):
+            logger.warning(f"Title index: dump {path} not found")
+            continue
+        count = index.add_records(iter_records(path))
+        logger.info(f"Title index: {count} papers from {path}")
+    return index
+
+
+def dump_paths_from_env():
+    """Paths of the arXiv metadata dumps listed in TITLE_INDEX_DUMPS (separated by os.pathsep)."""
+    return [path for path in os.getenv("TITLE_INDEX_DUMPS", "").split(os.pathsep) if path]
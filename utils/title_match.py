@@ -0,0 +1,85 @@
+import difflib
+import logging
+
+import numpy as np
+
+try:
+    from utils.title_index import normalize_title
+except ImportError:
+    from title_index import normalize_title # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# rapidfuzz (C++ string kernels, in requirements.txt) scores whole batches at once; difflib is
+# only a fallback for installs without it, and is much slower on large batches
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
+_warned_fallback = False
+
+# Similarity above which a candidate title is taken as the same paper
+DEFAULT_THRESHOLD = 0.85
+
+
+def title_key(title):
+    """Normalised title with its words sorted, so reordered words still match."""
+    return ' '.join(sorted(normalize_title(title).split()))
+
+
+def _difflib_ratio(a, b):
+    # Same 2 * matches / total length measure as rapidfuzz's normalised Indel similarity
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def pair_scores(queries, candidates):
+    """
+    Similarity in [0, 1] of each (query, candidate) title pair, as a NumPy array.
+
+    Titles are compared as token-sorted normalised strings with an edit-distance (Indel) ratio,
+    so inserted, deleted or reordered words lower the score gradually instead of shifting every
+    following character out of alignment.
+    """
+    queries = [title_key(title) for title in queries]
+    candidates = [title_key(title) for title in candidates]
+    if len(queries) != len(candidates):
+        raise ValueError("queries and candidates must have the same length")
+    if not queries:
+        return np.zeros(0)
+    if process is not None and hasattr(process, "cpdist"):
+        return process.cpdist(queries, candidates, scorer=fuzz.ratio, workers=-1, dtype=np.float32) / 100.0
+    if fuzz is not None:
+        return np.fromiter((fuzz.ratio(q, c) for q, c in zip(queries, candidates)), dtype=np.float32, count=len(queries)) / 100.0
+    global _warned_fallback
+    if not _warned_fallback:
+        logger.warning("rapidfuzz is not installed; scoring titles with the slower difflib fallback (pip install rapidfuzz)")
+        _warned_fallback = True
+    return np.fromiter((_difflib_ratio(q, c) for q, c in zip(queries, candidates)), dtype=np.float32, count=len(queries))
+
+
+def best_matches(candidates_by_query, threshold=DEFAULT_THRESHOLD):
+    """
+    Picks the closest candidate title of each query, scoring every pair of the batch in one call.
+
+    Args:
+        candidates_by_query (dict): {query title: [candidate titles]}.
+
+    Returns:
+        dict: {query title: (index of the best candidate or None below `threshold`, its score)}.
+    """
+    queries, candidates = [], []
+    for query, titles in candidates_by_query.items():
+        queries.extend([query] * len(titles))
+        candidates.extend(titles)
+    scores = pair_scores(queries, candidates)
+
+    matches = {query: (None, 0.0) for query in candidates_by_query}
+    offset = 0
+    for query, titles in candidates_by_query.items():
+        if titles:
+            block = scores[offset:offset + len(titles)]
+            best = int(np.argmax(block))
+            score = float(block[best])
+            matches[query] = (best if score >= threshold else None, score)
+            offset += len(titles)
+    return matches
@@ -0,0 +1,108 @@
+import datetime
+import json
+import logging
+import math
+import os
+
+try:
+    from utils.embedding_cache import get_arxiv_id
+    from utils.paper_store import split_arxiv_id
+    from utils.jsonl_store import JSONLRecordStore
+except ImportError:
+    from embedding_cache import get_arxiv_id # type: ignore
+    from paper_store import split_arxiv_id # type: ignore
+    from jsonl_store import JSONLRecordStore # type: ignore
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_FILE = "incremental_watermark.json"
+ROLLING_FILE = "rolling_analyzed.jsonl"
+# Run state kept next to the daily digests of a query folder, not digests themselves
+STATE_FILES = (WATERMARK_FILE, ROLLING_FILE)
+# Papers updated this long before the watermark are fetched again, in case of late arXiv indexing
+OVERLAP = datetime.timedelta(days=1)
+
+
+def load_watermark(path):
+    """Loads a query watermark: {'last_updated': ISO date or None, 'seen_ids': {arxiv_id: ISO date}}."""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading watermark {path}: {e}. Starting from scratch.")
+    return {"last_updated": None, "seen_ids": {}}
+
+
+def save_watermark(path, watermark):
+    """Saves a watermark atomically."""
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(watermark, f, indent=4)
+    os.replace(temp_file, path)
+
+
+def watermark_start(watermark):
+    """Returns the datetime from which an incremental run must fetch, or None on a first run."""
+    if not watermark.get("last_updated"):
+        return None
+    return datetime.datetime.fromisoformat(watermark["last_updated"]) - OVERLAP
+
+
+def days_since_watermark(watermark, default_days):
+    """Number of days to fetch so that the scrape window reaches back to the watermark."""
+    start = watermark_start(watermark)
+    if start is None:
+        return default_days
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=23, minute=59, second=59, microsecond=999999)
+    return max(1, math.ceil((today - start).total_seconds() / 86400))
+
+
+def filter_new_papers(papers, watermark):
+    """Keeps the papers updated after the watermark overlap that have not been seen yet."""
+    start = watermark_start(watermark)
+    seen = watermark.get("seen_ids", {})
+    new_papers = []
+    for paper in papers:
+        if get_arxiv_id(paper) in seen:
+            continue
+        date = paper.get('date')
+        if start is not None and isinstance(date, datetime.datetime) and date < start:
+            continue
+        new_papers.append(paper)
+    logger.info(f"{len(new_papers)} of {len(papers)} papers are new since the last run.")
+    return new_papers
+
+
+def advance_watermark(watermark, papers):
+    """Moves the watermark past `papers` and forgets seen IDs that fell out of the overlap window."""
+    seen = dict(watermark.get("seen_ids", {}))
+    last_updated = watermark.get("last_updated")
+    for paper in papers:
+        date = paper.get('date')
+        if not isinstance(date, datetime.datetime):
+            continue
+        date = date.isoformat()
+        seen[get_arxiv_id(paper)] = date
+        if last_updated is None or datetime.datetime.fromisoformat(date) > datetime.datetime.fromisoformat(last_updated):
+            last_updated = date
+    watermark = {"last_updated": last_updated, "seen_ids": seen, "last_run": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    start = watermark_start(watermark)
+    if start is not None:
+        watermark["seen_ids"] = {arxiv_id: date for arxiv_id, date in seen.items() if datetime.datetime.fromisoformat(date) >= start}
+    return watermark
+
+
+def rolling_key(paper):
+    """Identifies a paper across versions: its unversioned arXiv ID, or its title."""
+    link = paper.get('link')
+    return split_arxiv_id(link)[0] if link else paper.get('title')
+
+
+def merge_rolling(rolling_path, new_papers):
+    """Appends newly analyzed papers to the rolling analyzed JSONL (newest version wins); returns it sorted by general score."""
+    with JSONLRecordStore(rolling_path, key=rolling_key) as store:
+        store.extend(new_papers)
+        merged = sorted(store, key=lambda p: p.get('general_score', 0), reverse=True)
+    logger.info(f"Rolling analyzed file {rolling_path} now holds {len(merged)} papers.")
+    return merged